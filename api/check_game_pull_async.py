@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""
+This script checks game_pull_async.py against a local stand-in for the NHL APIs, served with http.server on a free port, so it runs anywhere without touching the real APIs.
+The stand-in answers game feeds with live-data-example.json (with the requested gamePk) and shift charts with a one-shift chart, and can be told to answer some games with
+a 404, with a few 503s before succeeding, or with 500s every time. The checks are:
+    a first run stores every game, retries 5xx responses, records a 404 as missing and counts a game that never succeeds as failed, without recording it
+    a second run downloads nothing, and does not call the stand-in at all
+    a run after an interrupted one (manifest cut short mid-line) downloads only what the manifest is missing
+    --retry-missing asks again for the games recorded as missing
+    the manifest's directory is created if it does not exist
+    a sync asks again for a recent game's empty shift chart, but not for one from a game older than --missing-days, unless --retry-missing is given
+    a sync whose schedule request keeps failing reports it and returns None instead of raising
+It prints each check and exits with status 1 if any fails.
+
+Usage:
+python check_game_pull_async.py
+"""
+
+
+import contextlib
+import datetime
+import http.server
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+
+import game_pull_async
+from feed_io import read_feed
+
+
+GAME_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'live-data-example.json')
+
+
+def make_stand_in(missing=(), flaky=None, broken=(), no_shifts=(), schedule=None):
+    """
+    This function returns the stand-in's settings and request log: games in missing answer 404 (and an empty shift chart),
+    games in flaky answer 503 that many times before succeeding, games in broken always answer 500 and games in no_shifts have an empty shift chart.
+    The schedule lists the final games {gameID: date} whatever dates are asked for, and answers 500 while 'schedule_broken' is set.
+    """
+    with open(GAME_DATA_PATH, encoding='utf-8') as f:
+        game_data = json.load(f)
+    return {'game_data': game_data, 'missing': set(missing), 'flaky': dict(flaky or {}), 'broken': set(broken), 'no_shifts': set(no_shifts),
+            'schedule': dict(schedule or {}), 'schedule_broken': False, 'hits': {}, 'lock': threading.Lock()}
+
+
+def make_stand_in_handler(stand_in):
+    """
+    This function returns the request handler class that answers /game/<gameID>, /shifts/<gameID> and /schedule for http.server as the stand-in is set up.
+    """
+    class StandInHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] == '/schedule':
+                self.send_schedule()
+                return
+            match = re.fullmatch(r'/(game|shifts)/(\d+)', self.path)
+            if match is None:
+                self.send_json(404, {'message': 'Not found'})
+                return
+            kind, gameID = match.group(1), int(match.group(2))
+            with stand_in['lock']:
+                stand_in['hits'][self.path] = stand_in['hits'].get(self.path, 0) + 1
+                failing = kind == 'game' and stand_in['flaky'].get(gameID, 0) > 0
+                if failing:
+                    stand_in['flaky'][gameID] -= 1
+            if kind == 'game' and gameID in stand_in['broken']:
+                self.send_json(500, {'message': 'Internal server error'})
+            elif failing:
+                self.send_json(503, {'message': 'Service unavailable'}, {'Retry-After': '0'})
+            elif kind == 'game' and gameID in stand_in['missing']:
+                self.send_json(404, {'message': 'Object not found'})
+            elif kind == 'game':
+                self.send_json(200, dict(stand_in['game_data'], gamePk=gameID))
+            elif gameID in stand_in['missing'] or gameID in stand_in['no_shifts']:
+                self.send_json(200, {'data': [], 'total': 0})
+            else:
+                shift = {'id': 1, 'gameId': gameID, 'playerId': 8471698, 'teamId': 1, 'teamAbbrev': 'NJD', 'period': 1,
+                         'startTime': '00:00', 'endTime': '00:45', 'firstName': 'Test', 'lastName': 'Player'}
+                self.send_json(200, {'data': [shift], 'total': 1})
+
+        def send_schedule(self):
+            with stand_in['lock']:
+                stand_in['hits']['/schedule'] = stand_in['hits'].get('/schedule', 0) + 1
+            if stand_in['schedule_broken']:
+                self.send_json(500, {'message': 'Internal server error'})
+                return
+            dates = {}
+            for gameID, date in stand_in['schedule'].items():
+                dates.setdefault(date, []).append({'gamePk': gameID, 'gameType': 'R', 'status': {'codedGameState': '7'}})
+            self.send_json(200, {'dates': [{'date': date, 'games': games} for date, games in sorted(dates.items())]})
+
+        def send_json(self, status, data, headers=None):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+
+def start_stand_in_server(stand_in):
+    """
+    This function serves the stand-in on a free local port in a background thread and returns (server, base_url). Call server.shutdown() to stop it.
+    """
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), make_stand_in_handler(stand_in))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return (server, "http://127.0.0.1:%d" % server.server_address[1])
+
+
+def pull_quietly(game_ids, directory, base_url, **kwargs):
+    """
+    This function runs pull_games() against the stand-in with fast rates and retries, hiding its progress lines, and returns its counts.
+    """
+    download_args = {'games_directory': os.path.join(directory, 'games'), 'shifts_directory': os.path.join(directory, 'shifts'),
+                     'manifest_path': os.path.join(directory, 'manifest', 'pull_manifest.jsonl'),
+                     'game_rate': 1000, 'shift_rate': 1000, 'burst': 8, 'retries': 3, 'backoff': 0.01, 'timeout': 10,
+                     'game_url': base_url + '/game/{gameID}', 'shift_url': base_url + '/shifts/{gameID}'}
+    download_args.update(kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return game_pull_async.pull_games(game_ids, **download_args)
+
+
+def sync_quietly(directory, base_url, **kwargs):
+    """
+    This function runs sync_games() over the last 30 days against the stand-in as pull_quietly() runs pull_games(), and returns its counts.
+    """
+    download_args = {'games_directory': os.path.join(directory, 'games'), 'shifts_directory': os.path.join(directory, 'shifts'),
+                     'manifest_path': os.path.join(directory, 'manifest', 'pull_manifest.jsonl'),
+                     'game_rate': 1000, 'shift_rate': 1000, 'burst': 8, 'retries': 3, 'backoff': 0.01, 'timeout': 10,
+                     'game_url': base_url + '/game/{gameID}', 'shift_url': base_url + '/shifts/{gameID}', 'schedule_url': base_url + '/schedule?startDate={start_date}&endDate={end_date}&gameType={game_types}'}
+    download_args.update(kwargs)
+    today = datetime.date.today()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return game_pull_async.sync_games(today - datetime.timedelta(days=30), today, **download_args)
+
+
+def run_checks(directory):
+    """
+    This function runs every check in directory and returns a list of (description, passed) pairs.
+    """
+    stored, flaky, missing, broken, recent, old = 2012020001, 2012020002, 2012020003, 2012020004, 2012020005, 2012020006
+    stand_in = make_stand_in(missing=[missing], flaky={flaky: 2}, broken=[broken], no_shifts=[recent, old])
+    server, base_url = start_stand_in_server(stand_in)
+    checks = []
+    try:
+        # The manifest goes in a directory that does not exist yet
+        counts = pull_quietly([stored, flaky, missing, broken], directory, base_url)
+        checks.append(("first run: 5 stored, 2 missing, 1 failed", (counts['done'], counts['missing'], counts['failed']) == (5, 2, 1)))
+        checks.append(("the 503s were retried until the game was stored", stand_in['hits'].get('/game/%d' % flaky) == 3))
+        checks.append(("the 500s were retried, then given up on", stand_in['hits'].get('/game/%d' % broken) == 4))
+        games_directory = os.path.join(directory, 'games')
+        checks.append(("stored feeds read back with their gamePk", all(read_feed(os.path.join(games_directory, "game_%d.json" % gameID))['gamePk'] == gameID for gameID in (stored, flaky))))
+        manifest_path = os.path.join(directory, 'manifest', 'pull_manifest.jsonl')
+        manifest = game_pull_async.read_manifest(manifest_path)
+        checks.append(("the 404 is recorded as missing", manifest['games'].get(missing, {}).get('status') == 'missing'))
+        checks.append(("the failed game is not recorded", broken not in manifest['games']))
+
+        # Resuming with nothing left to do must not call the stand-in, apart from the game that failed
+        stand_in['broken'].clear()
+        hits_before = sum(stand_in['hits'].values())
+        counts = pull_quietly([stored, flaky, missing, broken], directory, base_url)
+        checks.append(("second run only downloads the failed game", (counts['total'], counts['done']) == (1, 1)))
+        checks.append(("second run makes one request", sum(stand_in['hits'].values()) == hits_before + 1))
+
+        # Cut the manifest short in the middle of its last line, as a killed run can leave it
+        with open(manifest_path, encoding='utf-8') as f:
+            lines = f.readlines()
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines[:-3])
+            f.write(lines[-3][:len(lines[-3]) // 2])
+        counts = pull_quietly([stored, flaky, missing, broken], directory, base_url)
+        checks.append(("interrupted run: only the 3 unrecorded downloads are redone", (counts['total'], counts['skipped']) == (3, 5)))
+
+        counts = pull_quietly([stored, flaky, missing, broken], directory, base_url, retry_missing=True)
+        checks.append(("--retry-missing asks again for the 2 missing downloads", (counts['total'], counts['missing']) == (2, 2)))
+
+        # A sync keeps asking for a recent game's shift chart, but gives up on one from a game older than missing_days
+        sync_directory = os.path.join(directory, 'sync')
+        today = datetime.date.today()
+        stand_in['schedule'] = {recent: today.isoformat(), old: (today - datetime.timedelta(days=20)).isoformat()}
+        counts = sync_quietly(sync_directory, base_url)
+        checks.append(("first sync: 2 feeds stored, 2 shift charts missing", (counts['done'], counts['missing']) == (2, 2)))
+        old_shifts_hits = stand_in['hits'].get('/shifts/%d' % old)
+        counts = sync_quietly(sync_directory, base_url)
+        checks.append(("second sync asks again only for the recent shift chart", counts['total'] == 1 and stand_in['hits'].get('/shifts/%d' % old) == old_shifts_hits))
+        counts = sync_quietly(sync_directory, base_url, retry_missing=True)
+        checks.append(("sync with --retry-missing asks again for both shift charts", counts['total'] == 2))
+
+        stand_in['schedule_broken'] = True
+        try:
+            counts = sync_quietly(sync_directory, base_url)
+            checks.append(("a failing schedule request returns None", counts is None))
+        except Exception as error:
+            checks.append(("a failing schedule request returns None (raised %r)" % error, False))
+    finally:
+        server.shutdown()
+        server.server_close()
+    return checks
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        checks = run_checks(directory)
+    for description, passed in checks:
+        print("%-4s %s" % ("ok" if passed else "FAIL", description))
+    return 0 if all(passed for description, passed in checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
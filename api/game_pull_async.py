@@ -0,0 +1,527 @@
+#!/usr/bin/env python
+"""
+This script downloads game feeds and shift charts from the NHL APIs concurrently, replacing the one-request-then-sleep loops of
+game_pull(), game_pull_resumed(), shift_charts_pull() and shift_charts_pull_resumed() in game_pull_api.ipynb.
+
+All requests share one aiohttp session, so connections to each host are kept alive and reused instead of opened for every game.
+Each endpoint has its own token bucket that caps its request rate, so games and shift charts download side by side, each within its own limit.
+Failed requests (connection errors, timeouts, 429 and 5xx responses) are retried with exponential backoff, honouring Retry-After when the server sends it.
+Every finished download is appended to a manifest file, so an interrupted run picks up where it stopped when it is started again; there is no numberReached to edit.
+
+With --sync, the games to download come from the schedule instead of year_match()'s game counts, so playoff games are included and no gameIDs are guessed.
+Only games that are over (codedGameState 5 to 7) are downloaded, and only if they are not stored yet or their state has changed since they were stored,
+so a nightly sync of the last few days downloads just the games played since the last run.
+
+Usage:
+python game_pull_async.py --start-year 2012 --end-year 2021
+python game_pull_async.py --start-year 2022 --end-year 2023 --only shifts --shift-rate 2
+python game_pull_async.py --game-id 2012020711 --game-url http://127.0.0.1:8060/game/{gameID} --shift-url http://127.0.0.1:8060/shifts/{gameID}
+python game_pull_async.py --sync --season 2022
+python game_pull_async.py --sync --days 3
+
+The years run from --start-year up to but not including --end-year, as in game_pull(). The files are written the way the notebook wrote them,
+to <games-dir>/game_<gameID>.json and <shifts-dir>/game_<gameID>.json, unless --compression (gzip or zstd) or --slim is given;
+see feed_io.py for the stored forms, all of which init_script_defines.py reads.
+In a notebook, where an event loop is already running, await pull_games_async() instead of calling pull_games().
+check_game_pull_async.py runs this script against a local stand-in server to check retries, missing games and resuming.
+"""
+
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+# feed_io.py lives in the repository root, one level up from this script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from feed_io import check_compression, get_feed_game_id, list_feed_files, read_feed, write_feed
+
+
+GAME_URL = 'https://statsapi.web.nhl.com/api/v1/game/{gameID}/feed/live'
+SHIFT_URL = 'https://api.nhle.com/stats/rest/en/shiftcharts?cayenneExp=gameId={gameID}'
+SCHEDULE_URL = 'https://statsapi.web.nhl.com/api/v1/schedule?startDate={start_date}&endDate={end_date}&gameType={game_types}'
+
+# codedGameState 5 (game over), 6 and 7 (final) have a complete feed. Lower states are unplayed or in progress,
+# 8 is scheduled with the time to be decided and 9 is postponed (see game-json-structure.txt)
+FINAL_STATES = (5, 6, 7)
+
+# Responses worth asking for again: rate limiting and server-side errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def year_match(year):
+    """
+    This function returns one more than the number of regular season games in a year, as in game_pull_api.ipynb.
+    """
+    if(year==2020):
+        return 869 ##Covid-related lockdown shortened the season
+    elif(year==2022):
+        return 361 ##Hard coded with the number of games played as of 11/29/2022, as in the notebook
+    elif(year==2012):
+        return 721 ##Lockout-shortened year
+    elif(year==2004):
+        return 1 ##Year cancelled due to labor dispute
+    elif(year>=2021):
+        return 1313 ##32-team league means 1312 games.
+    elif(year>=2017):
+        return 1272 ##31-team league means 1271 games.
+    else:
+        return 1231 ##30-team league means 1230 games.
+
+
+def get_game_ids(year_start, year_end):
+    """
+    This function returns the regular season gameIDs from year_start up to but not including year_end, in the order game_pull() requested them.
+    """
+    game_ids = []
+    for year in range(year_start, year_end):
+        for game_num in range(1, year_match(year)):
+            game_ids.append(year*1000000 + 20000 + game_num)
+    return game_ids
+
+
+def read_manifest(manifest_path):
+    """
+    This function reads the manifest and returns {kind: {gameID: {'status', 'state'}}}, where kind is 'games' or 'shifts' and status is 'done' or 'missing'.
+    state is the game feed's codedGameState when it was stored, and None for shift charts and missing games.
+    The manifest has one JSON line per finished download, and a later line for the same game replaces an earlier one.
+    A last line cut short by an interrupted run is ignored.
+    """
+    manifest = {'games': {}, 'shifts': {}}
+    if not os.path.exists(manifest_path):
+        return manifest
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            manifest[entry['kind']][entry['gameID']] = {'status': entry['status'], 'state': entry.get('state')}
+    return manifest
+
+
+def open_manifest(manifest_path):
+    """
+    This function opens the manifest for appending, creating its directory if needed.
+    If a killed run left the last line cut short, it is ended first, so the next entry starts on a line of its own instead of being merged into it.
+    """
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    cut_short = False
+    if os.path.exists(manifest_path) and os.path.getsize(manifest_path) > 0:
+        with open(manifest_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            cut_short = f.read(1) != b"\n"
+    manifest_file = open(manifest_path, 'a', encoding='utf-8')
+    if cut_short:
+        manifest_file.write("\n")
+    return manifest_file
+
+
+def append_manifest(manifest_file, kind, gameID, status, state=None):
+    """
+    This function records one finished download, and the codedGameState of game feeds, in the open manifest file and flushes it, so it survives the run being killed.
+    """
+    entry = {'kind': kind, 'gameID': gameID, 'status': status, 'time': int(time.time())}
+    if state is not None:
+        entry['state'] = state
+    manifest_file.write(json.dumps(entry) + "\n")
+    manifest_file.flush()
+
+
+def get_game_state(game_data):
+    """
+    This function returns the codedGameState of a game feed as an integer, or None if the feed has none.
+    """
+    state = game_data.get('gameData', {}).get('status', {}).get('codedGameState')
+    if state is None:
+        return None
+    return int(state)
+
+
+def make_token_bucket(rate, burst=1):
+    """
+    This function returns a token bucket that allows rate requests per second on average and at most burst requests at once.
+    """
+    return {'rate': rate, 'capacity': max(burst, 1), 'tokens': max(burst, 1), 'updated': time.monotonic(), 'lock': asyncio.Lock()}
+
+
+async def take_token(bucket):
+    """
+    This function waits until the bucket has a token and takes it. Waiting requests queue on the bucket's lock, so they are let through in order.
+    """
+    async with bucket['lock']:
+        while True:
+            now = time.monotonic()
+            bucket['tokens'] = min(bucket['capacity'], bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+            bucket['updated'] = now
+            if bucket['tokens'] >= 1:
+                bucket['tokens'] -= 1
+                return
+            await asyncio.sleep((1 - bucket['tokens']) / bucket['rate'])
+
+
+def get_retry_delay(response, attempt, backoff):
+    """
+    This function returns how long to wait before the next attempt: the server's Retry-After if it sent one in seconds,
+    otherwise backoff * 2**attempt with up to 50% random jitter so retrying requests do not all return at once.
+    """
+    if response is not None and response.headers.get('Retry-After', '').isdigit():
+        return float(response.headers['Retry-After'])
+    return backoff * 2**attempt * (1 + random.random() / 2)
+
+
+async def fetch_json(session, url, bucket, retries=5, backoff=1.0):
+    """
+    This function downloads one URL and returns (status, data), where status is 'done' or 'missing'.
+    'missing' means the API answered but has nothing for the game yet (a 404, or a shift chart with no shifts), which is not retried.
+    Connection errors, timeouts and RETRY_STATUSES responses are retried up to retries times, and the last error is raised if they all fail.
+    """
+    for attempt in range(retries + 1):
+        await take_token(bucket)
+        try:
+            async with session.get(url) as response:
+                if response.status in RETRY_STATUSES and attempt < retries:
+                    delay = get_retry_delay(response, attempt, backoff)
+                elif response.status == 404:
+                    return ('missing', None)
+                else:
+                    response.raise_for_status()
+                    # The shift chart API labels its JSON as text, so do not check the content type
+                    return ('done', await response.json(content_type=None))
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+            delay = get_retry_delay(None, attempt, backoff)
+        await asyncio.sleep(delay)
+
+
+async def download_game(session, kind, gameID, settings, manifest_file, counts):
+    """
+    This function downloads one game feed or shift chart, writes it to its directory and records it in the manifest.
+    Errors that outlast the retries are counted and left out of the manifest, so the next run tries the game again.
+    """
+    url = settings[kind]['url'].format(gameID=gameID)
+    try:
+        status, data = await fetch_json(session, url, settings[kind]['bucket'], settings['retries'], settings['backoff'])
+        if status == 'done' and kind == 'shifts' and len(data.get('data', [])) == 0:
+            # The shift chart API answers unplayed games with an empty list instead of a 404
+            status = 'missing'
+        state = None
+        if status == 'done':
+            # Serializing a full game feed takes long enough to hold up the other downloads, so it runs in a thread
+            await asyncio.to_thread(write_feed, settings[kind]['directory'], gameID, data, settings[kind]['feed_kind'], settings['compression'], settings['slim'])
+            if kind == 'games':
+                state = get_game_state(data)
+        append_manifest(manifest_file, kind, gameID, status, state)
+        counts[status] += 1
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+        counts['failed'] += 1
+        print("\ngame_pull_async: Giving up on", kind, gameID, "for this run:", repr(error))
+    print("game_pull_async:", counts['done'], "done,", counts['missing'], "missing,", counts['failed'], "failed of", counts['total'], "- last:", kind, gameID, end="\r", flush=True)
+
+
+def get_download_settings(games_directory, shifts_directory, game_rate, shift_rate, burst, retries, backoff, game_url, shift_url, compression=None, slim=False):
+    """
+    This function collects what download_game() needs for each kind: its URL template, its directory and its token bucket, plus the retry and storage settings.
+    """
+    check_compression(compression)
+    settings = {'retries': retries, 'backoff': backoff, 'compression': compression, 'slim': slim}
+    settings['games'] = {'url': game_url, 'directory': games_directory, 'bucket': make_token_bucket(game_rate, burst), 'feed_kind': 'game'}
+    settings['shifts'] = {'url': shift_url, 'directory': shifts_directory, 'bucket': make_token_bucket(shift_rate, burst), 'feed_kind': 'shift'}
+    return settings
+
+
+def open_session(concurrency, timeout):
+    """
+    This function opens the aiohttp session every request of a run goes through, with a pool of at most concurrency keep-alive connections.
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+
+
+async def run_downloads(session, downloads, settings, manifest_file, concurrency, counts):
+    """
+    This function downloads every (kind, gameID) in downloads with concurrency workers sharing session, and adds the results to counts.
+    """
+    for kind in set(kind for kind, gameID in downloads):
+        os.makedirs(settings[kind]['directory'], exist_ok=True)
+    queue = asyncio.Queue()
+    for download in downloads:
+        queue.put_nowait(download)
+
+    async def worker():
+        while not queue.empty():
+            kind, gameID = queue.get_nowait()
+            await download_game(session, kind, gameID, settings, manifest_file, counts)
+
+    await asyncio.gather(*[worker() for i in range(concurrency)])
+    if len(downloads) > 0:
+        print()
+    return counts
+
+
+async def pull_games_async(game_ids, games_directory='./games', shifts_directory='./shifts', manifest_path='./pull_manifest.jsonl', kinds=('games', 'shifts'),
+                           game_rate=1.0, shift_rate=1.0, burst=4, concurrency=8, retries=5, backoff=1.0, timeout=30, game_url=GAME_URL, shift_url=SHIFT_URL,
+                           retry_missing=False, compression=None, slim=False):
+    """
+    This function downloads the game feeds and shift charts of game_ids that the manifest does not already have, and returns the counts
+    {'total', 'skipped', 'done', 'missing', 'failed'} for this run.
+    kinds selects 'games', 'shifts' or both. Each endpoint is limited to its own rate (game_rate, shift_rate) in requests per second, with bursts of up to burst requests,
+    and at most concurrency requests are in flight at once over one shared pool of keep-alive connections.
+    Games the manifest lists as missing are skipped unless retry_missing is True, for instance once the games have been played.
+    game_url and shift_url are the endpoint templates, with {gameID} where the gameID goes; point them at a local server to test.
+    compression (None, 'gzip' or 'zstd') and slim choose how the files are stored, as in feed_io.write_feed().
+
+    Example usage:
+    counts = await pull_games_async(get_game_ids(2022, 2023), game_rate=2, shift_rate=2)
+    """
+    manifest = read_manifest(manifest_path)
+    settings = get_download_settings(games_directory, shifts_directory, game_rate, shift_rate, burst, retries, backoff, game_url, shift_url, compression, slim)
+    skip_statuses = ('done',) if retry_missing else ('done', 'missing')
+    # Interleave the two kinds game by game, so both endpoints are kept busy from the start
+    downloads = []
+    skipped = 0
+    for gameID in game_ids:
+        for kind in kinds:
+            if manifest[kind].get(gameID, {}).get('status') in skip_statuses:
+                skipped += 1
+            else:
+                downloads.append((kind, gameID))
+    counts = {'total': len(downloads), 'skipped': skipped, 'done': 0, 'missing': 0, 'failed': 0}
+    print("game_pull_async:", counts['total'], "downloads to do,", skipped, "already in", manifest_path, flush=True)
+    if counts['total'] == 0:
+        return counts
+    with open_manifest(manifest_path) as manifest_file:
+        async with open_session(concurrency, timeout) as session:
+            await run_downloads(session, downloads, settings, manifest_file, concurrency, counts)
+    return counts
+
+
+def get_season_dates(season):
+    """
+    This function returns the (start_date, end_date) that cover a season's schedule, from July of its first year to the end of June of its second,
+    so the whole preseason, regular season and playoffs are included.
+    """
+    return (datetime.date(season, 7, 1), datetime.date(season + 1, 6, 30))
+
+
+def parse_schedule(schedule_data):
+    """
+    This function returns the games of a schedule response as a dictionary {gameID: {'state', 'game_type', 'date'}}, with state the codedGameState as an integer.
+    A postponed game is listed again on its new date, and the later listing is kept.
+    """
+    schedule = {}
+    for date in schedule_data.get('dates', []):
+        for game in date.get('games', []):
+            schedule[game['gamePk']] = {'state': int(game['status']['codedGameState']), 'game_type': game.get('gameType', ''), 'date': date['date']}
+    return schedule
+
+
+async def fetch_schedule(session, start_date, end_date, game_types, bucket, schedule_url=SCHEDULE_URL, retries=5, backoff=1.0, chunk_days=120):
+    """
+    This function downloads the schedule from start_date to end_date for the game types (such as ('R', 'P')) and returns it as parse_schedule() does.
+    Long ranges are requested in chunks of chunk_days days, so each response stays a reasonable size.
+    """
+    schedule = {}
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(end_date, chunk_start + datetime.timedelta(days=chunk_days - 1))
+        url = schedule_url.format(start_date=chunk_start.isoformat(), end_date=chunk_end.isoformat(), game_types=",".join(game_types))
+        status, schedule_data = await fetch_json(session, url, bucket, retries, backoff)
+        if status == 'done':
+            schedule.update(parse_schedule(schedule_data))
+        chunk_start = chunk_end + datetime.timedelta(days=1)
+    return schedule
+
+
+def record_local_files(manifest, manifest_file, games_directory, shifts_directory):
+    """
+    This function adds the game and shift files already on disk that the manifest does not know about, such as those written by game_pull_api.ipynb, to the manifest.
+    Each such game file is read once to record its codedGameState; after that the manifest alone says what is stored.
+    It returns the number of files added.
+    """
+    added = 0
+    for kind, directory in (('games', games_directory), ('shifts', shifts_directory)):
+        if not os.path.isdir(directory):
+            continue
+        for file_name in list_feed_files(directory):
+            gameID = get_feed_game_id(file_name)
+            if gameID is None or manifest[kind].get(gameID, {}).get('status') == 'done':
+                continue
+            try:
+                data = read_feed(os.path.join(directory, file_name))
+            except (ValueError, OSError, EOFError):
+                # A truncated or corrupt file is downloaded again
+                continue
+            if kind == 'games':
+                state = get_game_state(data)
+                if state is None:
+                    # The old pullers saved "game not found" responses as files too
+                    continue
+            else:
+                state = None
+                if len(data.get('data', [])) == 0:
+                    continue
+            manifest[kind][gameID] = {'status': 'done', 'state': state}
+            append_manifest(manifest_file, kind, gameID, 'done', state)
+            added += 1
+    return added
+
+
+def get_sync_downloads(schedule, manifest, kinds=('games', 'shifts'), retry_missing=False, missing_days=7, today=None):
+    """
+    This function compares the schedule with the manifest and returns the (kind, gameID) downloads a sync needs, in gameID order:
+    a final game (codedGameState in FINAL_STATES) is downloaded if its feed is not stored or was stored in a different state, and its shift chart if that is not stored
+    or the feed is being downloaded again. Games that are not final yet are left for a later sync.
+    A feed or shift chart the manifest lists as missing is only asked for again while the game is less than missing_days days old (before today),
+    since the APIs fill in recent games late but some older games never get a shift chart; retry_missing asks again for all of them.
+    """
+    if today is None:
+        today = datetime.date.today()
+    downloads = []
+    for gameID in sorted(schedule):
+        state = schedule[gameID]['state']
+        if state not in FINAL_STATES:
+            continue
+        given_up = not retry_missing and (today - datetime.date.fromisoformat(schedule[gameID]['date'])).days >= missing_days
+        stored = manifest['games'].get(gameID, {})
+        game_changed = stored.get('status') != 'done' or stored.get('state') != state
+        if stored.get('status') == 'missing' and given_up:
+            game_changed = False
+        if 'games' in kinds and game_changed:
+            downloads.append(('games', gameID))
+        stored_shifts = manifest['shifts'].get(gameID, {}).get('status')
+        if 'shifts' in kinds and (game_changed or (stored_shifts != 'done' and not (stored_shifts == 'missing' and given_up))):
+            downloads.append(('shifts', gameID))
+    return downloads
+
+
+async def sync_games_async(start_date, end_date=None, games_directory='./games', shifts_directory='./shifts', manifest_path='./pull_manifest.jsonl', kinds=('games', 'shifts'),
+                           game_types=('R', 'P'), game_rate=1.0, shift_rate=1.0, burst=4, concurrency=8, retries=5, backoff=1.0, timeout=30,
+                           game_url=GAME_URL, shift_url=SHIFT_URL, schedule_url=SCHEDULE_URL, compression=None, slim=False, retry_missing=False, missing_days=7):
+    """
+    This function brings the stored games up to date with the schedule from start_date to end_date (today if None), and returns the counts
+    {'scheduled', 'final', 'total', 'skipped', 'done', 'missing', 'failed'} for this run, or None if the schedule could not be downloaded.
+    It downloads the schedule, adds any files already on disk to the manifest with record_local_files(), and then downloads only what get_sync_downloads() finds new or changed;
+    retry_missing and missing_days are passed on to it.
+    The schedule and the games go through the same session; the schedule requests count against the game feed rate.
+    The other arguments are as for pull_games_async().
+
+    Example usage:
+    counts = await sync_games_async(datetime.date.today() - datetime.timedelta(days=3))
+    counts = await sync_games_async(*get_season_dates(2022))
+    """
+    if end_date is None:
+        end_date = datetime.date.today()
+    manifest = read_manifest(manifest_path)
+    settings = get_download_settings(games_directory, shifts_directory, game_rate, shift_rate, burst, retries, backoff, game_url, shift_url, compression, slim)
+    with open_manifest(manifest_path) as manifest_file:
+        added = record_local_files(manifest, manifest_file, games_directory, shifts_directory)
+        if added > 0:
+            print("game_pull_async: Added", added, "files already on disk to", manifest_path, flush=True)
+        async with open_session(concurrency, timeout) as session:
+            try:
+                schedule = await fetch_schedule(session, start_date, end_date, game_types, settings['games']['bucket'], schedule_url, retries, backoff)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+                print("game_pull_async: Could not download the schedule from", start_date, "to", end_date, "after", retries, "retries:", repr(error), flush=True)
+                return None
+            downloads = get_sync_downloads(schedule, manifest, kinds, retry_missing, missing_days)
+            final = sum(1 for game in schedule.values() if game['state'] in FINAL_STATES)
+            counts = {'scheduled': len(schedule), 'final': final, 'total': len(downloads), 'skipped': final * len(kinds) - len(downloads), 'done': 0, 'missing': 0, 'failed': 0}
+            print("game_pull_async:", len(schedule), "games scheduled from", start_date, "to", end_date, "-", final, "final,", counts['total'], "downloads to do", flush=True)
+            await run_downloads(session, downloads, settings, manifest_file, concurrency, counts)
+    return counts
+
+
+def sync_games(start_date, end_date=None, **kwargs):
+    """
+    This function runs sync_games_async() to completion from ordinary (non-async) code and returns its counts, or None if the schedule could not be downloaded.
+    It takes the same keyword arguments.
+
+    Example usage:
+    counts = sync_games(*get_season_dates(2022))
+    """
+    return asyncio.run(sync_games_async(start_date, end_date, **kwargs))
+
+
+def pull_games(game_ids, **kwargs):
+    """
+    This function runs pull_games_async() to completion from ordinary (non-async) code and returns its counts. It takes the same keyword arguments.
+
+    Example usage:
+    counts = pull_games(get_game_ids(2012, 2021))
+    """
+    return asyncio.run(pull_games_async(game_ids, **kwargs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download NHL game feeds and shift charts concurrently, resuming from a manifest.")
+    parser.add_argument('--sync', action='store_true', help="download the new or changed final games in the schedule instead of counting gameIDs")
+    parser.add_argument('--season', type=int, help="with --sync, sync this whole season (e.g. 2022 for 2022-23)")
+    parser.add_argument('--start-date', type=datetime.date.fromisoformat, help="with --sync, first schedule date (YYYY-MM-DD)")
+    parser.add_argument('--end-date', type=datetime.date.fromisoformat, help="with --sync, last schedule date (default today)")
+    parser.add_argument('--days', type=int, help="with --sync, sync the last this many days up to --end-date")
+    parser.add_argument('--game-types', default='R,P', help="with --sync, comma-separated game types to sync (default R,P)")
+    parser.add_argument('--start-year', type=int, help="first season to download")
+    parser.add_argument('--end-year', type=int, help="season to stop before, as in game_pull()")
+    parser.add_argument('--game-id', type=int, action='append', help="download this gameID; can be repeated, instead of or as well as the years")
+    parser.add_argument('--only', choices=['games', 'shifts'], default=None, help="download only game feeds or only shift charts")
+    parser.add_argument('--games-dir', default='./games')
+    parser.add_argument('--shifts-dir', default='./shifts')
+    parser.add_argument('--manifest', default='./pull_manifest.jsonl', help="file recording finished downloads (default ./pull_manifest.jsonl)")
+    parser.add_argument('--game-rate', type=float, default=1.0, help="game feed requests per second (default 1)")
+    parser.add_argument('--shift-rate', type=float, default=1.0, help="shift chart requests per second (default 1)")
+    parser.add_argument('--burst', type=int, default=4, help="requests each endpoint may send at once after a pause (default 4)")
+    parser.add_argument('--concurrency', type=int, default=8, help="requests in flight at once (default 8)")
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--backoff', type=float, default=1.0, help="seconds before the first retry, doubled on each retry (default 1)")
+    parser.add_argument('--timeout', type=float, default=30, help="seconds before a request is abandoned and retried (default 30)")
+    parser.add_argument('--retry-missing', action='store_true', help="ask again for games the manifest lists as missing")
+    parser.add_argument('--missing-days', type=int, default=7, help="with --sync, stop asking again for missing games this many days after they were played (default 7)")
+    parser.add_argument('--game-url', default=GAME_URL, help="game feed URL template with {gameID}")
+    parser.add_argument('--shift-url', default=SHIFT_URL, help="shift chart URL template with {gameID}")
+    parser.add_argument('--compression', choices=['none', 'gzip', 'zstd'], default='none', help="store the files compressed (default none)")
+    parser.add_argument('--slim', action='store_true', help="store only the fields the readers use, see feed_io.py")
+    parser.add_argument('--schedule-url', default=SCHEDULE_URL, help="schedule URL template with {start_date}, {end_date} and {game_types}")
+    args = parser.parse_args()
+
+    kinds = (args.only,) if args.only is not None else ('games', 'shifts')
+    download_args = {'games_directory': args.games_dir, 'shifts_directory': args.shifts_dir, 'manifest_path': args.manifest, 'kinds': kinds,
+                     'game_rate': args.game_rate, 'shift_rate': args.shift_rate, 'burst': args.burst, 'concurrency': args.concurrency,
+                     'retries': args.retries, 'backoff': args.backoff, 'timeout': args.timeout, 'game_url': args.game_url, 'shift_url': args.shift_url,
+                     'compression': None if args.compression == 'none' else args.compression, 'slim': args.slim}
+    if args.sync:
+        end_date = args.end_date or datetime.date.today()
+        if args.season is not None:
+            start_date, end_date = get_season_dates(args.season)
+        elif args.start_date is not None:
+            start_date = args.start_date
+        elif args.days is not None:
+            start_date = end_date - datetime.timedelta(days=args.days)
+        else:
+            parser.error("--sync needs --season, --start-date or --days")
+        counts = sync_games(start_date, end_date, game_types=tuple(args.game_types.split(',')), schedule_url=args.schedule_url,
+                            retry_missing=args.retry_missing, missing_days=args.missing_days, **download_args)
+        if counts is None:
+            return 1
+        print("game_pull_async:", counts['done'], "downloaded,", counts['missing'], "missing,", counts['failed'], "failed,", counts['skipped'], "already up to date")
+        return 1 if counts['failed'] > 0 else 0
+
+    game_ids = list(args.game_id or [])
+    if args.start_year is not None:
+        game_ids += get_game_ids(args.start_year, args.end_year if args.end_year is not None else args.start_year + 1)
+    if len(game_ids) == 0:
+        parser.error("give --sync, --start-year or --game-id")
+    counts = pull_games(game_ids, retry_missing=args.retry_missing, **download_args)
+    print("game_pull_async:", counts['done'], "downloaded,", counts['missing'], "missing,", counts['failed'], "failed,", counts['skipped'], "skipped")
+    return 1 if counts['failed'] > 0 else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+This script microbenchmarks the hot lookup functions of init_script_defines.py with benchmark_function():
+on-ice lookups, shot pct lookups and the per-player ratio functions, each cycling through a fixed sample of real inputs.
+It prints min/median/p95/p99 per function, writes the results to a .json file,
+and compares them against a stored baseline, exiting with status 1 if any function's median slowed down by more than --threshold.
+
+Usage:
+python benchmark_functions.py --games ../Capstone/api/games --shifts ../Capstone/api/shifts --output bench.json --baseline bench_baseline.json
+python benchmark_functions.py --synthetic-games 40 --output bench.json --update-baseline bench_baseline.json
+
+With --synthetic-games the inputs come from a synthetic corpus made by synthetic_corpus.py, so the same inputs can be benchmarked anywhere without real data.
+The functions print progress lines of their own; their output is sent to os.devnull while they run so the terminal does not slow them down unevenly.
+"""
+
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+
+import init_script_defines as sadd_defines
+
+
+def get_benchmark_inputs(games_directory, shifts_directory, n_samples=200):
+    """
+    This function builds the dictionaries and arrays the benchmarked functions read, and picks a fixed sample of shots and players to query.
+    """
+    base_dicts = sadd_defines.build_base_dicts(games_directory, shifts_directory)
+    inputs = dict(base_dicts)
+    shot_table = base_dicts['shot_table']
+    inputs['shots_on_ice'] = sadd_defines.build_shots_on_ice(shot_table, base_dicts['shift_intervals'], base_dicts['home_away_teams'])
+    inputs['lookup_dicts'] = sadd_defines.build_lookup_dicts(shot_table=shot_table)
+    inputs['player_cell_pcts'] = sadd_defines.build_player_cell_pcts(sadd_defines.build_player_cell_counts(shot_table))
+    inputs['coordinate_shots'] = sadd_defines.build_coordinate_shots(games_trimmed=base_dicts['games_trimmed'])
+    inputs['grouped_data'] = sadd_defines.build_grouped_data(games_trimmed=base_dicts['games_trimmed'], coordinate_shots=inputs['coordinate_shots'])
+    inputs['grouped_counts'] = sadd_defines.build_grouped_counts(games_trimmed=base_dicts['games_trimmed'], grouped_data=inputs['grouped_data'])
+    # Spread the sampled shots evenly over the table, so every run queries the same shots
+    step = max(1, len(shot_table['game_id']) // n_samples)
+    rows = list(range(0, len(shot_table['game_id']), step))[:n_samples]
+    inputs['sample_shots'] = [(int(shot_table['game_id'][row]), int(shot_table['shot_num'][row]), int(shot_table['period'][row]),
+                               int(shot_table['period_seconds'][row]), float(shot_table['x'][row]), float(shot_table['y'][row])) for row in rows]
+    inputs['sample_players'] = sorted(set(int(shot_table['shooter'][row]) for row in rows))
+    inputs['sample_player_shots'] = {player: sadd_defines.get_player_shots(player, games_trimmed=base_dicts['games_trimmed'], shot_table=shot_table, shots_on_ice=inputs['shots_on_ice']) for player in inputs['sample_players'][:20]}
+    return inputs
+
+
+def get_benchmark_cases(inputs):
+    """
+    This function returns the functions to benchmark as a list of (name, zero-argument callable) pairs.
+    Each callable queries the next sampled input on every call.
+    """
+    lookup_dicts = inputs['lookup_dicts']
+    shared = {'games_trimmed': inputs['games_trimmed'], 'player_id_set': lookup_dicts['player_id_set'], 'player_teams': lookup_dicts['player_teams'],
+              'team_set': lookup_dicts['team_set'], 'team_games': lookup_dicts['team_games'], 'player_id_games': lookup_dicts['player_id_games']}
+    shots = itertools.cycle(inputs['sample_shots'])
+    players = itertools.cycle(inputs['sample_player_shots'].items())
+    shot_table = inputs['shot_table']
+    shift_intervals = inputs['shift_intervals']
+    game_shifts = inputs['game_shifts']
+    player_cell_pcts = inputs['player_cell_pcts']
+    batch = inputs['sample_shots']
+    batch_games = [shot[0] for shot in batch]
+    batch_periods = [shot[2] for shot in batch]
+    batch_seconds = [shot[3] for shot in batch]
+
+    def period_time(seconds):
+        return "%02d:%02d" % (seconds // 60, seconds % 60)
+
+    def on_ice_dict():
+        gameID, shotID, period, seconds, x, y = next(shots)
+        return sadd_defines.get_players_on_ice(gameID, period, period_time(seconds), game_shifts=game_shifts)
+
+    def on_ice_intervals():
+        gameID, shotID, period, seconds, x, y = next(shots)
+        return sadd_defines.get_players_on_ice(gameID, period, period_time(seconds), shift_intervals=shift_intervals)
+
+    def on_ice_batch():
+        return sadd_defines.get_players_on_ice_batch(batch_games, batch_periods, batch_seconds, shift_intervals)
+
+    def shot_pct():
+        gameID, shotID, period, seconds, x, y = next(shots)
+        return sadd_defines.get_shot_pct(gameID, shotID, shot_table=shot_table, player_cell_pcts=player_cell_pcts)
+
+    def shooter_pct():
+        gameID, shotID, period, seconds, x, y = next(shots)
+        return sadd_defines.get_shooter_pct(gameID, shotID, shot_table=shot_table, player_cell_pcts=player_cell_pcts)
+
+    def goal_shot_ratio():
+        player, player_shots = next(players)
+        return sadd_defines.get_goal_shot_ratio(player, player_shots=player_shots, **shared)
+
+    def coordinate_goal_shot_ratio():
+        gameID, shotID, period, seconds, x, y = next(shots)
+        return sadd_defines.get_coordinate_goal_shot_ratio(x, y, coordinate_shots=inputs['coordinate_shots'], **shared)
+
+    def player_avg_pct_and_groups():
+        player, player_shots = next(players)
+        return sadd_defines.get_player_avg_pct_and_groups(player, grouped_data=inputs['grouped_data'], player_shots=player_shots, grouped_counts=inputs['grouped_counts'], **shared)
+
+    return [('get_players_on_ice[game_shifts]', on_ice_dict),
+            ('get_players_on_ice[shift_intervals]', on_ice_intervals),
+            ('get_players_on_ice_batch[%d]' % len(batch), on_ice_batch),
+            ('get_shot_pct', shot_pct),
+            ('get_shooter_pct', shooter_pct),
+            ('get_goal_shot_ratio', goal_shot_ratio),
+            ('get_coordinate_goal_shot_ratio', coordinate_goal_shot_ratio),
+            ('get_player_avg_pct_and_groups', player_avg_pct_and_groups)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark the hot lookup functions and compare against a stored baseline.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--games', help="directory of game .json files (needs --shifts)")
+    source.add_argument('--synthetic-games', type=int, help="benchmark on a synthetic corpus of this many games")
+    parser.add_argument('--shifts', help="directory of shift .json files")
+    parser.add_argument('-n', type=int, default=200, help="timed calls per function (default 200)")
+    parser.add_argument('--warmup', type=int, default=20, help="untimed calls per function before timing (default 20)")
+    parser.add_argument('--only', action='append', help="only run functions whose name contains this text; can be repeated")
+    parser.add_argument('--output', default=None, help="write the results to this .json file")
+    parser.add_argument('--baseline', default=None, help="compare against the results in this .json file")
+    parser.add_argument('--update-baseline', default=None, help="write the results to this .json file as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="fail if a median is more than this fraction slower than the baseline (default 0.2)")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        if args.synthetic_games is not None:
+            import synthetic_corpus
+            corpus_directory = stack.enter_context(tempfile.TemporaryDirectory())
+            synthetic_corpus.generate_corpus(corpus_directory, n_games=args.synthetic_games)
+            games_directory = os.path.join(corpus_directory, 'games')
+            shifts_directory = os.path.join(corpus_directory, 'shifts')
+        else:
+            if args.shifts is None:
+                parser.error("--games needs --shifts")
+            games_directory = args.games
+            shifts_directory = args.shifts
+        inputs = get_benchmark_inputs(games_directory, shifts_directory)
+
+    results = []
+    print()
+    print("%-40s %12s %12s %12s %12s" % ("function", "min us", "median us", "p95 us", "p99 us"))
+    for name, case in get_benchmark_cases(inputs):
+        if args.only is not None and not any(text in name for text in args.only):
+            continue
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = sadd_defines.benchmark_function(case, n=args.n, warmup=args.warmup, name=name)
+        results.append(result)
+        print("%-40s %12.2f %12.2f %12.2f %12.2f" % (name, result['min_ns'] / 1000, result['median_ns'] / 1000, result['p95_ns'] / 1000, result['p99_ns'] / 1000), flush=True)
+
+    for file_path in (args.output, args.update_baseline):
+        if file_path is not None:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=4)
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = sadd_defines.compare_benchmarks(results, baseline, threshold=args.threshold)
+        print()
+        if len(regressions) == 0:
+            print("No function is more than %d%% slower than the baseline." % round(args.threshold * 100))
+            return 0
+        for regression in regressions:
+            print("%-40s %.2fx slower than the baseline median (%.2f us -> %.2f us)" % (regression['name'], regression['ratio'], regression['baseline'] / 1000, regression['current'] / 1000))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
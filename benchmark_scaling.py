@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""
+This script measures how the SADD pipeline scales with the size of the corpus.
+For each corpus size it generates (or reuses) a synthetic corpus with synthetic_corpus.py, then runs the pipeline stages on it in a fresh process:
+    ingest: build_base_dicts()
+    indexes: build_game_shifts(), build_shift_intervals(), build_game_index(), build_shots_on_ice() and build_lookup_dicts()
+    pct_grids: build_player_cell_counts() and build_player_cell_pcts()
+    sadd: build_sadd()
+and reports each stage's wall time, the throughput in games and shots per second, and the peak resident memory of the process.
+Each stage's time is compared between consecutive sizes as a scaling exponent (1.0 is linear);
+stages that grow faster than --max-exponent are flagged and make the script exit with status 1, so super-linear regressions are caught early.
+
+Usage:
+python benchmark_scaling.py --sizes 10,40,160,640 --corpus-dir ./data/synthetic --json scaling.json
+"""
+
+
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+STAGES = ('ingest', 'indexes', 'pct_grids', 'sadd')
+
+
+def get_peak_rss_mb():
+    """
+    This function returns the peak resident memory of this process so far in megabytes (ru_maxrss is in kilobytes on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_benchmark_case(games_directory, shifts_directory, workers=None):
+    """
+    This function runs the pipeline stages once on a corpus and returns their wall times, the peak memory after each stage and the corpus size.
+    It is run in a fresh process for each corpus, so the peak memory of one size does not carry over to the next.
+    """
+    import init_script_defines as sadd_defines
+    result = {'seconds': {}, 'peak_rss_mb': {}}
+    start_time = time.perf_counter()
+    base_dicts = sadd_defines.build_base_dicts(games_directory, workers=workers, keep_games_trimmed=False)
+    result['seconds']['ingest'] = time.perf_counter() - start_time
+    result['peak_rss_mb']['ingest'] = get_peak_rss_mb()
+
+    start_time = time.perf_counter()
+    game_shifts = sadd_defines.build_game_shifts(directory=shifts_directory, home_away_teams=base_dicts['home_away_teams'], workers=workers)
+    shift_intervals = sadd_defines.build_shift_intervals(game_shifts=game_shifts)
+    sadd_defines.build_game_index(base_dicts['shot_table'], base_dicts['game_info'], shift_intervals)
+    shots_on_ice = sadd_defines.build_shots_on_ice(base_dicts['shot_table'], shift_intervals, base_dicts['home_away_teams'])
+    sadd_defines.build_lookup_dicts(shot_table=base_dicts['shot_table'])
+    result['seconds']['indexes'] = time.perf_counter() - start_time
+    result['peak_rss_mb']['indexes'] = get_peak_rss_mb()
+
+    start_time = time.perf_counter()
+    player_cell_pcts = sadd_defines.build_player_cell_pcts(sadd_defines.build_player_cell_counts(base_dicts['shot_table']))
+    result['seconds']['pct_grids'] = time.perf_counter() - start_time
+    result['peak_rss_mb']['pct_grids'] = get_peak_rss_mb()
+
+    start_time = time.perf_counter()
+    sadd_defines.build_sadd(shot_table=base_dicts['shot_table'], shots_on_ice=shots_on_ice, player_cell_pcts=player_cell_pcts)
+    result['seconds']['sadd'] = time.perf_counter() - start_time
+    result['peak_rss_mb']['sadd'] = get_peak_rss_mb()
+
+    result['games'] = len(base_dicts['home_away_teams'])
+    result['shots'] = len(base_dicts['shot_table']['game_id'])
+    result['shifts'] = len(shift_intervals['player'])
+    return result
+
+
+def get_corpus(corpus_root, n_games, seed, workers):
+    """
+    This function returns the games and shifts directories of a synthetic corpus of n_games games, generating it first if it is not there yet.
+    """
+    import synthetic_corpus
+    corpus_directory = os.path.join(corpus_root, "games_" + str(n_games) + "_seed_" + str(seed))
+    games_directory = os.path.join(corpus_directory, 'games')
+    shifts_directory = os.path.join(corpus_directory, 'shifts')
+    if not os.path.isdir(games_directory) or len(os.listdir(games_directory)) != n_games:
+        print("benchmark_scaling: Generating", n_games, "games in", corpus_directory, flush=True)
+        synthetic_corpus.generate_corpus(corpus_directory, n_games=n_games, seed=seed, workers=workers)
+    return (games_directory, shifts_directory)
+
+
+def get_scaling_exponents(results, min_seconds=0.05):
+    """
+    This function returns, for each stage and each pair of consecutive sizes, the exponent k in time ~ games^k between them.
+    Pairs where the smaller run took less than min_seconds are skipped, since timer noise dominates them.
+    """
+    exponents = []
+    for smaller, larger in zip(results, results[1:]):
+        for stage in STAGES:
+            if smaller['seconds'][stage] < min_seconds or larger['games'] <= smaller['games']:
+                continue
+            exponent = math.log(larger['seconds'][stage] / smaller['seconds'][stage]) / math.log(larger['games'] / smaller['games'])
+            exponents.append({'stage': stage, 'from_games': smaller['games'], 'to_games': larger['games'], 'exponent': exponent})
+    return exponents
+
+
+def print_report(results, exponents, max_exponent):
+    print()
+    print("%8s %9s %9s" % ("games", "shots", "shifts") + "".join(" %11s" % (stage + " s") for stage in STAGES) + " %10s %11s %9s" % ("games/s", "shots/s", "peak MB"))
+    for result in results:
+        total_seconds = sum(result['seconds'].values())
+        line = "%8d %9d %9d" % (result['games'], result['shots'], result['shifts'])
+        line += "".join(" %11.3f" % result['seconds'][stage] for stage in STAGES)
+        line += " %10.1f %11.1f %9.1f" % (result['games'] / total_seconds, result['shots'] / total_seconds, max(result['peak_rss_mb'].values()))
+        print(line)
+    if len(exponents) > 0:
+        print()
+        print("Scaling exponents (1.0 is linear):")
+        for exponent in exponents:
+            flag = "  <-- super-linear" if exponent['exponent'] > max_exponent else ""
+            print("    %-10s %7d -> %7d games: %5.2f%s" % (exponent['stage'], exponent['from_games'], exponent['to_games'], exponent['exponent'], flag))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark how the SADD pipeline scales with corpus size.")
+    parser.add_argument('--sizes', default='10,40,160,640', help="comma-separated corpus sizes in games (default 10,40,160,640)")
+    parser.add_argument('--corpus-dir', default='./data/synthetic', help="where the synthetic corpora are generated and kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes for generating and parsing the files")
+    parser.add_argument('--max-exponent', type=float, default=1.25, help="flag stages whose time grows faster than games^max_exponent")
+    parser.add_argument('--json', default=None, help="also write the results to this .json file")
+    parser.add_argument('--verbose', action='store_true', help="show the pipeline's own output")
+    parser.add_argument('--run-case', nargs=3, metavar=('GAMES', 'SHIFTS', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child mode: run one corpus and write the measurements for the parent
+    if args.run_case is not None:
+        result = run_benchmark_case(args.run_case[0], args.run_case[1], workers=args.workers)
+        with open(args.run_case[2], 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return 0
+
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    results = []
+    for n_games in sizes:
+        games_directory, shifts_directory = get_corpus(args.corpus_dir, n_games, args.seed, args.workers)
+        with tempfile.TemporaryDirectory() as temp_directory:
+            output_path = os.path.join(temp_directory, "result.json")
+            command = [sys.executable, os.path.abspath(__file__), '--run-case', games_directory, shifts_directory, output_path]
+            if args.workers is not None:
+                command += ['--workers', str(args.workers)]
+            print("benchmark_scaling: Running", n_games, "games", flush=True)
+            output = None if args.verbose else subprocess.DEVNULL
+            subprocess.run(command, check=True, stdout=output, cwd=os.path.dirname(os.path.abspath(__file__)))
+            with open(output_path, encoding='utf-8') as f:
+                results.append(json.load(f))
+    exponents = get_scaling_exponents(results)
+    print_report(results, exponents, args.max_exponent)
+    if args.json is not None:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'exponents': exponents, 'max_exponent': args.max_exponent}, f, indent=4)
+    if any(exponent['exponent'] > args.max_exponent for exponent in exponents):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+This script checks the streaming feed reader in feed_io.py against read_feed(), which parses the whole document, at chunk sizes small enough that
+every string, number, escape and bracket of a feed is split across chunks somewhere. For every feed and chunk size it checks that:
+    walk_feed_object() finds the same header fields (HEADER_GAME_FIELDS) and plays as project_fields() on the parsed document, without falling back to read_feed()
+    walk_feed_object() with plays_path=None finds the same slim document (SLIM_GAME_FIELDS)
+    iter_feed_plays() returns the same header and plays, and read_feed_header() the same header
+The feeds are live-data-example.json, a copy of it with hard strings (escaped quotes and backslashes, brackets and braces inside strings, non-ASCII text)
+and odd values in the fields that are kept, the fields that are skipped and the plays, written in every stored form and key order,
+and a synthetic corpus in every stored form; or, with --games, the feeds in a directory.
+It prints the mismatches and exits with status 1 if there are any, so a change to SLIM_GAME_FIELDS, HEADER_GAME_FIELDS or the reader can be checked.
+
+Usage:
+python check_feed_io.py
+python check_feed_io.py --synthetic-games 4 --chunk-sizes 3,7,64,65536
+python check_feed_io.py --games ../Capstone/api/games --chunk-sizes 13,101,4099
+"""
+
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import sys
+import tempfile
+
+from feed_io import (HEADER_GAME_FIELDS, SLIM_GAME_FIELDS, iter_feed_plays, list_feed_files, make_feed_reader, open_feed_text, project_fields,
+                     read_feed, read_feed_header, walk_feed_object, write_feed, zstandard)
+
+
+GAME_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'live-data-example.json')
+
+# Strings that end a naive scan early: escaped quotes next to brackets, runs of backslashes, and escapes that decode to brackets
+HARD_STRINGS = ['He said \\"}]\\" then [{', '"', '\\', '\\\\"', '"]}', '[{"nested": "quote"}]', 'back\\slash\\', '\\u005d\\u007d',
+                'café ü 中   \U0001f3d2', ',', ':', '}', '] ,', '']
+# Values of every JSON type, nested, for the fields that are skipped without being parsed
+HARD_VALUES = {'strings': HARD_STRINGS, 'numbers': [0, -1, 1.5e-3, -2.25E+10, 12345678901234567890, 0.1], 'literals': [True, False, None],
+               'empty': [{}, [], ''], 'nested': [[[{'a': [']', '}']}]], {'k"}': {'"': '\\'}}], 'key]"{': 'value'}
+
+
+def list_feed_paths(directory):
+    """
+    This function returns the paths of the feed files in directory, in any stored form.
+    """
+    return [os.path.join(directory, file_name) for file_name in list_feed_files(directory)]
+
+
+def make_hard_feed(game_data):
+    """
+    This function returns a copy of game_data with HARD_STRINGS and HARD_VALUES in fields that are skipped, kept whole and walked, and in the plays.
+    """
+    game_data = copy.deepcopy(game_data)
+    game_data['copyright'] = HARD_STRINGS[0]
+    game_data['metaData'] = HARD_VALUES
+    game_data['gameData']['unknown'] = HARD_VALUES
+    game_data['gameData']['venue']['name'] = HARD_STRINGS[0]
+    for team in game_data['gameData']['teams'].values():
+        team['name'] = HARD_STRINGS[3]
+        team['unknown'] = HARD_VALUES
+    game_data['liveData']['decisions'] = HARD_VALUES
+    game_data['liveData']['boxscore']['unknown'] = [HARD_VALUES, HARD_STRINGS]
+    plays = game_data['liveData']['plays']['allPlays']
+    for index, string in enumerate(HARD_STRINGS):
+        plays[index]['result']['description'] = string
+        plays[index]['unknown'] = HARD_VALUES
+    plays.append(HARD_VALUES)
+    plays.append({'result': {'event': 'Shot', 'description': HARD_STRINGS}, 'about': {}})
+    return game_data
+
+
+def write_check_feeds(directory, n_synthetic_games):
+    """
+    This function writes the feeds to check to directory and returns their paths:
+    live-data-example.json, its hard copy in every stored form (indented in the API's key order, and compact in sorted key order with non-ASCII text unescaped),
+    and a synthetic corpus of n_synthetic_games games in every stored form.
+    """
+    with open(GAME_DATA_PATH, encoding='utf-8') as f:
+        game_data = json.load(f)
+    hard_data = make_hard_feed(game_data)
+    feed_paths = [GAME_DATA_PATH]
+    compressions = [None, 'gzip'] + (['zstd'] if zstandard is not None else [])
+    for compression in compressions:
+        for slim in (False, True):
+            form_directory = os.path.join(directory, 'hard', str(compression) + ('-slim' if slim else ''))
+            os.makedirs(form_directory)
+            write_feed(form_directory, game_data['gamePk'], hard_data, compression=compression, slim=slim)
+            feed_paths += list_feed_paths(form_directory)
+    for sort_keys, ensure_ascii, indent in ((False, True, 4), (True, False, None)):
+        feed_path = os.path.join(directory, 'hard', "game_%d_%s.json" % (game_data['gamePk'], 'sorted' if sort_keys else 'indented'))
+        with open(feed_path, 'w', encoding='utf-8') as f:
+            json.dump(hard_data, f, sort_keys=sort_keys, ensure_ascii=ensure_ascii, indent=indent)
+        feed_paths.append(feed_path)
+    if n_synthetic_games > 0:
+        import synthetic_corpus
+        for compression in compressions:
+            for slim in (False, True):
+                corpus_directory = os.path.join(directory, 'synthetic', str(compression) + ('-slim' if slim else ''))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    synthetic_corpus.generate_corpus(corpus_directory, n_games=n_synthetic_games, compression=compression, slim=slim)
+                feed_paths += list_feed_paths(os.path.join(corpus_directory, 'games'))
+    return feed_paths
+
+
+def get_feed_mismatches(file_path, chunk_size):
+    """
+    This function reads file_path with the streaming reader at chunk_size in every way the module offers and returns a list describing each way
+    that disagrees with read_feed(). The walks are also run directly, so a fallback to read_feed() cannot hide a mismatch.
+    """
+    game_data = read_feed(file_path)
+    expected_header = project_fields(game_data, HEADER_GAME_FIELDS)
+    expected_plays = game_data['liveData']['plays']['allPlays']
+    mismatches = []
+
+    # The walk the module streams plays with, header fields and plays together
+    header = {}
+    try:
+        with open_feed_text(file_path) as stream:
+            plays = [play for play in walk_feed_object(make_feed_reader(stream, chunk_size), HEADER_GAME_FIELDS, header) if play is not None]
+    except ValueError as error:
+        mismatches.append("walk_feed_object() raised " + repr(error))
+    else:
+        if header != expected_header:
+            mismatches.append("walk_feed_object() header")
+        if plays != expected_plays:
+            mismatches.append("walk_feed_object() plays")
+
+    # The same walk over the slim fields, with the plays kept in the document
+    slim_data = {}
+    try:
+        with open_feed_text(file_path) as stream:
+            for play in walk_feed_object(make_feed_reader(stream, chunk_size), SLIM_GAME_FIELDS, slim_data, plays_path=None):
+                pass
+    except ValueError as error:
+        mismatches.append("walk_feed_object(plays_path=None) raised " + repr(error))
+    else:
+        if slim_data != project_fields(game_data, SLIM_GAME_FIELDS):
+            mismatches.append("walk_feed_object(plays_path=None) slim document")
+
+    # The public functions
+    header, plays = iter_feed_plays(file_path, chunk_size=chunk_size)
+    plays = list(plays)
+    if header != expected_header:
+        mismatches.append("iter_feed_plays() header")
+    if plays != expected_plays:
+        mismatches.append("iter_feed_plays() plays")
+    if read_feed_header(file_path, chunk_size=chunk_size) != expected_header:
+        mismatches.append("read_feed_header()")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the streaming feed reader against read_feed() at small chunk sizes.")
+    parser.add_argument('--games', help="check the game feeds in this directory instead of the generated ones")
+    parser.add_argument('--synthetic-games', type=int, default=2, help="synthetic games to generate in each stored form (default 2)")
+    parser.add_argument('--chunk-sizes', default='1,2,3,5,7,11,13,101,4099', help="comma-separated chunk sizes to read at")
+    args = parser.parse_args()
+    chunk_sizes = [int(chunk_size) for chunk_size in args.chunk_sizes.split(',')]
+
+    failed = 0
+    with tempfile.TemporaryDirectory() as directory:
+        feed_paths = list_feed_paths(args.games) if args.games is not None else write_check_feeds(directory, args.synthetic_games)
+        for chunk_size in chunk_sizes:
+            n_mismatched = 0
+            for feed_path in feed_paths:
+                mismatches = get_feed_mismatches(feed_path, chunk_size)
+                if len(mismatches) > 0:
+                    n_mismatched += 1
+                    print("    chunk size", chunk_size, os.path.relpath(feed_path, args.games or directory) + ":", ", ".join(mismatches))
+            print("check_feed_io: Chunk size", chunk_size, "-", n_mismatched, "of", len(feed_paths), "feeds mismatched", flush=True)
+            failed += n_mismatched
+    return 1 if failed > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
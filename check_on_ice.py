@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+This script checks that the three ways of finding the players on the ice agree on every shot of a corpus:
+    get_players_on_ice() on game_shifts, the original per-player scan of the shift tuples
+    get_players_on_ice_batch() on shift_intervals, the batched binary search
+    build_shots_on_ice(), the sweep the pipeline uses
+It prints the number of shots where they disagree and exits with status 1 if there are any, so a change to any of them can be checked against the others.
+A synthetic corpus also gets a shift that ends before it starts, which every lookup has to leave out.
+
+Usage:
+python check_on_ice.py --synthetic-games 12
+python check_on_ice.py --games ../Capstone/api/games --shifts ../Capstone/api/shifts --limit 5000
+"""
+
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import init_script_defines as sadd_defines
+from feed_io import list_feed_files, read_feed
+
+
+def add_inverted_shift(shifts_directory):
+    """
+    This function adds a shift that ends before it starts, early in the first period, to the first shift chart of a synthetic corpus (stored as plain JSON).
+    A lookup that kept it would put its player on the ice for shots after it, in that game or later ones.
+    """
+    file_path = os.path.join(shifts_directory, list_feed_files(shifts_directory)[0])
+    shift_data = read_feed(file_path)
+    shift = dict(shift_data['data'][0], id=0, period=1, startTime='05:00', endTime='01:00')
+    shift_data['data'].append(shift)
+    shift_data['total'] = len(shift_data['data'])
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(shift_data, f)
+
+
+def get_on_ice_mismatches(base_dicts, limit=None):
+    """
+    This function looks up the players on the ice for the first limit shots of base_dicts['shot_table'] (every shot if limit is None) in all three ways,
+    and returns the rows where the batch lookup disagrees with the scalar lookup or with the sweep, as {'scalar': [rows], 'sweep': [rows]}.
+    """
+    shot_table = base_dicts['shot_table']
+    shift_intervals = base_dicts['shift_intervals']
+    rows = range(len(shot_table['game_id']))
+    if limit is not None:
+        rows = rows[:limit]
+    offsets, players, sides = sadd_defines.get_players_on_ice_batch(shot_table['game_id'], shot_table['period'], shot_table['period_seconds'], shift_intervals)
+    shots_on_ice = sadd_defines.build_shots_on_ice(shot_table, shift_intervals, base_dicts['home_away_teams'])
+    mismatches = {'scalar': [], 'sweep': []}
+    for row in rows:
+        batch_players = sorted(players[offsets[row]:offsets[row + 1]].tolist())
+        seconds = int(shot_table['period_seconds'][row])
+        period_time = "%02d:%02d" % (seconds // 60, seconds % 60)
+        scalar_players = sadd_defines.get_players_on_ice(int(shot_table['game_id'][row]), int(shot_table['period'][row]), period_time, game_shifts=base_dicts['game_shifts'])
+        if batch_players != sorted(scalar_players):
+            mismatches['scalar'].append(row)
+        sweep_players = np.concatenate([shots_on_ice['shooting_players'][shots_on_ice['shooting_offsets'][row]:shots_on_ice['shooting_offsets'][row + 1]],
+                                        shots_on_ice['defending_players'][shots_on_ice['defending_offsets'][row]:shots_on_ice['defending_offsets'][row + 1]]])
+        if batch_players != sorted(sweep_players.tolist()):
+            mismatches['sweep'].append(row)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the scalar, batched and sweep on-ice lookups agree on every shot.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--games', help="directory of game .json files (needs --shifts)")
+    source.add_argument('--synthetic-games', type=int, help="check a synthetic corpus of this many games")
+    parser.add_argument('--shifts', help="directory of shift .json files")
+    parser.add_argument('--limit', type=int, default=None, help="only check the first this many shots")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        if args.synthetic_games is not None:
+            import synthetic_corpus
+            corpus_directory = stack.enter_context(tempfile.TemporaryDirectory())
+            synthetic_corpus.generate_corpus(corpus_directory, n_games=args.synthetic_games)
+            games_directory = os.path.join(corpus_directory, 'games')
+            shifts_directory = os.path.join(corpus_directory, 'shifts')
+            add_inverted_shift(shifts_directory)
+        else:
+            if args.shifts is None:
+                parser.error("--games needs --shifts")
+            games_directory = args.games
+            shifts_directory = args.shifts
+        with contextlib.redirect_stdout(io.StringIO()):
+            base_dicts = sadd_defines.build_base_dicts(games_directory, shifts_directory, keep_games_trimmed=False)
+            mismatches = get_on_ice_mismatches(base_dicts, limit=args.limit)
+
+    n_checked = len(base_dicts['shot_table']['game_id']) if args.limit is None else min(args.limit, len(base_dicts['shot_table']['game_id']))
+    print("check_on_ice: Checked", n_checked, "shots")
+    print("    batch vs get_players_on_ice():", len(mismatches['scalar']), "mismatches")
+    print("    batch vs build_shots_on_ice():", len(mismatches['sweep']), "mismatches")
+    if len(mismatches['scalar']) > 0 or len(mismatches['sweep']) > 0:
+        print("    first mismatched rows:", (mismatches['scalar'] + mismatches['sweep'])[:10])
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,533 @@
+#!/usr/bin/env python
+"""
+This module reads and writes the downloaded game feed and shift chart files in any of their stored forms, so every reader can take whichever form is on disk:
+    game_<gameID>.json       plain JSON, as written by game_pull_api.ipynb
+    game_<gameID>.json.gz    gzip-compressed JSON
+    game_<gameID>.json.zst   zstd-compressed JSON (needs the zstandard package)
+Any of them can also be slim: a projection of the document that keeps only the fields the readers use (the ones listed in game-json-structure.txt
+and shift-json-structure.txt, plus the ones init_script_defines.py and sql_read_file.py read), in the same nested layout, so a slim file reads like a full one.
+Compressed and slim files are written without indentation.
+Game feeds can also be streamed with iter_feed_plays(), which yields the plays one at a time and keeps only the small header fields,
+so reading a feed never holds the whole document in memory. check_feed_io.py checks the streaming reader against read_feed() at small chunk sizes.
+
+Usage, to convert a directory that is already downloaded in place:
+python feed_io.py convert ../Capstone/api/games --kind game --compression gzip --slim
+python feed_io.py convert ../Capstone/api/shifts --kind shift --compression zstd --workers 8
+"""
+
+
+import argparse
+import gzip
+import io
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# The stored forms, most compact first; if a game is stored in more than one form, list_feed_files() picks the first
+FEED_EXTENSIONS = ('.json.zst', '.json.gz', '.json')
+COMPRESSION_EXTENSIONS = {None: '.json', 'gzip': '.json.gz', 'zstd': '.json.zst'}
+
+# The fields a slim document keeps. True keeps a value whole, a dictionary keeps those keys of a mapping,
+# '*' applies to every key of a mapping and '[]' to every item of a list
+SLIM_GAME_FIELDS = {
+    'gamePk': True,
+    'link': True,
+    'gameData': {
+        'game': {'pk': True, 'season': True, 'type': True},
+        'datetime': {'dateTime': True},
+        'status': {'abstractGameState': True, 'codedGameState': True},
+        'teams': {'*': {'id': True, 'name': True, 'abbreviation': True, 'triCode': True, 'venue': {'name': True, 'timeZone': {'offset': True}}}},
+        'players': {'*': {'id': True, 'fullName': True, 'person': {'id': True, 'fullName': True}}},
+        'venue': {'name': True},
+    },
+    'liveData': {
+        'plays': {'allPlays': {'[]': {
+            'players': {'[]': {'player': {'id': True, 'fullName': True}, 'playerType': True}},
+            'result': {'event': True, 'eventTypeId': True, 'description': True, 'emptyNet': True},
+            'about': {'eventIdx': True, 'period': True, 'periodTime': True},
+            'coordinates': {'x': True, 'y': True},
+            'team': {'id': True, 'name': True, 'triCode': True},
+        }}},
+        'linescore': {'currentPeriod': True, 'teams': {'*': {'goals': True}}},
+        'boxscore': {
+            'officials': {'[]': {'official': {'id': True, 'fullName': True, 'link': True}}},
+            'teams': {'*': {'players': {'*': {'person': {'id': True, 'fullName': True}}}}},
+        },
+    },
+}
+# The fields iter_feed_plays() keeps besides the plays: everything a slim game feed has except the plays themselves
+HEADER_GAME_FIELDS = {key: value for key, value in SLIM_GAME_FIELDS.items() if key != 'liveData'}
+HEADER_GAME_FIELDS['liveData'] = {key: value for key, value in SLIM_GAME_FIELDS['liveData'].items() if key != 'plays'}
+SLIM_SHIFT_FIELDS = {
+    'data': {'[]': {'id': True, 'gameId': True, 'playerId': True, 'teamId': True, 'teamAbbrev': True, 'period': True,
+                    'startTime': True, 'endTime': True, 'firstName': True, 'lastName': True}},
+    'total': True,
+}
+
+
+def get_feed_stem(file_name):
+    """
+    This function returns the file name without its stored-form extension (game_2012020711 for game_2012020711.json.gz), or None if it is not a feed file.
+    """
+    for extension in FEED_EXTENSIONS:
+        if file_name.endswith(extension):
+            return file_name[:-len(extension)]
+    return None
+
+
+def get_feed_game_id(file_name):
+    """
+    This function returns the gameID of a game_<gameID> feed file name in any stored form, or None if the name is not one.
+    """
+    stem = get_feed_stem(os.path.basename(file_name))
+    if stem is None or not stem.startswith("game_") or not stem[5:].isdigit():
+        return None
+    return int(stem[5:])
+
+
+def list_feed_files(directory):
+    """
+    This function returns the sorted names of the feed files in a directory, in any stored form.
+    If the same file is stored in more than one form, only the most compact one (the first in FEED_EXTENSIONS) is listed.
+    """
+    chosen = {}
+    for file_name in os.listdir(directory):
+        stem = get_feed_stem(file_name)
+        if stem is None:
+            continue
+        if stem not in chosen or FEED_EXTENSIONS.index(file_name[len(stem):]) < FEED_EXTENSIONS.index(chosen[stem][len(stem):]):
+            chosen[stem] = file_name
+    return sorted(chosen.values())
+
+
+def get_feed_path(directory, gameID, compression=None):
+    """
+    This function returns the path a game's feed or shift chart is stored at with the given compression (None, 'gzip' or 'zstd').
+    """
+    return os.path.join(directory, "game_" + str(gameID) + COMPRESSION_EXTENSIONS[compression])
+
+
+def check_compression(compression):
+    """
+    This function raises ValueError for an unknown compression and ImportError if zstd is asked for without the zstandard package.
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError("compression must be None, 'gzip' or 'zstd', not " + repr(compression))
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError("Writing .json.zst files needs the zstandard package: pip install zstandard")
+
+
+def read_feed_bytes(file_path):
+    """
+    This function returns the decompressed JSON bytes of a feed file in any stored form.
+    """
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    if file_path.endswith('.gz'):
+        return gzip.decompress(raw)
+    if file_path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("Reading .json.zst files needs the zstandard package: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(raw, max_output_size=1 << 30)
+    return raw
+
+
+def read_feed(file_path):
+    """
+    This function reads a game feed or shift chart file in any stored form and returns the parsed document.
+
+    Example usage:
+    game_data = read_feed('../Capstone/api/games/game_2012020711.json.gz')
+    """
+    return json.loads(read_feed_bytes(file_path))
+
+
+def project_fields(value, fields):
+    """
+    This function returns the part of a parsed JSON value described by fields (see SLIM_GAME_FIELDS). Keys that are missing from value are left out.
+    """
+    if fields is True:
+        return value
+    if isinstance(value, list):
+        if '[]' not in fields:
+            return value
+        return [project_fields(item, fields['[]']) for item in value]
+    if not isinstance(value, dict):
+        return value
+    projected = {}
+    if '*' in fields:
+        for key, item in value.items():
+            projected[key] = project_fields(item, fields['*'])
+        return projected
+    for key, key_fields in fields.items():
+        if key in value:
+            projected[key] = project_fields(value[key], key_fields)
+    return projected
+
+
+def slim_feed(data, kind='game'):
+    """
+    This function returns the slim projection of a game feed (kind='game') or a shift chart (kind='shift').
+    """
+    if kind == 'game':
+        return project_fields(data, SLIM_GAME_FIELDS)
+    return project_fields(data, SLIM_SHIFT_FIELDS)
+
+
+# Where the plays are in a game feed, how much decompressed text the streaming reader holds at a time, and the patterns it scans with
+PLAYS_PATH = ('liveData', 'plays', 'allPlays')
+FEED_CHUNK_SIZE = 1 << 16
+FEED_DECODER = json.JSONDecoder()
+NON_WHITESPACE_PATTERN = re.compile(r'[^ \t\n\r]')
+STRUCTURE_PATTERN = re.compile(r'["{}\[\]]')
+STRING_END_PATTERN = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+SCALAR_END_PATTERN = re.compile(r'[,}\] \t\n\r]')
+
+
+def open_feed_text(file_path):
+    """
+    This function opens a feed file in any stored form as a text stream of its decompressed JSON.
+    """
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    if file_path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("Reading .json.zst files needs the zstandard package: pip install zstandard")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True), encoding='utf-8')
+    return open(file_path, encoding='utf-8')
+
+
+def make_feed_reader(stream, chunk_size=FEED_CHUNK_SIZE):
+    """
+    This function returns the state of a streaming reader over a text stream: the unread text it holds, its position in that text and whether the stream has ended.
+    """
+    return {'stream': stream, 'buffer': '', 'position': 0, 'eof': False, 'chunk_size': chunk_size}
+
+
+def fill_feed_reader(reader, grow=False):
+    """
+    This function drops the text the reader has already read and appends the next chunk of the stream. It returns False at the end of the stream.
+    With grow, the chunk is at least as long as the unread text, so a value that is parsed again from its start after each fill is parsed a logarithmic number of times.
+    """
+    if reader['eof']:
+        return False
+    size = reader['chunk_size']
+    if grow:
+        size = max(size, len(reader['buffer']) - reader['position'])
+    chunk = reader['stream'].read(size)
+    if chunk == '':
+        reader['eof'] = True
+        return False
+    reader['buffer'] = reader['buffer'][reader['position']:] + chunk
+    reader['position'] = 0
+    return True
+
+
+def peek_char(reader):
+    """
+    This function skips whitespace and returns the next character without reading it.
+    """
+    while True:
+        match = NON_WHITESPACE_PATTERN.search(reader['buffer'], reader['position'])
+        if match is not None:
+            reader['position'] = match.start()
+            return reader['buffer'][reader['position']]
+        reader['position'] = len(reader['buffer'])
+        if not fill_feed_reader(reader):
+            raise ValueError("Unexpected end of the feed")
+
+
+def expect_char(reader, char):
+    """
+    This function reads the next character, skipping whitespace, and raises ValueError if it is not char.
+    """
+    if peek_char(reader) != char:
+        raise ValueError("Expected " + repr(char) + " in the feed, found " + repr(reader['buffer'][reader['position']]))
+    reader['position'] += 1
+
+
+def read_json_value(reader):
+    """
+    This function parses the next JSON value of the stream and returns it, reading more of the stream until the value is complete.
+    """
+    peek_char(reader)
+    while True:
+        try:
+            value, end = FEED_DECODER.raw_decode(reader['buffer'], reader['position'])
+        except ValueError:
+            if not fill_feed_reader(reader, grow=True):
+                raise
+            continue
+        # A number or literal that ends exactly at the end of the text may go on in the next chunk
+        if end == len(reader['buffer']) and fill_feed_reader(reader, grow=True):
+            continue
+        reader['position'] = end
+        return value
+
+
+def skip_json_string(reader):
+    """
+    This function reads past the rest of a JSON string whose opening quote has already been read.
+    """
+    while True:
+        match = STRING_END_PATTERN.match(reader['buffer'], reader['position'])
+        if match is not None:
+            reader['position'] = match.end()
+            return
+        if not fill_feed_reader(reader, grow=True):
+            raise ValueError("Unexpected end of the feed")
+
+
+def skip_json_value(reader):
+    """
+    This function reads past the next JSON value of the stream without parsing it, so skipped values never become Python objects.
+    """
+    char = peek_char(reader)
+    if char == '"':
+        reader['position'] += 1
+        skip_json_string(reader)
+        return
+    if char not in '{[':
+        # A number or literal ends at the next separator
+        while True:
+            match = SCALAR_END_PATTERN.search(reader['buffer'], reader['position'])
+            if match is not None:
+                reader['position'] = match.start()
+                return
+            reader['position'] = len(reader['buffer'])
+            if not fill_feed_reader(reader):
+                return
+    # An object or array ends where its brackets balance, not counting the ones inside strings
+    depth = 0
+    while True:
+        match = STRUCTURE_PATTERN.search(reader['buffer'], reader['position'])
+        if match is None:
+            reader['position'] = len(reader['buffer'])
+            if not fill_feed_reader(reader):
+                raise ValueError("Unexpected end of the feed")
+            continue
+        reader['position'] = match.end()
+        char = match.group()
+        if char == '"':
+            skip_json_string(reader)
+        elif char in '{[':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def walk_feed_plays(reader):
+    """
+    This function yields None once the reader is at the start of the plays list, then parses and yields the plays one at a time.
+    """
+    expect_char(reader, '[')
+    yield None
+    if peek_char(reader) == ']':
+        reader['position'] += 1
+        return
+    while True:
+        yield read_json_value(reader)
+        char = peek_char(reader)
+        reader['position'] += 1
+        if char == ']':
+            return
+        if char != ',':
+            raise ValueError("Expected ',' or ']' between the plays, found " + repr(char))
+
+
+def walk_feed_object(reader, fields, target, path=(), plays_path=PLAYS_PATH):
+    """
+    This function reads the JSON object at the reader and fills target with the part of it described by fields (see SLIM_GAME_FIELDS), as project_fields() would.
+    Nested objects are walked the same way and values outside fields are skipped without being parsed.
+    If the walk reaches plays_path, the plays found there are yielded through walk_feed_plays() instead of being kept; with plays_path=None nothing is yielded.
+    """
+    expect_char(reader, '{')
+    if peek_char(reader) == '}':
+        reader['position'] += 1
+        return
+    while True:
+        key = read_json_value(reader)
+        expect_char(reader, ':')
+        key_path = path + (key,)
+        if '*' in fields:
+            key_fields = fields['*']
+        else:
+            key_fields = fields.get(key, None)
+        on_plays_path = plays_path is not None and key_path == plays_path[:len(key_path)]
+        if on_plays_path and key_path == plays_path:
+            yield from walk_feed_plays(reader)
+        elif (on_plays_path or (key_fields is not None and key_fields is not True)) and peek_char(reader) == '{':
+            # Fill the nested object in place, so its fields can be read while the walk is still going on
+            nested = {}
+            if key_fields is not None:
+                target[key] = nested
+            if key_fields is True:
+                key_fields = {'*': True}
+            yield from walk_feed_object(reader, key_fields or {}, nested, key_path, plays_path)
+        elif key_fields is None:
+            skip_json_value(reader)
+        else:
+            target[key] = project_fields(read_json_value(reader), key_fields)
+        char = peek_char(reader)
+        reader['position'] += 1
+        if char == '}':
+            return
+        if char != ',':
+            raise ValueError("Expected ',' or '}' in the feed, found " + repr(char))
+
+
+def stream_feed_plays(file_path, header, header_fields, chunk_size=FEED_CHUNK_SIZE):
+    """
+    This function is the generator behind iter_feed_plays(). It yields None when the header fields before the plays have been read, then the plays.
+    If the feed does not have the expected layout and no play has been yielded yet, it falls back to parsing the whole document with read_feed().
+    """
+    started = False
+    yielded = False
+    try:
+        with open_feed_text(file_path) as stream:
+            reader = make_feed_reader(stream, chunk_size)
+            for play in walk_feed_object(reader, header_fields, header):
+                if play is None:
+                    started = True
+                else:
+                    yielded = True
+                yield play
+    except ValueError:
+        if yielded:
+            raise
+        game_data = read_feed(file_path)
+        header.clear()
+        if not started:
+            yield None
+        if isinstance(game_data, dict):
+            header.update(project_fields(game_data, header_fields))
+            yield from game_data.get('liveData', {}).get('plays', {}).get('allPlays', None) or []
+
+
+def iter_feed_plays(file_path, header_fields=HEADER_GAME_FIELDS, chunk_size=FEED_CHUNK_SIZE):
+    """
+    This function streams a game feed in any stored form and returns (header, plays) without ever holding the whole document:
+    header is the part of the feed described by header_fields (by default everything a slim feed keeps except the plays),
+    and plays is an iterator that parses the plays of liveData.plays.allPlays one at a time from the file.
+    The fields stored before the plays (gamePk and gameData, in both the API's key order and the sorted order of game_pull_api.ipynb) are in header when it is returned.
+    The fields stored after them (the boxscore, in the API's order) are filled in as the plays are read, so they are complete once plays is exhausted.
+    Close plays (or read it to the end) to close the file. The file is read chunk_size characters at a time.
+
+    Example usage:
+    game_data, plays = iter_feed_plays('../Capstone/api/games/game_2012020711.json.gz')
+    shots = [play for play in plays if play['result']['event'] in ["Shot", "Goal"]]
+    """
+    header = {}
+    plays = stream_feed_plays(file_path, header, header_fields, chunk_size)
+    # Read up to the first play, so the fields before the plays are in header
+    next(plays, None)
+    return (header, plays)
+
+
+def read_feed_header(file_path, header_fields=HEADER_GAME_FIELDS, chunk_size=FEED_CHUNK_SIZE):
+    """
+    This function streams a game feed in any stored form, chunk_size characters at a time, and returns only the part described by header_fields.
+    The plays are skipped without being parsed.
+
+    Example usage:
+    game_data = read_feed_header('../Capstone/api/games/game_2012020711.json.gz')
+    """
+    header = {}
+    try:
+        with open_feed_text(file_path) as stream:
+            for play in walk_feed_object(make_feed_reader(stream, chunk_size), header_fields, header, plays_path=None):
+                pass
+    except ValueError:
+        game_data = read_feed(file_path)
+        header = {}
+        if isinstance(game_data, dict):
+            header = project_fields(game_data, header_fields)
+    return header
+
+
+def write_feed(directory, gameID, data, kind='game', compression=None, slim=False):
+    """
+    This function stores a game feed or shift chart in the chosen form and returns the path it was written to.
+    Plain full documents are written the way game_pull_api.ipynb wrote them (indented, sorted keys); compressed or slim ones are written compactly.
+    The file is written through a temporary file, and any copy of the same game in another form is removed afterwards, so each game is stored once.
+
+    Example usage:
+    write_feed('./games', 2022020500, game_data, compression='gzip', slim=True)
+    """
+    check_compression(compression)
+    if slim:
+        data = slim_feed(data, kind)
+    if compression is None and not slim:
+        text = json.dumps(data, ensure_ascii=False, indent=4, sort_keys=True)
+    else:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    raw = text.encode('utf-8')
+    if compression == 'gzip':
+        raw = gzip.compress(raw, compresslevel=6)
+    elif compression == 'zstd':
+        raw = zstandard.ZstdCompressor(level=6).compress(raw)
+    file_path = get_feed_path(directory, gameID, compression)
+    with open(file_path + ".tmp", 'wb') as f:
+        f.write(raw)
+    os.replace(file_path + ".tmp", file_path)
+    for other_compression in COMPRESSION_EXTENSIONS:
+        other_path = get_feed_path(directory, gameID, other_compression)
+        if other_compression != compression and os.path.exists(other_path):
+            os.remove(other_path)
+    return file_path
+
+
+def convert_feed_file(file_path, kind='game', compression='gzip', slim=False):
+    """
+    This function rewrites one stored feed file in another form and returns (bytes before, bytes after). It is kept at module level for the process pool.
+    """
+    gameID = get_feed_game_id(file_path)
+    size_before = os.path.getsize(file_path)
+    new_path = write_feed(os.path.dirname(file_path), gameID, read_feed(file_path), kind=kind, compression=compression, slim=slim)
+    return (size_before, os.path.getsize(new_path))
+
+
+def convert_feed_directory(directory, kind='game', compression='gzip', slim=False, workers=None):
+    """
+    This function rewrites every game_<gameID> feed file in a directory in the chosen form, replacing the old files, and returns (bytes before, bytes after).
+
+    Example usage:
+    convert_feed_directory('../Capstone/api/games', kind='game', compression='gzip', slim=True, workers=8)
+    """
+    check_compression(compression)
+    file_paths = [os.path.join(directory, file_name) for file_name in list_feed_files(directory) if get_feed_game_id(file_name) is not None]
+    arguments = [file_paths, [kind] * len(file_paths), [compression] * len(file_paths), [slim] * len(file_paths)]
+    if workers is None or workers <= 1:
+        sizes = list(map(convert_feed_file, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            sizes = list(executor.map(convert_feed_file, *arguments, chunksize=max(1, len(file_paths) // (workers * 4))))
+    return (sum(size[0] for size in sizes), sum(size[1] for size in sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert stored game feeds and shift charts between plain, compressed and slim forms.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert_parser = subparsers.add_parser('convert', help="rewrite every feed file in a directory in another form")
+    convert_parser.add_argument('directory')
+    convert_parser.add_argument('--kind', choices=['game', 'shift'], required=True, help="whether the directory holds game feeds or shift charts")
+    convert_parser.add_argument('--compression', choices=['none', 'gzip', 'zstd'], default='gzip')
+    convert_parser.add_argument('--slim', action='store_true', help="keep only the fields the readers use")
+    convert_parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    compression = None if args.compression == 'none' else args.compression
+    size_before, size_after = convert_feed_directory(args.directory, kind=args.kind, compression=compression, slim=args.slim, workers=args.workers)
+    print("feed_io: Rewrote", args.directory, "from %.1f MB to %.1f MB" % (size_before / 2**20, size_after / 2**20))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,25 @@
 #!/usr/bin/env python
 
 
+import contextlib
+import functools
+import itertools
 import json
 import time
+import tracemalloc
 import pandas as pd
 import pickle
 import os
+import re
+import shutil
+import tempfile
+import hashlib
+import datetime
+import warnings
 import matplotlib.pyplot as plt
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from feed_io import iter_feed_plays, list_feed_files, read_feed, read_feed_header
 
 
 # Open the files for each dictionary
@@ -52,32 +64,232 @@ def get_game_year(gameID):
     return game_year
 
 
-def time_test(func, args=None, n=100):
-    # Initialize an empty list to store the time taken for each iteration
-    time_list = []
-    # Iterate over a range of values from 1 to n
-    for j in range(1, n):
-        # Store the start time of the iteration
-        start = time.time()
-        # Call the function with the given argument
-        func(args)
-        # Store the end time of the iteration
-        end = time.time()
-
-        # Calculate and print the time taken for the iteration
-        print(f"Iteration: ", {j}, "Time taken: ", (end-start)*10**3, "ms", end="\r")
-        # Append the time taken for the iteration to the time_list
-        time_list.append((end-start)*10**3)
-    # Initialize variables to store the total and count of time values
-    total = 0
-    count = 0
-
-    # Iterate over the time_list and calculate the total and count
-    for number in time_list:
-        total += number
-        count += 1
-    # Calculate and print the average time taken
-    print(f"Average time taken for ", str(func), ": ", total/count, "ms\n")
+def get_game_type(gameID):
+    # The two digits after the year give the game type: 01 preseason, 02 regular season, 03 playoffs, 04 all-star
+    game_type = {1: 'PR', 2: 'R', 3: 'P', 4: 'A'}.get((gameID // 10000) % 100, '')
+
+    # Return the game_type
+    return game_type
+
+
+def time_test(func, args=None, n=100, warmup=10):
+    """
+    This function times func(args) over n calls, after warmup untimed calls, and prints one summary line.
+    It returns the result dictionary of benchmark_function(), so the percentiles can be inspected or saved.
+    """
+    # Time the calls with benchmark_function(), which prints nothing while the clock is running
+    result = benchmark_function(func, (args,), n=n, warmup=warmup)
+    # Print the summary once, in milliseconds
+    print(f"Time taken for {result['name']}: min {result['min_ns'] / 10**6:.4f} ms, median {result['median_ns'] / 10**6:.4f} ms, "
+          f"p95 {result['p95_ns'] / 10**6:.4f} ms, p99 {result['p99_ns'] / 10**6:.4f} ms over {result['n']} calls\n")
+    return result
+
+
+def benchmark_function(func, args=(), kwargs=None, n=100, warmup=10, name=None):
+    """
+    This function times n calls of func(*args, **kwargs) with time.perf_counter_ns(), after warmup calls that are not timed,
+    and returns a dictionary with the name, n, warmup and the min, median, mean, p95, p99 and max call time in nanoseconds.
+    Only the call itself is inside the timed region.
+    """
+    if kwargs is None:
+        kwargs = {}
+    if name is None:
+        name = getattr(func, '__name__', str(func))
+    # Warm up caches, lazy imports and the memory allocator before timing
+    for i in range(warmup):
+        func(*args, **kwargs)
+    times = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        start = time.perf_counter_ns()
+        func(*args, **kwargs)
+        times[i] = time.perf_counter_ns() - start
+    result = {'name': name, 'n': n, 'warmup': warmup}
+    result['min_ns'] = int(times.min())
+    result['median_ns'] = float(np.median(times))
+    result['mean_ns'] = float(times.mean())
+    result['p95_ns'] = float(np.percentile(times, 95))
+    result['p99_ns'] = float(np.percentile(times, 99))
+    result['max_ns'] = int(times.max())
+    return result
+
+
+def compare_benchmarks(results, baseline, threshold=0.2, statistic='median_ns'):
+    """
+    This function compares benchmark_function() results against a baseline list of results for the same names.
+    It returns a list of {'name', 'baseline', 'current', 'ratio'} for every function whose statistic is more than threshold (a fraction) slower than its baseline.
+    Functions that are not in the baseline are skipped.
+    """
+    baseline_by_name = {result['name']: result for result in baseline}
+    regressions = []
+    for result in results:
+        if result['name'] not in baseline_by_name:
+            continue
+        baseline_value = baseline_by_name[result['name']][statistic]
+        ratio = result[statistic] / max(baseline_value, 1)
+        if ratio > 1 + threshold:
+            regressions.append({'name': result['name'], 'baseline': baseline_value, 'current': result[statistic], 'ratio': ratio})
+    return regressions
+
+
+# The spans, counters and progress throttle of the current run, reset by start_instrumentation()
+instrumentation = {'started': time.time(), 'trace_memory': False, 'progress_interval': 0.5, 'spans': {}, 'stack': [], 'counters': {}, 'last_progress': {}}
+
+
+def start_instrumentation(trace_memory=False, progress_interval=0.5):
+    """
+    This function clears the spans and counters collected so far and starts a new run.
+    With trace_memory=True, tracemalloc is started so every span also records the peak Python memory allocated while it ran.
+    Tracing slows allocation-heavy code down noticeably, so it is off by default; the peak resident memory is recorded either way.
+    Progress bars are redrawn at most once every progress_interval seconds.
+
+    Example usage:
+    start_instrumentation(trace_memory=True)
+    artifacts = run_pipeline('../Capstone/api/games', '../Capstone/api/shifts')
+    write_instrumentation_report('./data/report.json')
+    """
+    global instrumentation
+    instrumentation = {'started': time.time(), 'trace_memory': trace_memory, 'progress_interval': progress_interval, 'spans': {}, 'stack': [], 'counters': {}, 'last_progress': {}}
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def get_peak_rss_mb():
+    """
+    This function returns the peak resident memory of this process and of its finished worker processes in megabytes, or None where the resource module is not available (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024.0
+
+
+@contextlib.contextmanager
+def instrument_span(name):
+    """
+    This function times the code inside a with block as the span called name.
+    Spans opened inside another span are recorded under the outer span's name, as 'outer/inner', and repeated spans with the same name are added together.
+    Each span records its number of calls, wall and CPU seconds, how far it raised the process's peak resident memory (the most over its calls) and, if memory is being traced,
+    the peak traced memory while it ran (everything traced since start_instrumentation() that was alive at that moment).
+
+    Example usage:
+    with instrument_span('load_games'):
+        games_trimmed = build_games_trimmed('../Capstone/api/games')
+    """
+    stack = instrumentation['stack']
+    path = name if len(stack) == 0 else stack[-1]['path'] + "/" + name
+    frame = {'path': path, 'peak': 0, 'start_rss_mb': get_peak_rss_mb()}
+    tracing = instrumentation['trace_memory'] and tracemalloc.is_tracing()
+    if tracing:
+        # Hand the peak so far to the enclosing span before resetting it for this one
+        peak = tracemalloc.get_traced_memory()[1]
+        if len(stack) > 0:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+    stack.append(frame)
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start_time
+        cpu_seconds = time.process_time() - start_cpu
+        stack.pop()
+        span = instrumentation['spans'].setdefault(path, {'name': path, 'calls': 0, 'seconds': 0.0, 'cpu_seconds': 0.0, 'peak_traced_mb': None, 'rss_growth_mb': None})
+        span['calls'] += 1
+        span['seconds'] += seconds
+        span['cpu_seconds'] += cpu_seconds
+        # The peak resident memory only ever goes up, so its growth during the span is what the span itself needed beyond any earlier peak
+        end_rss_mb = get_peak_rss_mb()
+        if end_rss_mb is not None:
+            span['rss_growth_mb'] = max(span['rss_growth_mb'] or 0.0, end_rss_mb - frame['start_rss_mb'])
+        if tracing:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            if len(stack) > 0:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            span['peak_traced_mb'] = max(span['peak_traced_mb'] or 0.0, peak / 2**20)
+
+
+def instrumented(func):
+    """
+    This function wraps func so every call is recorded as a span named after it. It is used as a decorator on the build_* functions.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with instrument_span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def count_event(name, n=1):
+    """
+    This function adds n to the counter called name, such as 'files_parsed' or 'cache_hits'.
+    """
+    counters = instrumentation['counters']
+    counters[name] = counters.get(name, 0) + n
+
+
+def report_progress(label, progress, total, current=''):
+    """
+    This function draws an 80 character progress bar for progress out of total, followed by label and current.
+    It redraws at most once every progress_interval seconds (see start_instrumentation()) and always on the last item,
+    so calling it for every item of a tight loop costs a clock read instead of a terminal write.
+    """
+    now = time.perf_counter()
+    if progress < total and now - instrumentation['last_progress'].get(label, 0.0) < instrumentation['progress_interval']:
+        return
+    instrumentation['last_progress'][label] = now
+    length = 80
+    filled = (progress*length)//max(total, 1)
+    print("[", "="*filled, " "*(length-filled), "]", label, current, end="\r", flush=True)
+
+
+def get_instrumentation_report():
+    """
+    This function returns the spans and counters of the current run as a dictionary that can be written as JSON:
+        started: when the run started, as an ISO date and time
+        elapsed_seconds: the seconds since then
+        trace_memory: whether peak traced memory was recorded
+        peak_rss_mb: the peak resident memory so far
+        spans: a list of {'name', 'calls', 'seconds', 'cpu_seconds', 'peak_traced_mb', 'rss_growth_mb'}, slowest first
+        counters: {name: count}
+    """
+    report = {'started': datetime.datetime.fromtimestamp(instrumentation['started']).isoformat(timespec='seconds')}
+    report['elapsed_seconds'] = time.time() - instrumentation['started']
+    report['trace_memory'] = instrumentation['trace_memory']
+    report['peak_rss_mb'] = get_peak_rss_mb()
+    report['spans'] = sorted((dict(span) for span in instrumentation['spans'].values()), key=lambda span: -span['seconds'])
+    report['counters'] = dict(sorted(instrumentation['counters'].items()))
+    return report
+
+
+def print_instrumentation_report(report=None):
+    """
+    This function prints the spans and counters of a report from get_instrumentation_report(), or of the current run.
+    """
+    if report is None:
+        report = get_instrumentation_report()
+    print("%-60s %6s %10s %10s %10s %10s" % ("span", "calls", "seconds", "cpu s", "traced MB", "rss +MB"))
+    for span in report['spans']:
+        traced = "" if span['peak_traced_mb'] is None else "%.1f" % span['peak_traced_mb']
+        rss = "" if span['rss_growth_mb'] is None else "%.1f" % span['rss_growth_mb']
+        print("%-60s %6d %10.3f %10.3f %10s %10s" % (span['name'], span['calls'], span['seconds'], span['cpu_seconds'], traced, rss))
+    for name, count in report['counters'].items():
+        print("%-60s %10d" % (name, count))
+
+
+def write_instrumentation_report(file_path):
+    """
+    This function writes get_instrumentation_report() to file_path as JSON and returns the report.
+    """
+    report = get_instrumentation_report()
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    return report
+
 
 def get_home_on_ice(gameID, period, periodTime, game_shifts=None, directory='.'):
     """
@@ -96,23 +308,27 @@ def get_home_on_ice(gameID, period, periodTime, game_shifts=None, directory='.')
         game_shifts = build_game_shifts(directory=directory) # Make sure to pass the right directory if you don't pass game_shifts. 
     
     # Retrieve the game dict corresponding to the gameID
-    game_dict = game_shifts[gameID]['home']
+    game_dict = game_shifts[gameID]['home']['players']
 
     # Identify the period of the shot to find the corresponding shifts_n column
     period_dict = "period" + str(period)
 
+    # Compare times as integer seconds rather than "MM:SS" strings
+    if isinstance(periodTime, str):
+        periodTime = period_time_to_seconds(periodTime)
+
     # Initialize an empty list to store the player_ids for players on the ice
     player_ids = []
 
-    # Loop through each row in the game dict
-    for player in game_dict:
+    # Loop through each player in the game dict
+    for player_id, player in game_dict.items():
         # Retrieve the shift tuples for the current player
         shift_tuples = player[period_dict]
 
         # Check which players had a shift time tuple that includes periodTime
         for shift_tuple in shift_tuples:
-            if shift_tuple[0] < periodTime <= shift_tuple[1]:
-                player_ids.append(row['player_id'])
+            if period_time_to_seconds(shift_tuple[0]) < periodTime <= period_time_to_seconds(shift_tuple[1]):
+                player_ids.append(player_id)
     return player_ids
 
 
@@ -144,44 +360,286 @@ def get_away_on_ice(gameID, period, periodTime, game_shifts=None, directory='.')
         game_shifts = build_game_shifts(directory=directory) # Make sure to pass the right directory if you don't pass game_shifts. 
     
     # Retrieve the game dict corresponding to the gameID
-    game_dict = game_shifts[gameID]['away']
+    game_dict = game_shifts[gameID]['away']['players']
 
     # Identify the period of the shot to find the corresponding shifts_n column
     period_dict = "period" + str(period)
 
+    # Compare times as integer seconds rather than "MM:SS" strings
+    if isinstance(periodTime, str):
+        periodTime = period_time_to_seconds(periodTime)
+
     # Initialize an empty list to store the player_ids for players on the ice
     player_ids = []
 
     # Loop through each player in the game dict
-    for player in game_dict:  
+    for player_id, player in game_dict.items():
         # Retrieve the shift tuples for the current player
         shift_tuples = player[period_dict]
 
         # Check which players had a shift time tuple that includes periodTime
         for shift_tuple in shift_tuples:
-            if shift_tuple[0] < periodTime <= shift_tuple[1]:
-                player_ids.append(row['player_id'])
+            if period_time_to_seconds(shift_tuple[0]) < periodTime <= period_time_to_seconds(shift_tuple[1]):
+                player_ids.append(player_id)
 
     return player_ids
 
 
-def get_players_on_ice(gameID, period, periodTime, game_shifts=None, directory='.'):
+def get_players_on_ice(gameID, period, periodTime, game_shifts=None, directory='.', shift_intervals=None):
     """
     This function retrieves the player_ids of the players that were on the ice during a specific period and time of a game.
     The function first calls get_home_on_ice() and get_away_on_ice() to get the player_ids for the home and away teams respectively.
     These lists are then concatenated and returned.
+    If shift_intervals is provided, the lookup is answered with a binary search by get_players_on_ice_batch() instead.
     :param gameID: The id of the game.
     :param period: The period of the game.
-    :param periodTime: The time in the period.
+    :param periodTime: The time in the period, either as "MM:SS" or as an integer number of seconds.
     :param game_shifts: The game shift data. 
     :param directory: The directory where the game shift data is stored.
+    :param shift_intervals: The integer-second shift intervals, as returned by build_shift_intervals().
     :return: A list of player_ids that were on the ice during the specified period and time. 
     """
+    count_event('on_ice_lookups')
+    if shift_intervals is not None:
+        if isinstance(periodTime, str):
+            periodTime = period_time_to_seconds(periodTime)
+        offsets, players, sides = get_players_on_ice_batch([gameID], [period], [periodTime], shift_intervals)
+        return players.tolist()
     player_ids = []
     player_ids.extend(get_home_on_ice(gameID, period, periodTime, game_shifts=game_shifts, directory=directory))
     player_ids.extend(get_away_on_ice(gameID, period, periodTime, game_shifts=game_shifts, directory=directory))
     return player_ids
 
+def shift_key(gameIDs, periods, seconds):
+    """
+    This function packs game IDs, periods and integer seconds into a single int64 sort key.
+    Sorting shifts by this key orders them by game, then period, then time, so the shifts of a game and period are one contiguous run.
+    """
+    gameIDs = np.asarray(gameIDs, dtype=np.int64)
+    periods = np.asarray(periods, dtype=np.int64)
+    seconds = np.asarray(seconds, dtype=np.int64)
+    # A period is at most 1200 seconds, so 4096 seconds per period keeps neighbouring periods apart
+    return (gameIDs * 8 + periods) * 4096 + seconds
+
+
+# Shifts longer than this (in practice the goalies', which cover the whole period) are indexed apart from the others by index_long_shifts()
+LONG_SHIFT_SECONDS = 300
+
+
+def get_game_shift_rows(gameID, game_dict):
+    """
+    This function flattens a single game_shifts entry into a list of (gameID, period, start_seconds, end_seconds, player_id, side) rows,
+    where side is 0 for the home team and 1 for the away team.
+    """
+    shift_rows = []
+    for side_index, side in enumerate(('home', 'away')):
+        for player_id, player in game_dict[side]['players'].items():
+            for period in range(1, 4):
+                for start, end in player["period" + str(period)]:
+                    shift_rows.append((gameID, period, period_time_to_seconds(start), period_time_to_seconds(end), player_id, side_index))
+    return shift_rows
+
+
+@instrumented
+def build_shift_intervals(game_shifts=None, shift_rows=None):
+    """
+    This function normalizes every shift to integer seconds and stores them as flat NumPy arrays sorted by game, period and start time.
+    It can be built from game_shifts, or from a list of rows as returned by get_game_shift_rows().
+    The dictionary has the following keys:
+        key_start, key_end (int64): shift_key() of the shift's start and end, so start/end comparisons within a game and period are plain integer comparisons
+        game_id (int64), period (int8), start, end (int16): the shift itself
+        player (int32): the player's ID
+        side (int8): 0 if the player was on the home team, 1 if on the away team
+        long_shifts (int64): the rows of the shifts longer than LONG_SHIFT_SECONDS, in key_start order
+        max_length: the longest of the other shifts in seconds, which bounds how far back a lookup has to search
+    Shifts that end before they start cover no second, as in get_home_on_ice(), and are dropped (and counted as 'inverted_shifts'),
+    so the sweep of build_shots_on_ice() never sees an end boundary before its start.
+    """
+    print("build_shift_intervals()")
+    if shift_rows is None:
+        if game_shifts is None:
+            print("Please build game_shifts with the build_game_shifts() function.\nPass the directory your shift .json files are saved in as its argument.")
+            return None
+        shift_rows = []
+        for gameID, game_dict in game_shifts.items():
+            shift_rows.extend(get_game_shift_rows(gameID, game_dict))
+    if len(shift_rows) > 0:
+        columns = [np.array(column) for column in zip(*shift_rows)]
+    else:
+        columns = [np.array([], dtype=np.int64)] * 6
+    # Drop the shifts that end before they start
+    inverted = columns[3] < columns[2]
+    if inverted.any():
+        count_event('inverted_shifts', int(inverted.sum()))
+        print("build_shift_intervals(): Dropped", int(inverted.sum()), "shifts that end before they start")
+        columns = [column[~inverted] for column in columns]
+    key_start = shift_key(columns[0], columns[1], columns[2])
+    # Sort by start key, breaking ties by end so the order does not depend on how the rows were collected
+    key_end = shift_key(columns[0], columns[1], columns[3])
+    order = np.lexsort((columns[4], key_end, key_start))
+    shift_intervals = {}
+    shift_intervals['key_start'] = key_start[order]
+    shift_intervals['key_end'] = key_end[order]
+    shift_intervals['game_id'] = columns[0][order].astype(np.int64)
+    shift_intervals['period'] = columns[1][order].astype(np.int8)
+    shift_intervals['start'] = columns[2][order].astype(np.int16)
+    shift_intervals['end'] = columns[3][order].astype(np.int16)
+    shift_intervals['player'] = columns[4][order].astype(np.int32)
+    shift_intervals['side'] = columns[5][order].astype(np.int8)
+    index_long_shifts(shift_intervals)
+    return shift_intervals
+
+
+def index_long_shifts(shift_intervals):
+    """
+    This function sets shift_intervals['long_shifts'] to the rows of the shifts longer than LONG_SHIFT_SECONDS and shift_intervals['max_length'] to the longest of the other shifts.
+    Keeping the few long shifts apart keeps max_length, and so the search window of get_players_on_ice_batch(), down to the length of a skater's shift.
+    """
+    lengths = shift_intervals['key_end'] - shift_intervals['key_start']
+    is_long = lengths > LONG_SHIFT_SECONDS
+    shift_intervals['long_shifts'] = np.flatnonzero(is_long).astype(np.int64)
+    if (~is_long).any():
+        shift_intervals['max_length'] = int(max(lengths[~is_long].max(), 0))
+    else:
+        shift_intervals['max_length'] = 0
+
+
+def expand_windows(window_start, window_end):
+    """
+    This function expands the windows [window_start[i], window_end[i]) into one flat array of the positions in them and a matching array of the window each came from.
+    """
+    window_sizes = window_end - window_start
+    window_offsets = np.cumsum(window_sizes) - window_sizes
+    positions = np.repeat(window_start - window_offsets, window_sizes) + np.arange(window_sizes.sum())
+    return (positions, np.repeat(np.arange(len(window_sizes)), window_sizes))
+
+
+def get_players_on_ice_batch(gameIDs, periods, seconds, shift_intervals):
+    """
+    This function answers a whole batch of on-ice lookups at once. Query i asks who was on the ice in game gameIDs[i], period periods[i], at seconds[i] into the period.
+    A player counts as on the ice if their shift started strictly before that second and ended at or after it, the same rule as get_home_on_ice().
+    A regular shift can only cover a query if it started within max_length seconds before it, so those are found with a binary search plus a scan of that short window.
+    The long shifts (see index_long_shifts()) are searched separately among the few that started earlier in the same game and period.
+    The result is returned in compressed rows form as (offsets, players, sides):
+    the players on the ice for query i are players[offsets[i]:offsets[i+1]], and sides holds 0 (home) or 1 (away) for each of them.
+
+    Example usage:
+    offsets, players, sides = get_players_on_ice_batch(shot_table['game_id'], shot_table['period'], shot_table['period_seconds'], shift_intervals)
+    """
+    query_keys = shift_key(gameIDs, periods, seconds)
+    count_event('on_ice_batch_queries', len(query_keys))
+    key_start = shift_intervals['key_start']
+    key_end = shift_intervals['key_end']
+    max_length = shift_intervals['max_length']
+    # Find the regular shifts that started within max_length seconds before each query and had not ended yet.
+    # Long shifts that started in the window are left to the second search, so none is counted twice
+    window_start = np.searchsorted(key_start, query_keys - max_length, side='left')
+    window_end = np.searchsorted(key_start, query_keys, side='left')
+    candidates, candidate_queries = expand_windows(window_start, window_end)
+    on_ice = (key_end[candidates] >= query_keys[candidate_queries]) & (key_end[candidates] - key_start[candidates] <= max_length)
+    candidates = candidates[on_ice]
+    candidate_queries = candidate_queries[on_ice]
+    # Find the long shifts that started earlier in the same game and period and had not ended yet
+    long_shifts = shift_intervals.get('long_shifts', np.array([], dtype=np.int64))
+    long_key_start = key_start[long_shifts]
+    period_start = np.searchsorted(long_key_start, shift_key(gameIDs, periods, 0), side='left')
+    period_end = np.searchsorted(long_key_start, query_keys, side='left')
+    long_positions, long_queries = expand_windows(period_start, period_end)
+    long_candidates = long_shifts[long_positions]
+    on_ice = key_end[long_candidates] >= query_keys[long_queries]
+    # Merge both in query order, and in shift order within each query
+    candidates = np.concatenate([candidates, long_candidates[on_ice]])
+    candidate_queries = np.concatenate([candidate_queries, long_queries[on_ice]])
+    order = np.lexsort((candidates, candidate_queries))
+    candidates = candidates[order]
+    candidate_queries = candidate_queries[order]
+    offsets = np.zeros(len(query_keys) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(candidate_queries, minlength=len(query_keys)), out=offsets[1:])
+    return (offsets, shift_intervals['player'][candidates], shift_intervals['side'][candidates])
+
+
+@instrumented
+def build_shots_on_ice(shot_table=None, shift_intervals=None, home_away_teams=None):
+    """
+    This function joins every shot in the shot table with the players on the ice at the time of the shot, split into the shooting and the defending team.
+    It sweeps once through the shots and the shift boundaries, all sorted by shift_key(), keeping the set of shifts in progress:
+    shifts that started before the shot are added and shifts that ended before it are removed, so the whole join costs O(shots + shifts).
+    The result is aligned with the rows of shot_table and stored in compressed rows form:
+        shooting_offsets, shooting_players: the shooting team's players on the ice for row i are shooting_players[shooting_offsets[i]:shooting_offsets[i+1]]
+        defending_offsets, defending_players: the same for the defending team
+    Shots in games missing from home_away_teams get no players.
+    """
+    print("build_shots_on_ice()")
+    if shot_table is None or shift_intervals is None or home_away_teams is None:
+        print("Please build shot_table, shift_intervals and home_away_teams first, for example with the build_base_dicts() function.")
+        return None
+    n_shots = len(shot_table['game_id'])
+    count_event('on_ice_lookups', n_shots)
+    # Work out whether each shot was taken by the home team (side 0) or the away team (side 1)
+    home_codes = np.full(len(shot_table['game_ids']), -1, dtype=np.int64)
+    for game_index, gameID in enumerate(shot_table['game_ids'].tolist()):
+        if gameID in home_away_teams:
+            code_index = np.searchsorted(shot_table['team_codes'], home_away_teams[gameID][0])
+            if code_index < len(shot_table['team_codes']) and shot_table['team_codes'][code_index] == home_away_teams[gameID][0]:
+                home_codes[game_index] = code_index
+    game_index = np.searchsorted(shot_table['game_ids'], shot_table['game_id'])
+    shot_sides = (shot_table['team'] != home_codes[game_index]).astype(np.int8)
+    known_game = home_codes[game_index] >= 0
+    # Sort the shots and both kinds of shift boundaries by their keys
+    shot_keys = shift_key(shot_table['game_id'], shot_table['period'], shot_table['period_seconds'])
+    shot_order = np.argsort(shot_keys, kind='stable').tolist()
+    shot_keys = shot_keys.tolist()
+    key_start = shift_intervals['key_start'].tolist()
+    end_order = np.argsort(shift_intervals['key_end'], kind='stable')
+    key_end = shift_intervals['key_end'][end_order].tolist()
+    end_order = end_order.tolist()
+    shift_players = shift_intervals['player'].tolist()
+    shift_sides = shift_intervals['side'].tolist()
+    shot_sides = shot_sides.tolist()
+    known_game = known_game.tolist()
+    n_shifts = len(key_start)
+    shooting = [None] * n_shots
+    defending = [None] * n_shots
+    active = set()
+    next_start = 0
+    next_end = 0
+    for row in shot_order:
+        shot_key = shot_keys[row]
+        # A shift covers the shot if it started strictly before it...
+        while next_start < n_shifts and key_start[next_start] < shot_key:
+            active.add(next_start)
+            next_start += 1
+        # ...and did not end before it
+        while next_end < n_shifts and key_end[next_end] < shot_key:
+            active.discard(end_order[next_end])
+            next_end += 1
+        shooting_players = []
+        defending_players = []
+        if known_game[row]:
+            for shift in active:
+                if shift_sides[shift] == shot_sides[row]:
+                    shooting_players.append(shift_players[shift])
+                else:
+                    defending_players.append(shift_players[shift])
+        shooting[row] = shooting_players
+        defending[row] = defending_players
+    shots_on_ice = {}
+    for name, players in (('shooting', shooting), ('defending', defending)):
+        offsets = np.zeros(n_shots + 1, dtype=np.int64)
+        np.cumsum([len(row_players) for row_players in players], out=offsets[1:])
+        shots_on_ice[name + '_offsets'] = offsets
+        shots_on_ice[name + '_players'] = np.fromiter((player for row_players in players for player in row_players), dtype=np.int32, count=offsets[-1])
+    return shots_on_ice
+
+
+def get_on_ice_rows(offsets, players, player_id):
+    """
+    This function returns the shot table rows for which player_id appears in a compressed rows mapping such as shots_on_ice['defending_offsets'], shots_on_ice['defending_players'].
+    """
+    positions = np.flatnonzero(players == player_id)
+    return np.unique(np.searchsorted(offsets, positions, side='right') - 1)
+
+
 # Example usage:
 # players_on_ice = get_players_on_ice(gameID=2017020220, period=2, periodTime='06:00', game_shifts=game_shifts, directory='/path/to/directory')
 # print(players_on_ice)
@@ -190,7 +648,7 @@ def get_players_on_ice(gameID, period, periodTime, game_shifts=None, directory='
 
 # Below function likely deprecated if game_shifts_trimmed (rework that name) is built.
 # TODO: Fix this so the games_trimmed and game_shifts constructors would actually work.
-def get_player_shots(player_id, games_trimmed=None, game_shifts=None, directory='.'):
+def get_player_shots(player_id, games_trimmed=None, game_shifts=None, directory='.', shot_table=None, shots_on_ice=None):
 	"""
 	Returns a list of tuples of the form (gameID, shot_num) of the shots taken when the given player was on the ice.
 	player_id : int
@@ -201,7 +659,14 @@ def get_player_shots(player_id, games_trimmed=None, game_shifts=None, directory=
 		A dictionary of all player shifts for a game. If not provided, will be built by calling the function build_game_shifts().
 	directory : str
 		The directory where the game .json files are saved. Only necessary if games_trimmed or game_shifts are not provided.
+	shot_table, shots_on_ice : dict
+		The shot table and its on-ice players, as returned by build_shot_table() and build_shots_on_ice(). If both are provided, the shots are read from them without any shift lookups.
 	"""
+	if shot_table is not None and shots_on_ice is not None:
+		# The player was on the ice for a shot if they were on either side of it
+		rows = np.union1d(get_on_ice_rows(shots_on_ice['shooting_offsets'], shots_on_ice['shooting_players'], player_id),
+		                  get_on_ice_rows(shots_on_ice['defending_offsets'], shots_on_ice['defending_players'], player_id))
+		return list(zip(shot_table['game_id'][rows].tolist(), shot_table['shot_num'][rows].tolist()))
 	if games_trimmed is None:
 		games_trimmed = build_games_trimmed(directory)
 	if game_shifts is None:
@@ -285,7 +750,7 @@ def get_shots_by_player(player_id, games_trimmed=None, player_id_set=None, playe
 
 
 # TODO: Rework this to just check the game_shifts_trimmed dict. 
-def get_player_shots_against(player_id, games_trimmed=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None):
+def get_player_shots_against(player_id, games_trimmed=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, shot_table=None, shots_on_ice=None):
     """
     This function takes in a player_id and returns a list of shots taken against that player when they were on the ice.
     The games_trimmed, player_id_set, player_teams, team_set, team_games, and player_id_games parameters are used to optimize performance by avoiding redundant computations.
@@ -299,10 +764,15 @@ def get_player_shots_against(player_id, games_trimmed=None, player_id_set=None,
     team_set (set, optional): A set of team codes
     team_games (dict, optional): A dictionary of team games with the format {team_code: {year: [game_ids]}}
     player_id_games (dict, optional): A dictionary of player games with the format {player_id: {year: [game_ids]}}
+    shot_table, shots_on_ice (dict, optional): The shot table and its on-ice players, as returned by build_shot_table() and build_shots_on_ice().
+                                               If both are provided, the shots are read from the defending side of shots_on_ice and nothing else is needed.
     
     Returns:
     List of shots taken against player_id in the format [ (game_id, shot_num), ... ] 
     """
+    if shot_table is not None and shots_on_ice is not None:
+        rows = get_on_ice_rows(shots_on_ice['defending_offsets'], shots_on_ice['defending_players'], player_id)
+        return list(zip(shot_table['game_id'][rows].tolist(), shot_table['shot_num'][rows].tolist()))
     
     print("get_player_shots_against()", end="\r")
     if games_trimmed is None:
@@ -550,27 +1020,27 @@ def get_coordinate_goal_shot_ratio(x, y, count=False, games_trimmed=None, coordi
 
 # TODO: Rework after game_shifts_trimmed to optimize.
 def get_coordinate_goal_shot_ratio_against(player_id, x, y, games_trimmed=None, coordinate_shots=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, player_shots=None):
-	"""
-	Given a player ID, x and y coordinates, and optional pre-built data, this function calculates the proportion of shots taken by the player at the specified coordinates that resulted in goals.
-	Parameters:
-	- player_id (int): The player ID for which the proportion of goals to shots is calculated
-	- x (int): The x-coordinate of the shot location
-	- y (int): The y-coordinate of the shot location
-	- games_trimmed (dict, optional): A dict of game events, as returned by the build_games_trimmed() function. If not provided, the function will call build_games_trimmed()
-	- coordinate_shots (dict, optional): A dictionary of shots taken at a specific location, as returned by the build_coordinate_shots() function. If not provided, the function will call build_coordinate_shots()
-	- player_id_set (set, optional): A set of player IDs, as returned by the build_player_id_set() function. If not provided, the function will call build_player_id_set()
-	- player_teams (dict, optional): A dictionary of player IDs and their corresponding teams, as returned by the build_player_teams() function. If not provided, the function will call build_player_teams()
-	- team_set (set, optional): A set of team IDs, as returned by the build_team_set() function. If not provided, the function will call build_team_set()
-	- team_games (dict, optional): A dictionary of teams and the games they played, as returned by the build_team_games() function. If not provided, the function will call build_team_games()
-	- player_id_games (dict, optional): A dictionary of player IDs and the games they played, as returned by the build_player_id_games() function. If not provided, the function will call build_player_id_games()
-	- player_shots (list, optional): A list of shots taken by the player, as returned by the get_player_shots_against() function. If not provided, the function will call get_player_shots_against()
-
-	Returns:
-	- The proportion of shots taken by the player at the specified coordinates that resulted in goals, as a float between 0 and 1.
-
-	Example usage:
-	proportion_of_goals = get_coordinate_goal_shot_ratio_against(player_id=8471214, x=25, y=50)
-	"""
+    """
+    Given a player ID, x and y coordinates, and optional pre-built data, this function calculates the proportion of shots taken by the player at the specified coordinates that resulted in goals.
+    Parameters:
+    - player_id (int): The player ID for which the proportion of goals to shots is calculated
+    - x (int): The x-coordinate of the shot location
+    - y (int): The y-coordinate of the shot location
+    - games_trimmed (dict, optional): A dict of game events, as returned by the build_games_trimmed() function. If not provided, the function will call build_games_trimmed()
+    - coordinate_shots (dict, optional): A dictionary of shots taken at a specific location, as returned by the build_coordinate_shots() function. If not provided, the function will call build_coordinate_shots()
+    - player_id_set (set, optional): A set of player IDs, as returned by the build_player_id_set() function. If not provided, the function will call build_player_id_set()
+    - player_teams (dict, optional): A dictionary of player IDs and their corresponding teams, as returned by the build_player_teams() function. If not provided, the function will call build_player_teams()
+    - team_set (set, optional): A set of team IDs, as returned by the build_team_set() function. If not provided, the function will call build_team_set()
+    - team_games (dict, optional): A dictionary of teams and the games they played, as returned by the build_team_games() function. If not provided, the function will call build_team_games()
+    - player_id_games (dict, optional): A dictionary of player IDs and the games they played, as returned by the build_player_id_games() function. If not provided, the function will call build_player_id_games()
+    - player_shots (list, optional): A list of shots taken by the player, as returned by the get_player_shots_against() function. If not provided, the function will call get_player_shots_against()
+
+    Returns:
+    - The proportion of shots taken by the player at the specified coordinates that resulted in goals, as a float between 0 and 1.
+
+    Example usage:
+    proportion_of_goals = get_coordinate_goal_shot_ratio_against(player_id=8471214, x=25, y=50)
+    """
     print("get_coordinate_goal_shot_ratio_against()", end="\r")
     if games_trimmed is None:
         print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
@@ -635,6 +1105,7 @@ def get_coordinate_goal_shot_ratio_for_player(player_id, x, y, games_trimmed=Non
     return proportion_of_goals
 
 
+@instrumented
 def build_player_coordinate_list(player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None):
     """
     This function is used to build a dictionary of all the coordinates of shots made by each player. 
@@ -677,6 +1148,7 @@ def build_player_coordinate_list(player_id_set=None, player_teams=None, team_set
     # Return the dictionary of player coordinates
     return player_coordinates
 
+@instrumented
 def build_home_away_teams(directory='.'):
     """
     This function will parse through all the .json files in a specified directory,
@@ -685,32 +1157,31 @@ def build_home_away_teams(directory='.'):
     If no directory is specified, it will take the current directory as default.
     """
     print("build_home_away_teams()")
-    json_files = [f for f in os.listdir(directory) if f.endswith('.json')]
+    json_files = list_feed_files(directory)
     home_away_teams = {}
     # Loop through the .json files in the directory
     for file_name in json_files:
         # Construct the file path for the current .json file
         file_path = os.path.join(directory, file_name)
-        # Open the .json file and load the data into a dictionary
-        with open(file_path, encoding='utf-8') as json_file:
-            game_data = json.load(json_file)
+        # Read only the header fields of the .json file; the plays are skipped without being parsed
+        game_data = read_feed_header(file_path)
+        # Retrieve the gameID from the game data so it matches the integer keys used by games_trimmed and game_shifts
+        gameID = game_data['gamePk']
+        
+        # Retrieve the teams data from the game file
+        teams = game_data['gameData']['teams']
 
-            # Extracting the gameID from the file name
-            gameID = file_name.split(".")[0]
-            
-            # Retrieve the teams data from the game file
-            teams = game_data['gameData']['teams']
+        # Retrieve the triCodes for the home and away teams
+        home_triCode = teams['home']['triCode']
+        away_triCode = teams['away']['triCode']
 
-            # Retrieve the triCodes for the home and away teams
-            home_triCode = teams['home']['triCode']
-            away_triCode = teams['away']['triCode']
-
-            # Add an entry to the home_away_teams dictionary for the current gameID with the home and away teams as the value
-            home_away_teams[gameID] = (home_triCode, away_triCode)
+        # Add an entry to the home_away_teams dictionary for the current gameID with the home and away teams as the value
+        home_away_teams[gameID] = (home_triCode, away_triCode)
 
     return home_away_teams
 
 
+@instrumented
 def build_coordinate_shots(games_trimmed=None):
     """
     Build a dictionary of shots grouped by their x,y coordinate location from a games_trimmed dictionary
@@ -743,7 +1214,8 @@ def build_coordinate_shots(games_trimmed=None):
     return coordinate_shots
 
 
-def build_game_shifts(directory='.', home_away_teams=None):
+@instrumented
+def build_game_shifts(directory='.', home_away_teams=None, workers=None):
     """
     The function build_game_shifts() reads in .json files from the specified directory, extracts shift data from them, and organizes the data into a nested dictionary.
     The nested dictionary has the following structure:
@@ -776,83 +1248,74 @@ def build_game_shifts(directory='.', home_away_teams=None):
         },
         ...
     }
+    If workers is greater than 1, the shift files are parsed in parallel by that many worker processes. The result is identical to the serial build.
     """
     print("build_game_shifts()")
     if home_away_teams == None:
         print("Please build home_away_teams with the build_home_away_teams() function.\nPass the directory your game .json files are saved in as its argument.")
         return None
-    # Initialize an empty dictionary to store data for each game
-    json_files = [f for f in os.listdir(directory) if f.endswith('.json')]
-    game_shifts = {}
-    progress = 0
-    length = 80
-    jflength = len(json_files)
-    # Iterate over the files in the directory
+    # Get a sorted list of the shift files for games we have home and away teams for
+    json_files = list_feed_files(directory)
+    file_paths = []
+    game_teams = []
     for file in json_files:
         # Extract the gameID from the file name
         gameID = int(file.split('_')[1].split('.')[0])
-        progress += 1
-        print("[", "="*((progress*length)//jflength), " "*(length-((progress*length)//jflength)), "] Current gamefile:", file_name, end="\r", flush=True)
-        # Create an empty DataFrame for the current game
-        game_shifts[gameID] = {}
-        game_shifts[gameID][home] = {}
-        game_shifts[gameID][away] = {}
-        game_shifts[gameID][home][triCode] = home_away_teams[gameID][0]
-        game_shifts[gameID][away][triCode] = home_away_teams[gameID][1]
-        game_shifts[gameID][home][players] = {}
-        game_shifts[gameID][away][players] = {}
-        # Read in the data from the .json file
-        with open(os.path.join(directory, file), 'r') as f:
-            data = json.loads(f.read())
-        # Loop over the data list and add each shift to the DataFrame
-        for k in data:
-            # Check if the shift is from a period 1, 2, or 3, and if it
-            # was played by a non-null player
-            if type(data[k]) != list:
-                continue
-            for i in range(0, len(data[k])-1):
-                # Check if the current shift is in the first 3 periods and the player is not None
-                if data[k][i]['period'] <= 3 and data[k][i]['playerId'] != None:
-                    playerID = data[k][i]['playerId']
-                    # Check if the shift is played by home team or away team
-                    if data[k][i]['teamAbbrev'] = game_shifts[gameID][home][triCode]:
-                        # Check if the player already exists in the home team's shift data
-                        if playerID in game_shifts[gameID][home][players]:
-                            player_dict = game_shifts[gameID][home][players][playerID]
-                        else:
-                            # Create new entry for the player if he does not exist
-                            game_shifts[gameID][home][players][playerID] = {}
-                            player_dict = game_shifts[gameID][home][players][playerID]
-                            player_dict[playerName] = str(data[k][i][firstName] + " " + data[k][i][lastName])
-                            player_dict[period1] = set()
-                            player_dict[period2] = set()
-                            player_dict[period3] = set()
-                    else:
-                        # Check if the player already exists in the away team's shift data
-                        if playerID in game_shifts[gameID][away][players]:
-                            player_dict = game_shifts[gameID][away][players][playerID]
-                        else:
-                            # Create new entry for the player if he does not exist
-                            game_shifts[gameID][away][players][playerID] = {}
-                            player_dict = game_shifts[gameID][away][players][playerID]
-                            player_dict[playerName] = str(data[k][i][firstName] + " " + data[k][i][lastName])
-                            player_dict[period1] = set()
-                            player_dict[period2] = set()
-                            player_dict[period3] = set()
-                    shift_period = data[k][i]['period']
-                    # Assign the shift to the corresponding period
-                    if shift_period == 1:
-                        player_dict[period1].add((data[k][i]['startTime'], data[k][i]['endTime']))
-                    elif shift_period == 2:
-                        player_dict[period2].add((data[k][i]['startTime'], data[k][i]['endTime']))
-                    else:
-                        player_dict[period3].add((data[k][i]['startTime'], data[k][i]['endTime']))
-                        shift_column[player_index].append((data[k][i]['startTime'],data[k][i]['endTime']))
-                else:
-                    pass
-
+        if gameID not in home_away_teams:
+            continue
+        file_paths.append(os.path.join(directory, file))
+        game_teams.append(home_away_teams[gameID])
+    # Initialize an empty dictionary to store data for each game
+    game_shifts = {}
+    # Loop through the parsed shift files in file order
+    for gameID, game_dict in map_game_files(parse_shift_file, file_paths, game_teams, workers=workers):
+        game_shifts[gameID] = game_dict
     return game_shifts
 
+
+def parse_shift_file(file_path, teams):
+    """
+    This function reads a single shift chart .json file and returns a tuple of (gameID, game_dict), where game_dict is a single entry of the game_shifts dictionary described in build_game_shifts().
+    teams is the (home_triCode, away_triCode) tuple for the game, as stored in home_away_teams.
+    It is kept at module level so that it can be handed to a process pool by build_game_shifts().
+    """
+    # Extract the gameID from the file name
+    gameID = int(os.path.basename(file_path).split('_')[1].split('.')[0])
+    # Create the home and away entries for the current game
+    game_dict = {}
+    game_dict['home'] = {}
+    game_dict['away'] = {}
+    game_dict['home']['triCode'] = teams[0]
+    game_dict['away']['triCode'] = teams[1]
+    game_dict['home']['players'] = {}
+    game_dict['away']['players'] = {}
+    # Read in the data from the .json file
+    data = read_feed(file_path)
+    # Loop over the data list and add each shift to the game dictionary
+    for k in data:
+        # Only the lists in the file hold shifts
+        if type(data[k]) != list:
+            continue
+        for shift in data[k]:
+            # Check if the current shift is in the first 3 periods and the player is not None
+            if shift['period'] <= 3 and shift['playerId'] != None:
+                playerID = shift['playerId']
+                # Check if the shift is played by home team or away team
+                if shift['teamAbbrev'] == game_dict['home']['triCode']:
+                    team_players = game_dict['home']['players']
+                else:
+                    team_players = game_dict['away']['players']
+                # Create new entry for the player if he does not exist
+                if playerID not in team_players:
+                    team_players[playerID] = {}
+                    team_players[playerID]['playerName'] = str(shift['firstName'] + " " + shift['lastName'])
+                    team_players[playerID]['period1'] = set()
+                    team_players[playerID]['period2'] = set()
+                    team_players[playerID]['period3'] = set()
+                # Assign the shift to the corresponding period
+                team_players[playerID]["period" + str(shift['period'])].add((shift['startTime'], shift['endTime']))
+    return (gameID, game_dict)
+
 # TODO: Create function build_player_games() from game_shifts; dict with playerID primary key, subkeys player name and away, home. 
 #   Away, home contain subkeys of gameIDs for games where player was home and games where player was away.
 
@@ -931,6 +1394,7 @@ def get_single_player_games(player_id, games_trimmed=None, player_id_set=None, p
 # Below function deprecated by build_player_games; function used only for functions accessible thereby.
 # Possible extension to player_games: teams key? Subkey year, subsubkey tricode?
 
+@instrumented
 def build_player_teams(games_trimmed=None, player_id_set=None):
     """
     This function builds a dictionary containing the teams that each player in the player_id_set has played for in each year.
@@ -947,16 +1411,18 @@ def build_player_teams(games_trimmed=None, player_id_set=None):
         return None
     if player_id_set is None:
         player_id_set = build_player_id_set(games_trimmed=games_trimmed)
+    # Build every player's teams in a single scan of the shots instead of one scan per player
+    all_player_teams = build_lookup_dicts(games_trimmed=games_trimmed)['player_teams']
     player_teams = {}
     # Iterate over the set of player IDs
     for player in player_id_set:
-        # Get the teams for each player by calling the get_single_player_teams() function
-        player_teams[player] = get_single_player_teams(player, games_trimmed=games_trimmed)
+        player_teams[player] = all_player_teams.get(player, {})
     return player_teams
 
 
 # Below function fully replicated by build_player_games.
 
+@instrumented
 def build_player_id_games(games_trimmed=None, player_id_set=None, player_teams=None, team_set=None, team_games=None):
     """
     This function takes games_trimmed and the output of the following functions as arguments:
@@ -991,6 +1457,7 @@ def build_player_id_games(games_trimmed=None, player_id_set=None, player_teams=N
 # Below function essentially replicated by build_player_games, different format may be needed some places. Double check.
 # Rebuild from build_player_games for efficiency?
 
+@instrumented
 def build_player_id_set(games_trimmed=None):
     """
     This function takes in the games_trimmed dictionary, which should be created by the build_games_trimmed() function.
@@ -1008,6 +1475,7 @@ def build_player_id_set(games_trimmed=None):
 
 # Rebuild to use game_shifts? Could make team_games from that more efficiently.
 
+@instrumented
 def build_team_set(games_trimmed=None):
     """
     This function extracts the unique team tri-codes from the games_trimmed dictionary and returns a set containing those tri-codes.
@@ -1033,6 +1501,7 @@ def build_team_set(games_trimmed=None):
     return triCodes
 
 # Rewrite to build from game_shifts.
+@instrumented
 def build_team_games(games_trimmed=None, team_set=None):
     """
     Function to build a dictionary containing all games played by each team in the dataset.
@@ -1052,11 +1521,57 @@ def build_team_games(games_trimmed=None, team_set=None):
         return None
     if team_set == None:
         team_set = build_team_set(games_trimmed=games_trimmed)
+    # Build every team's games in a single scan of the shots instead of one scan per team
+    all_team_games = build_lookup_dicts(games_trimmed=games_trimmed)['team_games']
     team_games = {}
     for team in team_set:
-        team_games[team] = get_single_team_games(team, games_trimmed=games_trimmed)
+        team_games[team] = all_team_games.get(team, {})
     return team_games
 
+@instrumented
+def build_lookup_dicts(games_trimmed=None, shot_table=None):
+    """
+    This function builds player_id_set, team_set, player_teams, team_games and player_id_games in one linear pass over the shots,
+    instead of the one scan per player and per team done by get_single_player_teams() and get_single_team_games().
+    The shots are read from shot_table if it is provided, otherwise from games_trimmed.
+    It returns a dictionary with those five keys, each holding the same shape as the matching build_*() function:
+        player_id_set: {player_id}
+        team_set: {triCode}
+        player_teams: {player_id: {year: [triCodes]}}
+        team_games: {triCode: {year: [game_ids]}}
+        player_id_games: {player_id: {year: [game_ids]}}
+    """
+    print("build_lookup_dicts()")
+    if shot_table is not None:
+        shots = zip(shot_table['game_id'].tolist(), shot_table['shooter'].tolist(), shot_table['team_codes'][shot_table['team']].tolist())
+    elif games_trimmed is not None:
+        shots = ((gameID, shot['players'][0]['player']['id'], shot['team']['triCode']) for gameID, game_dict in games_trimmed.items() for shot in game_dict.values())
+    else:
+        print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
+        return None
+    player_teams = {}
+    team_games = {}
+    for gameID, player_id, triCode in shots:
+        year = get_game_year(gameID)
+        # Record the team the shooter played for in that year
+        teams_year = player_teams.setdefault(player_id, {}).setdefault(year, [])
+        if triCode not in teams_year:
+            teams_year.append(triCode)
+        # Record the game for the shooting team; a game's shots are contiguous, so only the last entry needs checking
+        games_year = team_games.setdefault(triCode, {}).setdefault(year, [])
+        if len(games_year) == 0 or games_year[-1] != gameID:
+            games_year.append(gameID)
+    # A player's games are the games of every team they played for in that year, as in get_single_player_games()
+    player_id_games = {}
+    for player_id, teams in player_teams.items():
+        player_id_games[player_id] = {}
+        for year, triCodes in teams.items():
+            player_id_games[player_id][year] = []
+            for triCode in triCodes:
+                player_id_games[player_id][year] += team_games[triCode][year]
+    return {'player_id_set': set(player_teams), 'team_set': set(team_games), 'player_teams': player_teams, 'team_games': team_games, 'player_id_games': player_id_games}
+
+
 # Made redundant by game_shifts (only used for build_team_games). Rewrite to work off game_shifts and leave in just in case.
 def get_single_team_games(triCode, games_trimmed=None):
     """
@@ -1071,12 +1586,11 @@ def get_single_team_games(triCode, games_trimmed=None):
     # Initialize an empty dictionary to store the games a team has played in each year
     games_teamID = {}
     progress = 0
-    length = 80
     gtlength = len(games_trimmed)
     # Iterate over the shot dictionaries in the games_trimmed dictionary
     for gameID, game_dict in games_trimmed.items():
         progress += 1
-        print("[", "="*((progress*length)//gtlength), " "*(length-((progress*length)//gtlength)), "] Current game:", gameID, end="\r", flush=True)
+        report_progress("Current game:", progress, gtlength, gameID)
         for shot in game_dict.values():
             # Retrieve the triCode, year, and gameID for the current shot
             game_triCode = shot['team']['triCode']
@@ -1098,70 +1612,225 @@ def get_single_team_games(triCode, games_trimmed=None):
 
 
 
-def build_games_trimmed(directory='.'):
+def trim_game_file(file_path):
+    """
+    This function reads a single game .json file (plain, compressed or slim, see feed_io.py) and extracts the shots and goals from its first three periods.
+    It returns a tuple of (game_id, game_dict), where game_dict has the same shape as a single entry of games_trimmed.
+    If the file has no gamePk, (None, None) is returned so the caller can skip it.
+    It is kept at module level so that it can be handed to a process pool by build_games_trimmed().
+    The plays are streamed from the file one at a time with iter_feed_plays(), so the whole document is never held in memory.
+    """
+    # Open the .json file and stream its plays past the trimming loop
+    game_data, plays = iter_feed_plays(file_path)
+    try:
+        return trim_game_data(game_data, plays)
+    finally:
+        plays.close()
+
+
+def trim_game_data(game_data, plays=None):
+    """
+    This function extracts the shots and goals from the first three periods of an already loaded game dictionary.
+    It returns a tuple of (game_id, game_dict), or (None, None) if the game has no gamePk.
+    If plays is given (an iterable of the game's plays, such as the one returned by iter_feed_plays()), the plays are read from it instead,
+    and game_data only needs the gamePk and the teams.
+    """
+    # Initialize an empty dictionary to store information about the current game
+    game_dict = {}
+    game_id = game_data.get('gamePk', None)
+    if game_id == None:
+        return (None, None)
+    if plays is None:
+        plays = game_data['liveData']['plays']['allPlays']
+    # Initialize counter variables for the play index and the period number
+    k = 0
+    n = 0
+    away = game_data['gameData']['teams']['away']['triCode']
+    # Loop through the plays in the game, skipping the first one
+    for play in itertools.islice(plays, 1, None):
+        # Check if the current play is a period end event
+        if play['result']['event'] == "Period End":
+            # If it is, increment the period number
+            n = n+1
+        # If there have been 4 period end events, break out of the loop
+        if n >= 3:
+            n = 0
+            break
+        # Check if the current play is a shot or a goal
+        if play['result']['event'] in ["Shot", "Goal"]:
+            # If a shot does not have coordinate data, ignore the play and continue on with the loop.
+            if 'x' not in play['coordinates'] or 'y' not in play['coordinates']:
+                continue
+            # If a goal was scored on an empty net, ignore the play and continue on with the loop.
+            if play['result'].get('emptyNet', False) == True:
+                continue
+            # Retrieve the shooting team code and the period number from the play dictionary
+            shooting_team = play['team']['triCode']
+            period = play['about']['period']
+            # Check if the shooting team is the away team or the period is even (while we don't consider overtime,
+            # this would correct shots if this code were to be adjusted to include overtime shots.)
+            # If either condition is true, but not both, multiply the x value of the coordinates by -1
+            if ((away == play['team']['triCode']) ^ (n % 2 == 0)):
+                play['coordinates']['x'] *= -1
+            # Add the play dictionary to the game dictionary
+            game_dict[k] = play
+            # Increment the play index counter
+            k = k+1
+    xlist = getGameExes(game_dict)
+    if np.mean(xlist) <= 0:
+        switchGameExes(game_dict)
+    return (game_id, game_dict)
+
+
+def map_game_files(func, file_paths, *extra_args, workers=None, label="Current gamefile:"):
+    """
+    This function calls func on every file in file_paths (plus the matching entries of any extra_args lists) and yields the results in the order of file_paths.
+    If workers is None or 1 the files are processed one at a time in this process.
+    Otherwise the files are fanned out across a pool of that many worker processes, and the results are still yielded in file order so the merged dictionaries come out the same as in the serial case.
+    func must be defined at module level so it can be sent to the worker processes.
+    """
+    progress = 0
+    jflength = len(file_paths)
+    if workers is None or workers <= 1:
+        results = map(func, file_paths, *extra_args)
+        executor = None
+    else:
+        # Hand out the files in a few chunks per worker to keep the inter-process overhead low
+        chunksize = max(1, len(file_paths) // (workers * 4))
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(func, file_paths, *extra_args, chunksize=chunksize)
+    try:
+        for file_path, result in zip(file_paths, results):
+            progress += 1
+            count_event('files_parsed')
+            report_progress(label, progress, jflength, os.path.basename(file_path))
+            yield result
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def get_game_info(game_data):
+    """
+    This function returns the season, game type and date of an already loaded game dictionary as {'season', 'game_type', 'date'}.
+    The season is the year from get_game_year(), the game type is gameData's type (R, P, PR, ...), and the date is the local date at the home venue as 'YYYY-MM-DD',
+    or '' if the file has no start time.
+    """
+    game_info = {'season': get_game_year(game_data['gamePk'])}
+    game_info['game_type'] = game_data['gameData'].get('game', {}).get('type', '') or get_game_type(game_data['gamePk'])
+    game_info['date'] = ''
+    date_time = game_data['gameData'].get('datetime', {}).get('dateTime', '')
+    if date_time != '':
+        # The start time is in UTC, so shift it by the home venue's offset to get the date the game was played on
+        offset = game_data['gameData']['teams']['home'].get('venue', {}).get('timeZone', {}).get('offset', 0)
+        start_time = datetime.datetime.strptime(date_time, '%Y-%m-%dT%H:%M:%SZ') + datetime.timedelta(hours=offset)
+        game_info['date'] = start_time.date().isoformat()
+    return game_info
+
+
+def ingest_game_file(file_path, keep_plays=True):
+    """
+    This function parses a single game .json file (plain, compressed or slim, see feed_io.py) once and returns everything the base dictionaries need from it:
+    the trimmed shots, the home and away triCodes, the home and away rosters, the game year and the game info from get_game_info().
+    The result is a dictionary with the keys game_id, game_dict, shot_rows, teams, roster, year and info. game_id is None if the file has no gamePk.
+    If keep_plays is False, game_dict is None and only the compact shot_rows are returned.
+    It is kept at module level so that it can be handed to a process pool by build_base_dicts().
+    The plays are streamed from the file one at a time with iter_feed_plays(), so the whole document is never held in memory.
+    """
+    # Open the .json file, keeping only the header fields and streaming the plays
+    game_data, plays = iter_feed_plays(file_path)
+    game = {'game_id': game_data.get('gamePk', None)}
+    if game['game_id'] == None:
+        plays.close()
+        return game
+    # Retrieve the triCodes for the home and away teams
+    teams = game_data['gameData']['teams']
+    game['teams'] = (teams['home']['triCode'], teams['away']['triCode'])
+    # Trim the shots as the plays stream past, then read past the plays after the third period,
+    # since the boxscore can come after the plays in the file
+    game_dict = trim_game_data(game_data, plays)[1]
+    for play in plays:
+        pass
+    # Retrieve the player IDs dressed for each team from the boxscore
+    boxscore_teams = game_data['liveData']['boxscore']['teams']
+    game['roster'] = {}
+    for side in ('home', 'away'):
+        game['roster'][side] = [player_data['person']['id'] for player_data in boxscore_teams[side]['players'].values()]
+    game['year'] = get_game_year(game['game_id'])
+    game['info'] = get_game_info(game_data)
+    game['shot_rows'] = get_game_shot_rows(game['game_id'], game_dict)
+    if keep_plays:
+        game['game_dict'] = game_dict
+    else:
+        game['game_dict'] = None
+    return game
+
+
+@instrumented
+def build_base_dicts(games_directory='.', shifts_directory=None, workers=None, keep_games_trimmed=True):
+    """
+    This function builds every base dictionary in a single pass over the game and shift directories, parsing each file exactly once.
+    It returns a dictionary with the following keys:
+        games_trimmed: {game_id: {shot_num: play}}, as returned by build_games_trimmed()
+        home_away_teams: {game_id: (home_triCode, away_triCode)}, as returned by build_home_away_teams()
+        game_rosters: {game_id: {'home': [player_ids], 'away': [player_ids]}}
+        game_years: {game_id: year}, as returned by get_game_year()
+        game_info: {game_id: {'season', 'game_type', 'date'}}, as returned by get_game_info()
+        game_shifts: {game_id: {...}}, as returned by build_game_shifts(), or None if shifts_directory is not given
+        shot_table: the columnar shot table, as returned by build_shot_table()
+        shift_intervals: the integer-second shift intervals, as returned by build_shift_intervals(), or None if shifts_directory is not given
+    If workers is greater than 1, the files are parsed in parallel by that many worker processes.
+    If keep_games_trimmed is False, the raw play dictionaries are dropped as soon as each file is parsed and games_trimmed is None,
+    which keeps memory down to the shot table when only the shot accessors are needed.
+
+    Example usage:
+    base_dicts = build_base_dicts('../Capstone/api/games', '../Capstone/api/shifts', workers=8)
+    games_trimmed = base_dicts['games_trimmed']
+    """
+    print("build_base_dicts()", flush=True)
+    json_files = list_feed_files(games_directory)
+    file_paths = [os.path.join(games_directory, file_name) for file_name in json_files]
+    base_dicts = {'games_trimmed': {}, 'home_away_teams': {}, 'game_rosters': {}, 'game_years': {}, 'game_info': {}, 'game_shifts': None, 'shift_intervals': None}
+    shot_rows = []
+    # Loop through the parsed games in file order and split each one into the base dictionaries
+    for game in map_game_files(ingest_game_file, file_paths, [keep_games_trimmed] * len(file_paths), workers=workers):
+        game_id = game['game_id']
+        if game_id == None:
+            continue
+        if keep_games_trimmed:
+            base_dicts['games_trimmed'][game_id] = game['game_dict']
+        shot_rows.extend(game['shot_rows'])
+        base_dicts['home_away_teams'][game_id] = game['teams']
+        base_dicts['game_rosters'][game_id] = game['roster']
+        base_dicts['game_years'][game_id] = game['year']
+        base_dicts['game_info'][game_id] = game['info']
+    print()
+    if not keep_games_trimmed:
+        base_dicts['games_trimmed'] = None
+    base_dicts['shot_table'] = build_shot_table(shot_rows=shot_rows)
+    # The shift files need the home and away teams, which are now known without opening the game files again
+    if shifts_directory is not None:
+        base_dicts['game_shifts'] = build_game_shifts(directory=shifts_directory, home_away_teams=base_dicts['home_away_teams'], workers=workers)
+        base_dicts['shift_intervals'] = build_shift_intervals(game_shifts=base_dicts['game_shifts'])
+    return base_dicts
+
+
+@instrumented
+def build_games_trimmed(directory='.', workers=None):
     """ 
     This function is used to process json files in the specified directory, and extract certain game-related data from them.
     The extracted data is then stored in a dictionary and returned.
+    If workers is greater than 1, the files are parsed in parallel by that many worker processes. The result is identical to the serial build.
     """
     print("build_games_trimmed()", flush=True)
-    # Get a list of all .json files in the specified directory
-    json_files = [f for f in os.listdir(directory) if f.endswith('.json')]
+    # Get a sorted list of all game files (.json, .json.gz or .json.zst) in the specified directory so the games are always merged in the same order
+    json_files = list_feed_files(directory)
+    file_paths = [os.path.join(directory, file_name) for file_name in json_files]
     games_trimmed = {}
-    progress = 0
-    length = 80
-    jflength = len(json_files)
-    # Loop through the .json files in the directory
-    for file_name in json_files:
-        progress += 1
-        print("[", "="*((progress*length)//jflength), " "*(length-((progress*length)//jflength)), "] Current gamefile:", file_name, end="\r", flush=True)
-        # Construct the file path for the current .json file
-        file_path = os.path.join(directory, file_name)
-        # Open the .json file and load the data into a dictionary
-        with open(file_path, encoding='utf-8') as json_file:
-            game_data = json.load(json_file)
-        # Initialize an empty dictionary to store information about the current game
-        game_dict = {}
-        game_id = game_data.get('gamePk', None)
+    # Loop through the trimmed games in file order
+    for game_id, game_dict in map_game_files(trim_game_file, file_paths, workers=workers):
         if game_id == None:
             continue
-        # Initialize counter variables for the play index and the period number
-        k = 0
-        n = 0
-        away = game_data['gameData']['teams']['away']['triCode']
-        # Loop through the plays in the game
-        for m in range(1, len(game_data['liveData']['plays']['allPlays'])):
-            # Check if the current play is a period end event
-            play = game_data['liveData']['plays']['allPlays'][m]
-            if play['result']['event'] == "Period End":
-                # If it is, increment the period number
-                n = n+1
-            # If there have been 4 period end events, break out of the loop
-            if n >= 3:
-                n = 0
-                break
-            # Check if the current play is a shot or a goal
-            if play['result']['event'] in ["Shot", "Goal"]:
-                # If a shot does not have coordinate data, ignore the play and continue on with the loop.
-                if 'x' not in play['coordinates'] or 'y' not in play['coordinates']:
-                    continue
-                # If a goal was scored on an empty net, ignore the play and continue on with the loop.
-                if play['result'].get('emptyNet', False) == True:
-                    continue
-                # Retrieve the shooting team code and the period number from the play dictionary
-                shooting_team = play['team']['triCode']
-                period = play['about']['period']
-                # Check if the shooting team is the away team or the period is even (while we don't consider overtime,
-                # this would correct shots if this code were to be adjusted to include overtime shots.)
-                # If either condition is true, but not both, multiply the x value of the coordinates by -1
-                if ((away == play['team']['triCode']) ^ (n % 2 == 0)):
-                    play['coordinates']['x'] *= -1
-                # Add the play dictionary to the game dictionary
-                game_dict[k] = play
-                # Increment the play index counter
-                k = k+1
-        xlist = getGameExes(game_dict)
-        if np.mean(xlist) <= 0:
-            switchGameExes(game_dict)
         # Add the game dictionary to the games_trimmed global variable, using the game ID as the key
         games_trimmed[game_id] = game_dict
     return games_trimmed
@@ -1194,6 +1863,109 @@ def switchGameExes(gameDict):
         gameDict[i]['coordinates']['x'] *= -1
 
 
+def period_time_to_seconds(periodTime):
+    """
+    This function converts a "MM:SS" period time string, as used in the game and shift files, into an integer number of seconds into the period.
+    """
+    minutes, seconds = periodTime.split(':')
+    return int(minutes) * 60 + int(seconds)
+
+
+def get_game_shot_rows(game_id, game_dict):
+    """
+    This function flattens the shots of a single games_trimmed entry into a list of row tuples for build_shot_table().
+    Each row is (game_id, shot_num, period, period_seconds, x, y, shooter, triCode, is_goal).
+    """
+    shot_rows = []
+    for shot_num, shot in game_dict.items():
+        shot_rows.append((game_id, shot_num, shot['about']['period'], period_time_to_seconds(shot['about']['periodTime']),
+                          shot['coordinates']['x'], shot['coordinates']['y'], shot['players'][0]['player']['id'],
+                          shot['team']['triCode'], shot['result']['event'] == 'Goal'))
+    return shot_rows
+
+
+@instrumented
+def build_shot_table(games_trimmed=None, shot_rows=None):
+    """
+    This function builds a columnar shot table: a dictionary of typed NumPy arrays with one entry per shot, sorted by game_id and shot_num.
+    It can be built from games_trimmed, or from a list of row tuples as returned by get_game_shot_rows().
+    The dictionary has the following keys:
+        game_id (int64), shot_num (int32), period (int8), period_seconds (int16): when the shot was taken
+        x, y (float32): the shot coordinates, already flipped the same way as in games_trimmed
+        shooter (int32): the shooter's player ID
+        team (int16): index into team_codes of the shooting team's triCode
+        is_goal (bool): whether the shot was a goal
+        cell_x, cell_y (int16): the grouped coordinates used by grouped_data (x//5, y//3)
+        cell (int32): index into cell_keys of the shot's grouped coordinate
+        team_codes: sorted array of triCodes
+        cell_keys: sorted (n_cells, 2) array of (cell_x, cell_y) pairs
+        game_ids, game_offsets: the sorted unique game IDs and the row range of each game, so the shots of game_ids[i] are rows game_offsets[i]:game_offsets[i+1]
+    """
+    print("build_shot_table()")
+    if shot_rows is None:
+        if games_trimmed is None:
+            print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
+            return None
+        shot_rows = []
+        for game_id, game_dict in games_trimmed.items():
+            shot_rows.extend(get_game_shot_rows(game_id, game_dict))
+    # Sort the rows so the shots of each game are contiguous and in shot order
+    shot_rows = sorted(shot_rows, key=lambda row: (row[0], row[1]))
+    if len(shot_rows) > 0:
+        columns = list(zip(*shot_rows))
+    else:
+        columns = [[]] * 9
+    shot_table = {}
+    shot_table['game_id'] = np.array(columns[0], dtype=np.int64)
+    shot_table['shot_num'] = np.array(columns[1], dtype=np.int32)
+    shot_table['period'] = np.array(columns[2], dtype=np.int8)
+    shot_table['period_seconds'] = np.array(columns[3], dtype=np.int16)
+    shot_table['x'] = np.array(columns[4], dtype=np.float32)
+    shot_table['y'] = np.array(columns[5], dtype=np.float32)
+    shot_table['shooter'] = np.array(columns[6], dtype=np.int32)
+    shot_table['is_goal'] = np.array(columns[8], dtype=bool)
+    index_shot_table(shot_table, np.array(columns[7], dtype='U3'))
+    count_event('shots_kept', len(shot_table['game_id']))
+    return shot_table
+
+
+def index_shot_table(shot_table, triCodes):
+    """
+    This function fills in the derived columns of a shot table whose per-shot columns (game_id through is_goal, minus team) are already set and sorted:
+    the team codes from the triCodes array, the grouped cells, and the per-game row offsets.
+    """
+    # Store the triCodes once and keep a small integer code per shot
+    team_codes, team = np.unique(triCodes, return_inverse=True)
+    shot_table['team'] = team.reshape(-1).astype(np.int16)
+    shot_table['team_codes'] = team_codes
+    # Use the same grouping as build_grouped_data()
+    shot_table['cell_x'] = np.floor_divide(shot_table['x'], 5).astype(np.int16)
+    shot_table['cell_y'] = np.floor_divide(shot_table['y'], 3).astype(np.int16)
+    cell_keys, cell = np.unique(np.stack([shot_table['cell_x'], shot_table['cell_y']], axis=1), axis=0, return_inverse=True)
+    shot_table['cell'] = cell.reshape(-1).astype(np.int32)
+    shot_table['cell_keys'] = cell_keys.reshape(-1, 2)
+    # Record where each game's shots start and end
+    game_ids, game_starts = np.unique(shot_table['game_id'], return_index=True)
+    shot_table['game_ids'] = game_ids
+    shot_table['game_offsets'] = np.append(game_starts, len(shot_table['game_id'])).astype(np.int64)
+
+
+def get_shot_row(gameID, shotID, shot_table):
+    """
+    This function returns the row of the shot table holding the given shot.
+    Like looking the shot up in games_trimmed, it raises KeyError if the game is not in the table or the game has no shot with that shotID.
+    """
+    game_index = np.searchsorted(shot_table['game_ids'], gameID)
+    if game_index == len(shot_table['game_ids']) or shot_table['game_ids'][game_index] != gameID:
+        raise KeyError(gameID)
+    # A shotID past the game's last shot would otherwise land on a row of the next game
+    row = int(shot_table['game_offsets'][game_index]) + shotID
+    if shotID < 0 or row >= shot_table['game_offsets'][game_index + 1]:
+        raise KeyError(shotID)
+    return row
+
+
+@instrumented
 def build_grouped_data(games_trimmed=None, coordinate_shots=None):
     """
     This function takes in a dictionary of games_trimmed, which contains the data for each game, 
@@ -1228,106 +2000,191 @@ def build_grouped_data(games_trimmed=None, coordinate_shots=None):
 
 
 
-def get_player_avg_pct_counts_and_groups(playerID, games_trimmed=None, coordinate_shots=None, grouped_data=None):
+@instrumented
+def build_grouped_counts(games_trimmed=None, coordinate_shots=None, grouped_data=None):
+    """
+    This function counts the shots and goals in each grid cell of grouped_data.
+    It returns a dictionary keyed by the same (x_group, y_group) tuples as grouped_data, where each value is a (shot_count, goal_count) tuple.
+    These counts are all get_player_avg_pct_and_groups() needs from the league data, so the shot lists never have to be walked again.
+    """
+    print("build_grouped_counts()")
+    if games_trimmed is None:
+        print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
+        return None
+    if grouped_data is None:
+        grouped_data = build_grouped_data(games_trimmed=games_trimmed, coordinate_shots=coordinate_shots)
+    grouped_counts = {}
+    for key, shots in grouped_data.items():
+        # Count the goals among the shots in this grid cell
+        goal_count = 0
+        for game_id, shot_num in shots:
+            if games_trimmed[game_id][shot_num]['result']['event'] == 'Goal':
+                goal_count += 1
+        grouped_counts[key] = (len(shots), goal_count)
+    return grouped_counts
+
+
+def get_player_grouped_counts(player_shots, games_trimmed=None):
+    """
+    This function counts a player's shots and goals in each grid cell.
+    It returns a dictionary of {(x_group, y_group): (shot_count, goal_count)} for the cells the player has shot from.
+    """
+    player_counts = {}
+    for gameID, shot in player_shots:
+        key = get_shot_grouped_coordinates(gameID, shot, games_trimmed=games_trimmed)
+        shot_count, goal_count = player_counts.get(key, (0, 0))
+        if games_trimmed[gameID][shot]['result']['event'] == 'Goal':
+            goal_count += 1
+        player_counts[key] = (shot_count + 1, goal_count)
+    return player_counts
+
+
+@instrumented
+def build_player_cell_counts(shot_table=None):
+    """
+    This function counts every shooter's shots and goals in every grid cell of the shot table with a single scatter-add (np.bincount).
+    It returns a dictionary with the following keys:
+        players: sorted array of the shooters' player IDs; row i of the matrices belongs to players[i]
+        cell_keys: the (x_group, y_group) of each matrix column, the same as shot_table['cell_keys']
+        shots, goals: (n_players, n_cells) arrays of each player's shot and goal counts per cell
+        league_shots, league_goals: (n_cells,) arrays of the league-wide shot and goal counts per cell
+    The matrices are stored dense: with a few thousand players and about a thousand cells they are a few tens of megabytes, and every player's pct grid is dense anyway.
+    """
+    print("build_player_cell_counts()")
+    if shot_table is None:
+        print("Please build shot_table with the build_shot_table() function.")
+        return None
+    players, shot_players = np.unique(shot_table['shooter'], return_inverse=True)
+    n_players = len(players)
+    n_cells = len(shot_table['cell_keys'])
+    # Scatter-add each shot into its (player, cell) entry of a flattened matrix
+    flat_index = shot_players.reshape(-1).astype(np.int64) * n_cells + shot_table['cell']
+    player_cell_counts = {}
+    player_cell_counts['players'] = players
+    player_cell_counts['cell_keys'] = shot_table['cell_keys']
+    player_cell_counts['shots'] = np.bincount(flat_index, minlength=n_players * n_cells).reshape(n_players, n_cells)
+    player_cell_counts['goals'] = np.bincount(flat_index, weights=shot_table['is_goal'], minlength=n_players * n_cells).astype(np.int64).reshape(n_players, n_cells)
+    player_cell_counts['league_shots'] = player_cell_counts['shots'].sum(axis=0)
+    player_cell_counts['league_goals'] = player_cell_counts['goals'].sum(axis=0)
+    return player_cell_counts
+
+
+@instrumented
+def build_player_cell_pcts(player_cell_counts=None, player_weight=849, prior_shots=None, prior_goals=None):
+    """
+    This function turns the count matrices from build_player_cell_counts() into every player's pct grid and overall average at once,
+    using the same weighting as get_player_avg_pct_and_groups(): (league goals + player_weight * player goals) / (league shots + player_weight * player shots).
+    prior_shots and prior_goals replace the league counts when given; update_sadd_state() uses this to hold the league prior fixed.
+    It returns a dictionary with the keys players and cell_keys (as in player_cell_counts), pct, an (n_players, n_cells) array of grid percentages,
+    and avg, an (n_players,) array of overall percentages.
+    """
+    print("build_player_cell_pcts()")
+    if player_cell_counts is None:
+        print("Please build player_cell_counts with the build_player_cell_counts() function.")
+        return None
+    if prior_shots is None:
+        prior_shots = player_cell_counts['league_shots']
+    if prior_goals is None:
+        prior_goals = player_cell_counts['league_goals']
+    player_cell_pcts = {}
+    player_cell_pcts['players'] = player_cell_counts['players']
+    player_cell_pcts['cell_keys'] = player_cell_counts['cell_keys']
+    player_cell_pcts['pct'], player_cell_pcts['avg'] = get_weighted_pcts(player_cell_counts['shots'], player_cell_counts['goals'], prior_shots, prior_goals, player_weight)
+    return player_cell_pcts
+
+
+def get_weighted_pcts(shots, goals, prior_shots, prior_goals, player_weight=849):
+    """
+    This function applies the player_weight blend to rows of player count matrices and returns (pct, avg) for those rows.
+    """
+    weighted_shots = prior_shots[np.newaxis, :] + player_weight * shots
+    weighted_goals = prior_goals[np.newaxis, :] + player_weight * goals
+    # Empty cells get a percentage of 0, as get_goal_shot_ratio() does for an empty shot list
+    pct = np.divide(weighted_goals, weighted_shots, out=np.zeros(weighted_shots.shape), where=weighted_shots > 0)
+    avg = weighted_goals.sum(axis=1) / np.maximum(weighted_shots.sum(axis=1), 1)
+    return (pct, avg)
+
+
+def get_player_index(player_id, player_cell_pcts):
+    """
+    This function returns the row of player_id in the player_cell_counts or player_cell_pcts matrices.
+    It raises KeyError if the player has no shots in them, as get_shot_row() does for an unknown shot, so a lookup never indexes the matrices with None.
+    """
+    player_index = np.searchsorted(player_cell_pcts['players'], player_id)
+    if player_index == len(player_cell_pcts['players']) or player_cell_pcts['players'][player_index] != player_id:
+        raise KeyError(int(player_id))
+    return int(player_index)
+
+
+def get_player_avg_pct_counts_and_groups(playerID, games_trimmed=None, coordinate_shots=None, grouped_data=None, grouped_counts=None, player_shots=None, player_weight=849):
     """
     This function returns the average goal-to-shot ratio of a given player, and the ratio of each group of shots.
     It takes in the player's ID, the trimmed game data, the coordinate shots data, and the grouped data.
+    The ratios are the same as get_player_avg_pct_and_groups(), but each group's value is a (ratio, weighted shot count) tuple.
     """
     # Print message to show the function is running
     print("get_player_avg_pct_counts_and_groups()", end="\r", flush=True)
-    # If grouped data is not passed, then build it using the provided game data and coordinate shots data
-    if grouped_data is None:
-        grouped_data = build_grouped_data(games_trimmed=games_trimmed, coordinate_shots=coordinate_shots)
+    # If grouped counts are not passed, then build them using the provided game data and coordinate shots data
+    if grouped_counts is None:
+        grouped_counts = build_grouped_counts(games_trimmed=games_trimmed, coordinate_shots=coordinate_shots, grouped_data=grouped_data)
     # Get the shots made by the player
-    player_shots = get_shots_by_player(playerID)
-    # Make a copy of the grouped shots data
-    weighted_shots = grouped_data.copy()
+    if player_shots is None:
+        player_shots = get_shots_by_player(playerID, games_trimmed=games_trimmed)
+    player_counts = get_player_grouped_counts(player_shots, games_trimmed=games_trimmed)
     # Initialize a dictionary to store the ratio of each group
     group_dict = {}
-    # Initialize the total ratio and weight
-    total_ratio = 0
+    # Initialize the total goals and weight
+    total_goals = 0
     total_weight = 0
-    # Initialize the progress indicator
-    progress = 0
-    length = 60
-    # Add the player's shots to the weighted shots
-    for gameID, shot in player_shots:
-        x, y = get_shot_grouped_coordinates(gameID, shot, games_trimmed=games_trimmed)
-        for _ in range(1, 850):
-            weighted_shots[(x, y)].append((gameID, shot))
-    # Get the length of the weighted shots
-    wslength = len(weighted_shots)
     # Iterate through each group of shots
-    for (x, y) in weighted_shots:
-        # Update the progress indicator
-        progress += 1
-        # Print the progress indicator
-        print("[", "="*((progress*length)//wslength), " "*(length-((progress*length)//wslength)), "] - Current coordinate:", x, y, "Current player:", playerID, end="\r", flush=True)
-        # Get the ratio of goals to shots for the current group
-        group_ratio = get_goal_shot_ratio(playerID, player_shots=weighted_shots[(x, y)], count=1)
-        # Add the ratio of the current group to the total ratio
-        total_ratio += group_ratio[0] * len(weighted_shots[(x, y)])
-        # Add the weight of the current group to the total weight
-        total_weight += len(weighted_shots[(x, y)])
-        # Add the ratio of the current group to the group dictionary
-        group_dict[(x, y)] = group_ratio
+    for key, (league_shots, league_goals) in grouped_counts.items():
+        player_shots_count, player_goals = player_counts.get(key, (0, 0))
+        # Weight the player's own shots on top of the league shots in this group
+        weighted_shots = league_shots + player_weight * player_shots_count
+        weighted_goals = league_goals + player_weight * player_goals
+        if weighted_shots == 0:
+            group_dict[key] = (0, 0)
+            continue
+        group_dict[key] = (weighted_goals / weighted_shots, weighted_shots)
+        total_goals += weighted_goals
+        total_weight += weighted_shots
     # Return the average ratio and the group ratios
-    return (total_ratio / total_weight, group_dict)
+    return (total_goals / total_weight, group_dict)
 
 
-def get_player_avg_pct_and_groups(playerID, games_trimmed=None, coordinate_shots=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, grouped_data=None, player_shots=None):
+def get_player_avg_pct_and_groups(playerID, games_trimmed=None, coordinate_shots=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, grouped_data=None, player_shots=None, grouped_counts=None, player_weight=849):
     """
     This function takes in a player ID and returns the average shooting percentage 
     and a dictionary of shooting percentages for each (x, y) coordinate group.
+    Each group's percentage blends the league shots in that group with the player's own shots, counting each of the player's shots player_weight extra times:
+    (league goals + player_weight * player goals) / (league shots + player_weight * player shots).
+    The average is the same blend over all groups. grouped_data and grouped_counts are only read, never modified.
     """
     print("get_player_avg_pct_and_groups()", end="\r", flush=True)
     if games_trimmed is None:
         print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
         return None
-    if coordinate_shots is None:
-        coordinate_shots = build_coordinate_shots(games_trimmed=games_trimmed)
-    if grouped_data is None:
-        grouped_data = build_grouped_data(games_trimmed=games_trimmed, coordinate_shots=coordinate_shots)
+    if grouped_counts is None:
+        grouped_counts = build_grouped_counts(games_trimmed=games_trimmed, coordinate_shots=coordinate_shots, grouped_data=grouped_data)
     # If player_shots is not provided, retrieve the player_shots using the get_shots_by_player function
-    if player_id_set is None:
-        player_id_set = build_player_id_set(games_trimmed=games_trimmed)
-    if player_teams is None:
-        player_teams = build_player_teams(games_trimmed=games_trimmed, player_id_set=player_id_set)
-    if team_set is None:
-        team_set = build_team_set(games_trimmed=games_trimmed)
-    if team_games is None:
-        team_games = build_team_games(games_trimmed=games_trimmed, team_set=team_set)
-    if player_id_games is None:
-        player_id_games = build_player_id_games(games_trimmed=games_trimmed, player_id_set=player_id_set, player_teams=player_teams, team_games=team_games)
     if player_shots is None:
         player_shots = get_shots_by_player(playerID, games_trimmed=games_trimmed, player_id_set=player_id_set, player_teams=player_teams, team_set=team_set, team_games=team_games, player_id_games=player_id_games)
-    weighted_shots = grouped_data
+    average, group_counts = get_player_avg_pct_counts_and_groups(playerID, games_trimmed=games_trimmed, grouped_counts=grouped_counts, player_shots=player_shots, player_weight=player_weight)
     group_dict = {}
-    total_ratio = 0
-    total_weight = 0
-    
-    # weight the shots by adding them to the corresponding coordinate group in the weighted_shots dictionary
-    for gameID, shot in player_shots:
-        x, y = get_shot_grouped_coordinates(gameID, shot, games_trimmed=games_trimmed)
-        for _ in range(1, 850):
-            weighted_shots[(x, y)].append((gameID, shot))
-            
-    # calculate the goal shot ratio for each coordinate group
-    for (x, y) in weighted_shots:
-        group_ratio = get_goal_shot_ratio(playerID, player_shots=weighted_shots[(x, y)], count=False, games_trimmed=games_trimmed, player_id_set=player_id_set, player_teams=player_teams, team_set=team_set, team_games=team_games, player_id_games=player_id_games)
-        # add the group ratio to the total ratio, weighted by the number of shots in the group
-        total_ratio += group_ratio * len(weighted_shots[(x, y)])
-        total_weight += len(weighted_shots[(x, y)])
-        group_dict[(x, y)] = group_ratio
-    # calculate the overall average goal shot ratio by dividing the total ratio by the total weight
-    return (total_ratio / total_weight, group_dict)
-
-
-def get_shot_coordinates(gameID, shotID, games_trimmed=None):
+    for key, (group_ratio, weighted_shots) in group_counts.items():
+        group_dict[key] = group_ratio
+    return (average, group_dict)
+
+
+def get_shot_coordinates(gameID, shotID, games_trimmed=None, shot_table=None):
     """
     This function takes in the gameID and shotID for a specific shot, as well as the games_trimmed dictionary, which is a dictionary where each key is a gameID and each value is a list of shots for that game.
     The function returns a tuple of the x and y coordinates for that shot.
+    If shot_table is provided, the coordinates are read from it instead of games_trimmed.
     """
+    if shot_table is not None:
+        row = get_shot_row(gameID, shotID, shot_table)
+        return (float(shot_table['x'][row]), float(shot_table['y'][row]))
     if games_trimmed is None:
         print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
         return None
@@ -1336,20 +2193,37 @@ def get_shot_coordinates(gameID, shotID, games_trimmed=None):
 
 # TODO: Link grouping numbers for this function and build_grouped_coordinates to allow manual control of fineness.
 
-def get_shot_grouped_coordinates(gameID, shotID, games_trimmed=None):
+def get_shot_grouped_coordinates(gameID, shotID, games_trimmed=None, shot_table=None):
     """
     This function returns the coordinates of a shot under the grouping established by grouped_data.
+    If shot_table is provided, the grouped coordinates are read from it instead of games_trimmed.
     """
+    if shot_table is not None:
+        row = get_shot_row(gameID, shotID, shot_table)
+        return (int(shot_table['cell_x'][row]), int(shot_table['cell_y'][row]))
     if games_trimmed is None:
         print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
         return None
     return (games_trimmed[gameID][shotID]['coordinates']['x']//5, games_trimmed[gameID][shotID]['coordinates']['y']//3)
 
 
-def build_player_pcts_and_groups(games_trimmed=None, player_id_set = None, player_teams=None, team_set=None, team_games=None, player_id_games=None, coordinate_shots=None, grouped_data=None):
+@instrumented
+def build_player_pcts_and_groups(games_trimmed=None, player_id_set = None, player_teams=None, team_set=None, team_games=None, player_id_games=None, coordinate_shots=None, grouped_data=None, grouped_counts=None, player_weight=849, shot_table=None, player_cell_pcts=None):
     """
     This function returns a dictionary of players, each containing each (grouped) coordinate from which that player has shot, and their shooting percentage at that coordinate.
-    """
+    player_weight is passed on to get_player_avg_pct_and_groups().
+    If shot_table or player_cell_pcts is provided, every player's grid is read from the matrices of build_player_cell_pcts() instead of being computed player by player.
+    """
+    if shot_table is not None or player_cell_pcts is not None:
+        if player_cell_pcts is None:
+            player_cell_pcts = build_player_cell_pcts(build_player_cell_counts(shot_table), player_weight=player_weight)
+        cell_keys = [tuple(key) for key in player_cell_pcts['cell_keys'].tolist()]
+        player_pcts = {}
+        for player_index, player in enumerate(player_cell_pcts['players'].tolist()):
+            if player_id_set is not None and player not in player_id_set:
+                continue
+            player_pcts[player] = (float(player_cell_pcts['avg'][player_index]), dict(zip(cell_keys, player_cell_pcts['pct'][player_index].tolist())))
+        return player_pcts
     if games_trimmed is None:
         print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
         return None
@@ -1367,32 +2241,42 @@ def build_player_pcts_and_groups(games_trimmed=None, player_id_set = None, playe
         coordinate_shots = build_coordinate_shots(games_trimmed=games_trimmed)
     if grouped_data is None:
         grouped_data=build_grouped_data(games_trimmed=games_trimmed, coordinate_shots=coordinate_shots)
+    # Count the league shots and goals per group once for every player
+    if grouped_counts is None:
+        grouped_counts = build_grouped_counts(games_trimmed=games_trimmed, grouped_data=grouped_data)
     player_pcts = {}
-    length = 80
     progress = 0
     psetlength = len(player_id_set)
     print("build_player_pcts_and_groups(): Building dictionary for players")
     for player in player_id_set:
         progress += 1
-        print("[", "="*((progress*length)//psetlength), " "*(length-((progress*length)//psetlength)), "] - Current player:", player, end="\r")
-        player_pcts[player] = get_player_avg_pct_and_groups(player, games_trimmed=games_trimmed, coordinate_shots=coordinate_shots, player_id_set=player_id_set, player_teams=player_teams, team_set=team_set, team_games=team_games, player_id_games=player_id_games, grouped_data=grouped_data)
+        report_progress("- Current player:", progress, psetlength, player)
+        player_pcts[player] = get_player_avg_pct_and_groups(player, games_trimmed=games_trimmed, coordinate_shots=coordinate_shots, player_id_set=player_id_set, player_teams=player_teams, team_set=team_set, team_games=team_games, player_id_games=player_id_games, grouped_data=grouped_data, grouped_counts=grouped_counts, player_weight=player_weight)
     return player_pcts
 
 
-def get_shot_shooter(gameID, shotID, games_trimmed=None):
+def get_shot_shooter(gameID, shotID, games_trimmed=None, shot_table=None):
     """
     This function returns the shooter of a particular shot.
+    If shot_table is provided, the shooter is read from it instead of games_trimmed.
     """
+    if shot_table is not None:
+        return int(shot_table['shooter'][get_shot_row(gameID, shotID, shot_table)])
     if games_trimmed is None:
         print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
         return None
     return games_trimmed[gameID][shotID]['players'][0]['player']['id']
 
 
-def get_shot_pct(gameID, shotID, games_trimmed=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, coordinate_shots=None, grouped_data=None, player_pcts_and_groups=None):
+def get_shot_pct(gameID, shotID, games_trimmed=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, coordinate_shots=None, grouped_data=None, player_pcts_and_groups=None, shot_table=None, player_cell_pcts=None):
     """
     This function returns the expected shooting percentage of a given shot based on its location and shooter.
+    If shot_table and player_cell_pcts are provided, the percentage is a direct lookup in the pct matrix.
     """
+    if shot_table is not None and player_cell_pcts is not None:
+        row = get_shot_row(gameID, shotID, shot_table)
+        player_index = get_player_index(shot_table['shooter'][row], player_cell_pcts)
+        return float(player_cell_pcts['pct'][player_index, shot_table['cell'][row]])
     if games_trimmed is None:
         print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
         return None
@@ -1417,10 +2301,14 @@ def get_shot_pct(gameID, shotID, games_trimmed=None, player_id_set=None, player_
     return player_pcts_and_groups[shooter][1][(x, y)]
 
 
-def get_shooter_pct(gameID, shotID, games_trimmed=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, coordinate_shots=None, grouped_data=None, player_pcts_and_groups=None):
+def get_shooter_pct(gameID, shotID, games_trimmed=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, coordinate_shots=None, grouped_data=None, player_pcts_and_groups=None, shot_table=None, player_cell_pcts=None):
     """
     This function returns the overall shooting percentage of the player who took a particular shot.
+    If shot_table and player_cell_pcts are provided, the percentage is a direct lookup in the avg array.
     """
+    if shot_table is not None and player_cell_pcts is not None:
+        row = get_shot_row(gameID, shotID, shot_table)
+        return float(player_cell_pcts['avg'][get_player_index(shot_table['shooter'][row], player_cell_pcts)])
     if games_trimmed is None:
         print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
         return None
@@ -1444,25 +2332,46 @@ def get_shooter_pct(gameID, shotID, games_trimmed=None, player_id_set=None, play
     return player_pcts_and_groups[shooter][0]
 
 
-def get_shot_time(gameID, shotID, games_trimmed=None):
+def get_shot_time(gameID, shotID, games_trimmed=None, shot_table=None):
     """
     This function returns the period and time at which a shot was taken.
+    If shot_table is provided, the time is read from it instead of games_trimmed, and is returned in the same "MM:SS" format.
     """
+    if shot_table is not None:
+        row = get_shot_row(gameID, shotID, shot_table)
+        seconds = int(shot_table['period_seconds'][row])
+        return (int(shot_table['period'][row]), "%02d:%02d" % (seconds // 60, seconds % 60))
     if games_trimmed is None:
         print("Please build games_trimmed with the build_games_trimmed() function. \nPass the directory your game .json files are saved in as its argument.")
         return None
     return (games_trimmed[gameID][shotID]['about']['period'], games_trimmed[gameID][shotID]['about']['periodTime'])
 
 # TODO: Rewrite to be a sum of shot SADDs, build external dictionary of SADD values for each shot. (Also makes an offensive-SADD metric and overall-SADD metric easy to calculate.)
-def build_sadd(games_trimmed=None, directory='.', game_shifts=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, coordinate_shots=None, grouped_data=None, player_pcts_and_groups=None):
+# The per-shot values are now stored by build_sadd_ledger(), and aggregate_sadd_ledger() computes defensive, offensive, overall, team and per-season SADD from it.
+@instrumented
+def build_sadd(games_trimmed=None, directory='.', game_shifts=None, player_id_set=None, player_teams=None, team_set=None, team_games=None, player_id_games=None, coordinate_shots=None, grouped_data=None, player_pcts_and_groups=None, shot_table=None, shots_on_ice=None, player_cell_pcts=None, return_arrays=False):
     """
     This function returns a dictionary of shooter-adjusted distance differential values for each player.
-    """
+    If shot_table and shots_on_ice are provided, the defending players for each shot are read from shots_on_ice instead of being looked up in game_shifts.
+    The two ways define a shot's defenders differently:
+        from game_shifts (the original rule), get_opposing_players() keeps the players on the ice who took a shot themselves that season (are in player_teams[player][year])
+        and whose teams that season do not overlap the shooter's, so goalies, skaters without a shot and players traded from the shooter's team are left out
+        from shots_on_ice, every player on the ice for the other team (by the side of their shift chart) is a defender, goalies included
+    On a 30-game synthetic corpus the defenders of 1112 of 2010 shots differ, and 584 players get SADD values instead of 495; the players both rules count get the same values.
+    If player_cell_pcts is provided as well, the whole computation is done on arrays by build_sadd_arrays(), and games_trimmed and the other dictionaries are not needed.
+    With return_arrays=True, the NumPy result of build_sadd_arrays() is returned along with the dictionary, as (sadd, sadd_arrays).
+    """
+    if shot_table is not None and shots_on_ice is not None and player_cell_pcts is not None:
+        sadd_arrays = build_sadd_arrays(shot_table, shots_on_ice, player_cell_pcts)
+        sadd = get_sadd_dict(sadd_arrays)
+        if return_arrays:
+            return (sadd, sadd_arrays)
+        return sadd
     print("build_sadd(): Checking definitions of initial dictionaries", flush=True)
     if games_trimmed is None:
         print("Caution! Assuming game data is stored in the games subdirectory of the current working directory.\nIf this is not accurate, please call build_games_trimmed() with the correct diretory.")
         games_trimmed = build_games_trimmed('./games/')
-    if game_shifts is None:
+    if game_shifts is None and shots_on_ice is None:
         game_shifts=build_game_shifts(directory=directory)
     if player_id_set is None:
         player_id_set = build_player_id_set(games_trimmed=games_trimmed)
@@ -1480,10 +2389,10 @@ def build_sadd(games_trimmed=None, directory='.', game_shifts=None, player_id_se
         grouped_data=build_grouped_data(games_trimmed=games_trimmed, coordinate_shots=coordinate_shots)
     if player_pcts_and_groups is None:
         player_pcts_and_groups=build_player_pcts_and_groups(games_trimmed=games_trimmed, player_id_set=player_id_set, player_teams=player_teams, team_set=team_set, team_games=team_games, player_id_games=player_id_games, coordinate_shots=coordinate_shots, grouped_data=grouped_data)
+    use_shots_on_ice = shot_table is not None and shots_on_ice is not None
     sadd = {}
     progress = 0
     gtlength = len(games_trimmed)
-    length = 80
     print("build_sadd(): Building SADD initial dictionary", end="\r", flush=True)
     for player in player_id_set:
         sadd[player] = {}
@@ -1493,13 +2402,18 @@ def build_sadd(games_trimmed=None, directory='.', game_shifts=None, player_id_se
     print("build_sadd(): Building SADD dictionary for games.", flush=True)
     for gameID, gameDict in games_trimmed.items():
         progress += 1
-        print("[", "="*((progress*length)//gtlength), " "*(length-((progress*length)//gtlength)), "] - Current game:", gameID, end="\r")
+        report_progress("- Current game:", progress, gtlength, gameID)
         for shotID in gameDict.keys():
-            period, time = get_shot_time(gameID, shotID, games_trimmed=games_trimmed)
-            playerList = get_players_on_ice(gameID, period, time, game_shifts=game_shifts)
-            shooter = get_shot_shooter(gameID, shotID, games_trimmed=games_trimmed)
-            shotYear = get_game_year(gameID)
-            defenseSet = get_opposing_players(shooter, playerList, shotYear, player_teams=player_teams, games_trimmed=games_trimmed, player_id_set=player_id_set)
+            if use_shots_on_ice:
+                # The defending players were already joined to the shot by build_shots_on_ice(): everyone on the ice for the other team, see above
+                row = get_shot_row(gameID, shotID, shot_table)
+                defenseSet = set(shots_on_ice['defending_players'][shots_on_ice['defending_offsets'][row]:shots_on_ice['defending_offsets'][row + 1]].tolist())
+            else:
+                period, time = get_shot_time(gameID, shotID, games_trimmed=games_trimmed)
+                playerList = get_players_on_ice(gameID, period, time, game_shifts=game_shifts)
+                shooter = get_shot_shooter(gameID, shotID, games_trimmed=games_trimmed)
+                shotYear = get_game_year(gameID)
+                defenseSet = get_opposing_players(shooter, playerList, shotYear, player_teams=player_teams, games_trimmed=games_trimmed, player_id_set=player_id_set)
             shotPct = get_shot_pct(gameID, shotID, games_trimmed=games_trimmed, player_id_set=player_id_set, player_teams=player_teams, team_set=team_set, team_games=team_games, player_id_games=player_id_games, coordinate_shots=coordinate_shots, grouped_data=grouped_data, player_pcts_and_groups=player_pcts_and_groups)
             shooterPct = get_shooter_pct(gameID, shotID, games_trimmed=games_trimmed, player_id_set=player_id_set, player_teams=player_teams, team_set=team_set, team_games=team_games, player_id_games=player_id_games, coordinate_shots=coordinate_shots, grouped_data=grouped_data, player_pcts_and_groups=player_pcts_and_groups)
             for player in defenseSet:
@@ -1513,6 +2427,884 @@ def build_sadd(games_trimmed=None, directory='.', game_shifts=None, player_id_se
                 sadd[player]['sadd'] = sadd[player]['pct_diff_total']/sadd[player]['sadd_events']
     return sadd
 
+@instrumented
+def build_sadd_arrays(shot_table=None, shots_on_ice=None, player_cell_pcts=None):
+    """
+    This function computes SADD for every player at once from the shot table, the on-ice join and the player pct matrices.
+    Every shot's differential (shooterPct - shotPct) is computed as one array, then scattered onto the defending players with np.bincount.
+    The defenders of a shot are every player on the ice for the other team in shots_on_ice, goalies and players who never took a shot included;
+    this is the shots_on_ice rule of build_sadd(), not the get_opposing_players() rule of its game_shifts path (see build_sadd()).
+    A defender on the ice twice for the same shot (overlapping shift records) is counted once, as the defenseSet in build_sadd() does.
+    It returns a dictionary of arrays:
+        players: sorted player IDs, every shooter plus every defender
+        pct_diff_total, sadd_events, sadd: the matching values of the build_sadd() dictionary, one per player
+        shot_pct, shooter_pct, pct_diff: the expected shot percentage, the shooter's overall percentage and their difference for every row of shot_table
+    """
+    print("build_sadd_arrays()")
+    if shot_table is None or shots_on_ice is None or player_cell_pcts is None:
+        print("Please build shot_table, shots_on_ice and player_cell_pcts first.")
+        return None
+    # Look up every shot's expected and shooter percentages
+    shot_pct, shooter_pct = get_shot_pcts(shot_table['shooter'], shot_table['cell'], player_cell_pcts)
+    pct_diff = shooter_pct - shot_pct
+    pair_rows, pair_players = get_defending_pairs(shots_on_ice)
+    # Scatter-add the differentials and the event counts to the defenders
+    players = np.union1d(player_cell_pcts['players'], pair_players)
+    pair_index = np.searchsorted(players, pair_players)
+    sadd_arrays = {}
+    sadd_arrays['players'] = players
+    sadd_arrays['pct_diff_total'] = np.bincount(pair_index, weights=pct_diff[pair_rows], minlength=len(players))
+    sadd_arrays['sadd_events'] = np.bincount(pair_index, minlength=len(players))
+    sadd_arrays['sadd'] = np.divide(sadd_arrays['pct_diff_total'], sadd_arrays['sadd_events'], out=np.zeros(len(players)), where=sadd_arrays['sadd_events'] > 0)
+    sadd_arrays['shot_pct'] = shot_pct
+    sadd_arrays['shooter_pct'] = shooter_pct
+    sadd_arrays['pct_diff'] = pct_diff
+    return sadd_arrays
+
+
+def get_shot_pcts(shooters, cells, player_cell_pcts):
+    """
+    This function looks up the expected shot percentage and the shooter's overall percentage for arrays of shooters and grid cells, returning (shot_pct, shooter_pct).
+    """
+    shooter_index = np.searchsorted(player_cell_pcts['players'], shooters)
+    return (player_cell_pcts['pct'][shooter_index, cells], player_cell_pcts['avg'][shooter_index])
+
+
+def get_defending_pairs(shots_on_ice):
+    """
+    This function expands the defending side of shots_on_ice into (shot row, defender) pairs, dropping repeats, and returns them as two arrays (pair_rows, pair_players).
+    """
+    return get_on_ice_pairs(shots_on_ice['defending_offsets'], shots_on_ice['defending_players'])
+
+
+def get_on_ice_pairs(offsets, players):
+    """
+    This function expands a compressed rows mapping of shots to players into (shot row, player) pairs, dropping repeats, and returns them as two arrays (pair_rows, pair_players) sorted by row.
+    """
+    pair_rows = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+    pairs = np.unique((pair_rows << 32) | np.asarray(players).astype(np.int64))
+    return (pairs >> 32, pairs & 0xFFFFFFFF)
+
+
+def get_sadd_dict(sadd_arrays):
+    """
+    This function converts the arrays from build_sadd_arrays() into the {player: {'pct_diff_total', 'sadd_events', 'sadd'}} dictionary returned by build_sadd().
+    For the arrays of a state from update_sadd_state(), check the state's approximate flag: the values are approximate while it is True.
+    """
+    sadd = {}
+    for player, pct_diff_total, sadd_events, player_sadd in zip(sadd_arrays['players'].tolist(), sadd_arrays['pct_diff_total'].tolist(), sadd_arrays['sadd_events'].tolist(), sadd_arrays['sadd'].tolist()):
+        sadd[player] = {}
+        sadd[player]['pct_diff_total'] = pct_diff_total
+        sadd[player]['sadd_events'] = sadd_events
+        sadd[player]['sadd'] = player_sadd
+    return sadd
+
+
+def reorder_csr(offsets, values, rows):
+    """
+    This function picks the given rows, in the given order, out of a compressed rows mapping such as shots_on_ice['defending_offsets'], shots_on_ice['defending_players'].
+    It returns the (offsets, values) of the new mapping.
+    """
+    counts = np.diff(offsets)[rows]
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(counts, out=new_offsets[1:])
+    index = np.repeat(offsets[:-1][rows] - new_offsets[:-1], counts) + np.arange(new_offsets[-1])
+    return (new_offsets, np.asarray(values)[index])
+
+
+def merge_shot_tables(shot_table, new_shot_table):
+    """
+    This function merges two shot tables with no games in common into one, sorted by game_id and shot_num.
+    It returns (merged_shot_table, order), where row i of the merged table is row order[i] of the two tables' rows concatenated.
+    """
+    primary_columns = ('game_id', 'shot_num', 'period', 'period_seconds', 'x', 'y', 'shooter', 'is_goal')
+    combined = {}
+    for name in primary_columns:
+        combined[name] = np.concatenate([shot_table[name], new_shot_table[name]])
+    triCodes = np.concatenate([shot_table['team_codes'][shot_table['team']], new_shot_table['team_codes'][new_shot_table['team']]]).astype('U3')
+    order = np.lexsort((combined['shot_num'], combined['game_id']))
+    merged_shot_table = {}
+    for name in primary_columns:
+        merged_shot_table[name] = combined[name][order]
+    index_shot_table(merged_shot_table, triCodes[order])
+    return (merged_shot_table, order)
+
+
+def merge_shift_intervals(shift_intervals, new_shift_intervals):
+    """
+    This function merges two sets of shift intervals into one, in the same order build_shift_intervals() would produce.
+    """
+    combined = {}
+    for name in ('key_start', 'key_end', 'game_id', 'period', 'start', 'end', 'player', 'side'):
+        combined[name] = np.concatenate([shift_intervals[name], new_shift_intervals[name]])
+    order = np.lexsort((combined['player'], combined['key_end'], combined['key_start']))
+    merged_shift_intervals = {}
+    for name, column in combined.items():
+        merged_shift_intervals[name] = column[order]
+    index_long_shifts(merged_shift_intervals)
+    return merged_shift_intervals
+
+
+def get_cell_codes(cell_keys):
+    """
+    This function packs (x_group, y_group) cell keys into single integers that sort in the same order as the keys.
+    """
+    cell_keys = np.asarray(cell_keys, dtype=np.int64).reshape(-1, 2)
+    return ((cell_keys[:, 0] + 32768) << 16) | (cell_keys[:, 1] + 32768)
+
+
+@instrumented
+def build_sadd_state(shot_table=None, shift_intervals=None, shots_on_ice=None, home_away_teams=None, player_weight=849):
+    """
+    This function builds the running state that update_sadd_state() keeps up to date as new games arrive.
+    The state is a dictionary holding the shot table, shift intervals, on-ice join and home_away_teams, the player cell counts and pcts,
+    the SADD accumulators (sadd_arrays, as returned by build_sadd_arrays()), player_weight,
+    and prior_shots and prior_goals: the league counts per cell that the pct grids are blended with.
+    It also records prior_league_shots, the league shot total when the prior was last set, prior_drift, how far the league total has moved from it since (0.0 here),
+    and approximate, which is True once update_sadd_state() has added shots without refreshing the prior, so the SADD values differ slightly from a full rebuild.
+
+    Example usage:
+    sadd_state = build_sadd_state(shot_table, shift_intervals, shots_on_ice, home_away_teams)
+    sadd_state = update_sadd_state(sadd_state, ['./games/game_2022020500.json'], ['./shifts/game_2022020500.json'])
+    sadd = get_sadd_dict(sadd_state['sadd_arrays'])
+    """
+    print("build_sadd_state()")
+    if shot_table is None or shift_intervals is None or shots_on_ice is None or home_away_teams is None:
+        print("Please build shot_table, shift_intervals, shots_on_ice and home_away_teams first, for example with the build_cached_artifacts() function.")
+        return None
+    player_cell_counts = build_player_cell_counts(shot_table)
+    player_cell_pcts = build_player_cell_pcts(player_cell_counts, player_weight=player_weight)
+    sadd_state = {}
+    sadd_state['shot_table'] = shot_table
+    sadd_state['shift_intervals'] = shift_intervals
+    sadd_state['shots_on_ice'] = shots_on_ice
+    sadd_state['home_away_teams'] = home_away_teams
+    sadd_state['player_cell_counts'] = player_cell_counts
+    sadd_state['prior_shots'] = player_cell_counts['league_shots'].copy()
+    sadd_state['prior_goals'] = player_cell_counts['league_goals'].copy()
+    sadd_state['prior_league_shots'] = int(sadd_state['prior_shots'].sum())
+    sadd_state['prior_drift'] = 0.0
+    sadd_state['approximate'] = False
+    sadd_state['player_cell_pcts'] = player_cell_pcts
+    sadd_state['sadd_arrays'] = build_sadd_arrays(shot_table, shots_on_ice, player_cell_pcts)
+    sadd_state['player_weight'] = player_weight
+    return sadd_state
+
+
+@instrumented
+def update_sadd_state(sadd_state, game_files, shift_files, workers=None, refresh_prior=False, max_prior_drift=0.05):
+    """
+    This function adds a batch of new game and shift files to a state from build_sadd_state() and returns the updated state.
+    Only the new files are parsed and joined. The per-player per-cell counts are updated with the new shots,
+    the pct grids are recomputed only for the players who took those shots, and only the shots of those players are re-scored:
+    the change in each re-scored shot's differential is added to its defenders' pct_diff_total, and each new shot adds one to its defenders' sadd_events.
+    The league prior (prior_shots, prior_goals) is held fixed so that the other players' grids stay valid; one night of games moves it by a negligible amount,
+    but the result is then approximate: the state's approximate flag is set, and prior_drift records how far the league shot total has moved since the prior was set.
+    With refresh_prior=True the prior is reset to the current league counts and every shot is re-scored, which gives the same result as a full rebuild.
+    This happens automatically once prior_drift would pass max_prior_drift, or when new shots land in cells the prior has no shots in, so nightly updates cannot drift unnoticed.
+    Games that are already in the state are skipped; to replace a game, rebuild the state.
+    """
+    print("update_sadd_state()", flush=True)
+    player_weight = sadd_state['player_weight']
+    home_away_teams = dict(sadd_state['home_away_teams'])
+    # Parse only the new game files
+    shot_rows = []
+    new_games = set()
+    for game in map_game_files(ingest_game_file, list(game_files), [False] * len(game_files), workers=workers):
+        if game['game_id'] == None:
+            continue
+        if game['game_id'] in home_away_teams:
+            print("\nupdate_sadd_state(): Skipping game", game['game_id'], "which is already in the state.")
+            continue
+        home_away_teams[game['game_id']] = game['teams']
+        shot_rows.extend(game['shot_rows'])
+        new_games.add(game['game_id'])
+    print()
+    # Parse the shift files of the new games
+    shift_paths = []
+    shift_teams = []
+    for file_path in shift_files:
+        gameID = int(os.path.basename(file_path).split('_')[1].split('.')[0])
+        if gameID in new_games:
+            shift_paths.append(file_path)
+            shift_teams.append(home_away_teams[gameID])
+    shift_rows = []
+    for gameID, game_dict in map_game_files(parse_shift_file, shift_paths, shift_teams, workers=workers):
+        shift_rows.extend(get_game_shift_rows(gameID, game_dict))
+    print()
+    # Join the new shots with the new shifts, then merge everything into the existing arrays
+    new_shot_table = build_shot_table(shot_rows=shot_rows)
+    new_shift_intervals = build_shift_intervals(shift_rows=shift_rows)
+    new_shots_on_ice = build_shots_on_ice(new_shot_table, new_shift_intervals, home_away_teams)
+    old_shot_table = sadd_state['shot_table']
+    n_old = len(old_shot_table['game_id'])
+    shot_table, order = merge_shot_tables(old_shot_table, new_shot_table)
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+    old_rows = position[:n_old]
+    new_rows = position[n_old:]
+    shots_on_ice = {}
+    for side in ('shooting', 'defending'):
+        old_offsets = sadd_state['shots_on_ice'][side + '_offsets']
+        offsets = np.concatenate([old_offsets[:-1], new_shots_on_ice[side + '_offsets'] + old_offsets[-1]])
+        players = np.concatenate([sadd_state['shots_on_ice'][side + '_players'], new_shots_on_ice[side + '_players']])
+        shots_on_ice[side + '_offsets'], shots_on_ice[side + '_players'] = reorder_csr(offsets, players, order)
+    shift_intervals = merge_shift_intervals(sadd_state['shift_intervals'], new_shift_intervals)
+
+    # Lay the old count matrices out over the new players and cells, then add the new shots
+    old_counts = sadd_state['player_cell_counts']
+    players = np.union1d(old_counts['players'], new_shot_table['shooter'])
+    cell_keys = shot_table['cell_keys']
+    player_map = np.searchsorted(players, old_counts['players'])
+    cell_map = np.searchsorted(get_cell_codes(cell_keys), get_cell_codes(old_counts['cell_keys']))
+    player_cell_counts = {'players': players, 'cell_keys': cell_keys}
+    for name in ('shots', 'goals'):
+        player_cell_counts[name] = np.zeros((len(players), len(cell_keys)), dtype=np.int64)
+        player_cell_counts[name][np.ix_(player_map, cell_map)] = old_counts[name]
+    for name in ('league_shots', 'league_goals', 'prior_shots', 'prior_goals'):
+        remapped = np.zeros(len(cell_keys), dtype=np.int64)
+        if name in old_counts:
+            remapped[cell_map] = old_counts[name]
+        else:
+            remapped[cell_map] = sadd_state[name]
+        player_cell_counts[name] = remapped
+    new_players = np.searchsorted(players, new_shot_table['shooter'])
+    new_cells = shot_table['cell'][new_rows]
+    np.add.at(player_cell_counts['shots'], (new_players, new_cells), 1)
+    np.add.at(player_cell_counts['goals'], (new_players, new_cells), new_shot_table['is_goal'].astype(np.int64))
+    np.add.at(player_cell_counts['league_shots'], new_cells, 1)
+    np.add.at(player_cell_counts['league_goals'], new_cells, new_shot_table['is_goal'].astype(np.int64))
+    prior_shots = player_cell_counts.pop('prior_shots')
+    prior_goals = player_cell_counts.pop('prior_goals')
+    # Refresh the prior once the league counts have moved too far from it
+    prior_league_shots = sadd_state.get('prior_league_shots', int(prior_shots.sum()))
+    prior_drift = (int(player_cell_counts['league_shots'].sum()) - prior_league_shots) / max(prior_league_shots, 1)
+    unseen_cells = np.any((player_cell_counts['league_shots'] > 0) & (prior_shots == 0))
+    if not refresh_prior and (prior_drift > max_prior_drift or unseen_cells):
+        if unseen_cells:
+            print("update_sadd_state(): New shots landed in cells the prior has no shots in; refreshing the prior and re-scoring every shot.")
+        else:
+            print("update_sadd_state(): The league shot total has moved %.1f%% since the prior was set; refreshing the prior and re-scoring every shot." % (prior_drift * 100))
+        refresh_prior = True
+    if refresh_prior:
+        prior_league_shots = int(player_cell_counts['league_shots'].sum())
+        prior_drift = 0.0
+        prior_shots = player_cell_counts['league_shots'].copy()
+        prior_goals = player_cell_counts['league_goals'].copy()
+
+    # Recompute the pct grids of the players whose counts changed
+    old_pcts = sadd_state['player_cell_pcts']
+    player_cell_pcts = {'players': players, 'cell_keys': cell_keys}
+    if refresh_prior:
+        affected_players = np.arange(len(players))
+        player_cell_pcts['pct'], player_cell_pcts['avg'] = get_weighted_pcts(player_cell_counts['shots'], player_cell_counts['goals'], prior_shots, prior_goals, player_weight)
+    else:
+        affected_players = np.unique(new_players)
+        player_cell_pcts['pct'] = np.zeros((len(players), len(cell_keys)))
+        player_cell_pcts['pct'][np.ix_(player_map, cell_map)] = old_pcts['pct']
+        player_cell_pcts['avg'] = np.zeros(len(players))
+        player_cell_pcts['avg'][player_map] = old_pcts['avg']
+        player_cell_pcts['pct'][affected_players], player_cell_pcts['avg'][affected_players] = get_weighted_pcts(player_cell_counts['shots'][affected_players], player_cell_counts['goals'][affected_players], prior_shots, prior_goals, player_weight)
+
+    # Re-score the shots of the affected players, which include every new shot
+    old_sadd = sadd_state['sadd_arrays']
+    shot_pct = np.zeros(len(order))
+    shooter_pct = np.zeros(len(order))
+    pct_diff = np.zeros(len(order))
+    shot_pct[old_rows] = old_sadd['shot_pct']
+    shooter_pct[old_rows] = old_sadd['shooter_pct']
+    pct_diff[old_rows] = old_sadd['pct_diff']
+    is_new_row = np.zeros(len(order), dtype=bool)
+    is_new_row[new_rows] = True
+    rescore_rows = np.flatnonzero(np.isin(shot_table['shooter'], players[affected_players]))
+    rescored_shot_pct, rescored_shooter_pct = get_shot_pcts(shot_table['shooter'][rescore_rows], shot_table['cell'][rescore_rows], player_cell_pcts)
+    pct_diff_change = (rescored_shooter_pct - rescored_shot_pct) - pct_diff[rescore_rows]
+    shot_pct[rescore_rows] = rescored_shot_pct
+    shooter_pct[rescore_rows] = rescored_shooter_pct
+    pct_diff[rescore_rows] = rescored_shooter_pct - rescored_shot_pct
+    # Apply the changes to the defenders of the re-scored shots only
+    rescore_offsets, rescore_players = reorder_csr(shots_on_ice['defending_offsets'], shots_on_ice['defending_players'], rescore_rows)
+    pair_positions, pair_players = get_defending_pairs({'defending_offsets': rescore_offsets, 'defending_players': rescore_players})
+    sadd_players = np.union1d(np.union1d(old_sadd['players'], players), pair_players)
+    sadd_map = np.searchsorted(sadd_players, old_sadd['players'])
+    pair_index = np.searchsorted(sadd_players, pair_players)
+    sadd_arrays = {'players': sadd_players}
+    sadd_arrays['pct_diff_total'] = np.zeros(len(sadd_players))
+    sadd_arrays['pct_diff_total'][sadd_map] = old_sadd['pct_diff_total']
+    sadd_arrays['pct_diff_total'] += np.bincount(pair_index, weights=pct_diff_change[pair_positions], minlength=len(sadd_players))
+    sadd_arrays['sadd_events'] = np.zeros(len(sadd_players), dtype=np.int64)
+    sadd_arrays['sadd_events'][sadd_map] = old_sadd['sadd_events']
+    sadd_arrays['sadd_events'] += np.bincount(pair_index[is_new_row[rescore_rows][pair_positions]], minlength=len(sadd_players))
+    sadd_arrays['sadd'] = np.divide(sadd_arrays['pct_diff_total'], sadd_arrays['sadd_events'], out=np.zeros(len(sadd_players)), where=sadd_arrays['sadd_events'] > 0)
+    sadd_arrays['shot_pct'] = shot_pct
+    sadd_arrays['shooter_pct'] = shooter_pct
+    sadd_arrays['pct_diff'] = pct_diff
+
+    updated_state = dict(sadd_state)
+    updated_state['shot_table'] = shot_table
+    updated_state['shift_intervals'] = shift_intervals
+    updated_state['shots_on_ice'] = shots_on_ice
+    updated_state['home_away_teams'] = home_away_teams
+    updated_state['player_cell_counts'] = player_cell_counts
+    updated_state['prior_shots'] = prior_shots
+    updated_state['prior_goals'] = prior_goals
+    updated_state['prior_league_shots'] = prior_league_shots
+    updated_state['prior_drift'] = prior_drift
+    updated_state['approximate'] = prior_drift > 0
+    updated_state['player_cell_pcts'] = player_cell_pcts
+    updated_state['sadd_arrays'] = sadd_arrays
+    return updated_state
+
+
+@instrumented
+def build_sadd_ledger(shot_table=None, shots_on_ice=None, player_cell_pcts=None, home_away_teams=None, sadd_arrays=None):
+    """
+    This function builds the SADD ledger: one entry per shot with everything SADD is summed from, so new SADD variants are just group-bys over it.
+    If sadd_arrays from build_sadd_arrays() is passed, its per-shot percentages are reused instead of being looked up again.
+    The ledger is a dictionary of arrays aligned with the rows of shot_table:
+        row (int64): the shot's row in shot_table
+        game_id, shot_num, shooter, is_goal: copied from shot_table
+        season (int16): the year from get_game_year()
+        shooting_team, defending_team (int16): index into team_codes of each team, or -1 if the game is missing from home_away_teams
+        shot_pct, shooter_pct, pct_diff: the expected shot percentage, the shooter's overall percentage and pct_diff = shooter_pct - shot_pct
+        defending_offsets, defending_players: the defending players on the ice, without repeats, in compressed rows form as in shots_on_ice
+        attacking_offsets, attacking_players: the same for the shooting team
+    and team_codes, the sorted triCodes.
+
+    Example usage:
+    sadd_ledger = build_sadd_ledger(shot_table, shots_on_ice, player_cell_pcts, home_away_teams)
+    defensive_sadd = get_sadd_dict(aggregate_sadd_ledger(sadd_ledger, 'defensive'))
+    """
+    print("build_sadd_ledger()")
+    if shot_table is None or shots_on_ice is None or player_cell_pcts is None or home_away_teams is None:
+        print("Please build shot_table, shots_on_ice, player_cell_pcts and home_away_teams first.")
+        return None
+    n_shots = len(shot_table['game_id'])
+    sadd_ledger = {}
+    sadd_ledger['row'] = np.arange(n_shots, dtype=np.int64)
+    sadd_ledger['game_id'] = np.asarray(shot_table['game_id'])
+    sadd_ledger['shot_num'] = np.asarray(shot_table['shot_num'])
+    sadd_ledger['season'] = get_game_year(sadd_ledger['game_id']).astype(np.int16)
+    sadd_ledger['shooter'] = np.asarray(shot_table['shooter'])
+    sadd_ledger['is_goal'] = np.asarray(shot_table['is_goal'])
+    if sadd_arrays is not None:
+        sadd_ledger['shot_pct'] = np.asarray(sadd_arrays['shot_pct'])
+        sadd_ledger['shooter_pct'] = np.asarray(sadd_arrays['shooter_pct'])
+    else:
+        sadd_ledger['shot_pct'], sadd_ledger['shooter_pct'] = get_shot_pcts(shot_table['shooter'], shot_table['cell'], player_cell_pcts)
+    sadd_ledger['pct_diff'] = sadd_ledger['shooter_pct'] - sadd_ledger['shot_pct']
+    # Find the defending team of each shot from the game's home and away teams
+    game_ids = shot_table['game_ids'].tolist()
+    game_teams = [home_away_teams.get(gameID, ('', '')) for gameID in game_ids]
+    team_codes = np.unique(np.concatenate([shot_table['team_codes'], np.array([triCode for teams in game_teams for triCode in teams if triCode != ''], dtype='U3')])).astype('U3')
+    home_codes = np.array([np.searchsorted(team_codes, home) if home != '' else -1 for home, away in game_teams], dtype=np.int64)
+    away_codes = np.array([np.searchsorted(team_codes, away) if away != '' else -1 for home, away in game_teams], dtype=np.int64)
+    game_index = np.searchsorted(shot_table['game_ids'], shot_table['game_id'])
+    shooting_team = np.searchsorted(team_codes, shot_table['team_codes'])[shot_table['team']].astype(np.int64)
+    defending_team = np.where(shooting_team == home_codes[game_index], away_codes[game_index], home_codes[game_index])
+    known_game = home_codes[game_index] >= 0
+    sadd_ledger['shooting_team'] = shooting_team.astype(np.int16)
+    sadd_ledger['defending_team'] = np.where(known_game, defending_team, -1).astype(np.int16)
+    sadd_ledger['team_codes'] = team_codes
+    # Store the players on the ice once per shot, dropping overlapping shift records
+    for on_ice_side, ledger_side in (('defending', 'defending'), ('shooting', 'attacking')):
+        pair_rows, pair_players = get_on_ice_pairs(shots_on_ice[on_ice_side + '_offsets'], shots_on_ice[on_ice_side + '_players'])
+        offsets = np.zeros(n_shots + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_rows, minlength=n_shots), out=offsets[1:])
+        sadd_ledger[ledger_side + '_offsets'] = offsets
+        sadd_ledger[ledger_side + '_players'] = pair_players.astype(np.int32)
+    return sadd_ledger
+
+
+def aggregate_sadd_ledger(sadd_ledger, side='defensive', group_by='player', by_season=False, rows=None):
+    """
+    This function sums the SADD ledger from build_sadd_ledger() into one SADD value per group.
+    side chooses which shots count for a player or team, and with which sign:
+        'defensive': the shots taken against them, scored shooterPct - shotPct, the same as build_sadd()
+        'offensive': the shots taken by their side while they were on the ice, scored shotPct - shooterPct, so better chances than the shooter usually gets count positive
+        'overall': both together
+    group_by is 'player' (each on-ice player is credited) or 'team' (each shot counts once for the team).
+    With by_season=True every group is split by season. rows is an optional boolean mask or array of ledger rows to include.
+    It returns a dictionary of arrays with players (player IDs) or teams (triCodes), seasons if by_season is set, and pct_diff_total, sadd_events and sadd.
+    The player results can be passed to get_sadd_dict().
+    """
+    if side not in ('defensive', 'offensive', 'overall') or group_by not in ('player', 'team'):
+        print("Please pass side as 'defensive', 'offensive' or 'overall', and group_by as 'player' or 'team'.")
+        return None
+    event_rows, event_keys, event_values = get_sadd_ledger_events(sadd_ledger, side, group_by, rows)
+    if by_season:
+        event_keys = (np.asarray(sadd_ledger['season'])[event_rows].astype(np.int64) << 32) | event_keys
+    # Group the events and reduce each group with np.bincount
+    group_keys, group_index = np.unique(event_keys, return_inverse=True)
+    group_index = group_index.reshape(-1)
+    sadd_totals = {}
+    if group_by == 'player':
+        sadd_totals['players'] = group_keys & 0xFFFFFFFF
+    else:
+        sadd_totals['teams'] = sadd_ledger['team_codes'][group_keys & 0xFFFFFFFF]
+    if by_season:
+        sadd_totals['seasons'] = group_keys >> 32
+    sadd_totals['pct_diff_total'] = np.bincount(group_index, weights=event_values, minlength=len(group_keys))
+    sadd_totals['sadd_events'] = np.bincount(group_index, minlength=len(group_keys))
+    sadd_totals['sadd'] = np.divide(sadd_totals['pct_diff_total'], sadd_totals['sadd_events'], out=np.zeros(len(group_keys)), where=sadd_totals['sadd_events'] > 0)
+    return sadd_totals
+
+
+def get_sadd_ledger_events(sadd_ledger, side='defensive', group_by='player', rows=None):
+    """
+    This function expands the SADD ledger into one event per (shot, credited player or team), as described in aggregate_sadd_ledger().
+    It returns (event_rows, event_keys, event_values): the ledger row of each event, the player ID or team_codes index credited, and the signed differential.
+    """
+    n_shots = len(sadd_ledger['row'])
+    ledger_sides = []
+    if side in ('defensive', 'overall'):
+        ledger_sides.append(('defending', 1.0))
+    if side in ('offensive', 'overall'):
+        ledger_sides.append(('attacking', -1.0))
+    # Expand the chosen sides into one event per (shot, group) with its signed differential
+    event_rows = []
+    event_keys = []
+    event_values = []
+    for ledger_side, sign in ledger_sides:
+        if group_by == 'player':
+            offsets = sadd_ledger[ledger_side + '_offsets']
+            side_rows = np.repeat(np.arange(n_shots, dtype=np.int64), np.diff(offsets))
+            side_keys = np.asarray(sadd_ledger[ledger_side + '_players']).astype(np.int64)
+        else:
+            side_rows = np.arange(n_shots, dtype=np.int64)
+            side_keys = np.asarray(sadd_ledger['defending_team' if ledger_side == 'defending' else 'shooting_team']).astype(np.int64)
+            side_rows = side_rows[side_keys >= 0]
+            side_keys = side_keys[side_keys >= 0]
+        event_rows.append(side_rows)
+        event_keys.append(side_keys)
+        event_values.append(sign * sadd_ledger['pct_diff'][side_rows])
+    event_rows = np.concatenate(event_rows)
+    event_keys = np.concatenate(event_keys)
+    event_values = np.concatenate(event_values)
+    if rows is not None:
+        included = np.zeros(n_shots, dtype=bool)
+        included[rows] = True
+        keep = included[event_rows]
+        event_rows = event_rows[keep]
+        event_keys = event_keys[keep]
+        event_values = event_values[keep]
+    return (event_rows, event_keys, event_values)
+
+
+@instrumented
+def rolling_sadd(sadd_ledger, game_index=None, window_games=None, window_days=None, side='defensive', group_by='player', rows=None):
+    """
+    This function computes SADD over a sliding window of games for every player (or team), giving a SADD time series in one sweep over the ledger.
+    The ledger's events are first summed per (player, game), using the shot table's grouping of shots by game, and each player's games are put in date order.
+    The windows are then running sums: each game entering a player's window adds its pct_diff_total and sadd_events, and the game leaving it subtracts them,
+    which is done for every player at once as a difference of cumulative sums.
+        window_games: the window is the player's last window_games games, counting the current one
+        window_days: the window is the player's games in the window_days days up to and including the current game's date (needs game_index with dates)
+        With both, a game must fall in both windows; with neither, the window is everything to date.
+    Games are ordered by their date in game_index, or by game ID if game_index is None. side, group_by and rows are as in aggregate_sadd_ledger().
+    It returns a dictionary of arrays with one entry per (player, game) in which the player was credited with at least one event, sorted by player then game order:
+        players (or teams), game_id, and date if game_index is given
+        game_pct_diff_total, game_sadd_events: the game's own contribution
+        pct_diff_total, sadd_events, sadd: the window's totals and SADD as of the end of that game
+    Use get_rolling_sadd_rows() to pick out one player's series.
+
+    Example usage:
+    form = rolling_sadd(sadd_ledger, game_index, window_games=10)
+    form_rows = get_rolling_sadd_rows(form, 8471698)
+    """
+    print("rolling_sadd()")
+    if side not in ('defensive', 'offensive', 'overall') or group_by not in ('player', 'team'):
+        print("Please pass side as 'defensive', 'offensive' or 'overall', and group_by as 'player' or 'team'.")
+        return None
+    if window_days is not None and game_index is None:
+        print("Please build game_index with the build_game_index() function to use window_days.")
+        return None
+    event_rows, event_keys, event_values = get_sadd_ledger_events(sadd_ledger, side, group_by, rows)
+    # Rank the games in the order the windows slide through them
+    if game_index is not None:
+        game_ids = game_index['game_id']
+        game_order = np.lexsort((game_ids, game_index['date'].astype(np.int64)))
+    else:
+        game_ids = np.unique(sadd_ledger['game_id'])
+        game_order = np.arange(len(game_ids))
+    game_rank = np.empty(len(game_ids), dtype=np.int64)
+    game_rank[game_order] = np.arange(len(game_ids))
+    event_games = np.searchsorted(game_ids, np.asarray(sadd_ledger['game_id'])[event_rows])
+    # Sum the events of each (player, game), sorted by player and then game rank
+    entry_keys, entry_index = np.unique((event_keys << 32) | game_rank[event_games], return_inverse=True)
+    entry_index = entry_index.reshape(-1)
+    entry_groups = entry_keys >> 32
+    entry_games = game_order[entry_keys & 0xFFFFFFFF]
+    game_pct_diff_total = np.bincount(entry_index, weights=event_values, minlength=len(entry_keys))
+    game_sadd_events = np.bincount(entry_index, minlength=len(entry_keys))
+    cumulative_pct_diff = np.concatenate([[0.0], np.cumsum(game_pct_diff_total)])
+    cumulative_events = np.concatenate([[0], np.cumsum(game_sadd_events)])
+    # Find the first entry of each window; a window never reaches back past the start of its player's entries
+    entry_positions = np.arange(len(entry_keys), dtype=np.int64)
+    window_start = np.searchsorted(entry_groups, entry_groups, side='left')
+    if window_games is not None:
+        window_start = np.maximum(window_start, entry_positions - window_games + 1)
+    if window_days is not None:
+        if np.any(np.isnat(game_index['date'][entry_games])):
+            print("rolling_sadd(): window_days needs a date for every game; rebuild game_index from base_dicts['game_info'].")
+            return None
+        entry_days = game_index['date'][entry_games].astype(np.int64)
+        # Player and day make one sorted key, since each player's entries are in date order
+        day_keys = (entry_groups << 32) | (entry_days - entry_days.min())
+        window_start = np.maximum(window_start, np.searchsorted(day_keys, day_keys - window_days + 1, side='left'))
+    rolling = {}
+    if group_by == 'player':
+        rolling['players'] = entry_groups
+    else:
+        rolling['teams'] = sadd_ledger['team_codes'][entry_groups]
+    rolling['game_id'] = game_ids[entry_games]
+    if game_index is not None:
+        rolling['date'] = game_index['date'][entry_games]
+    rolling['game_pct_diff_total'] = game_pct_diff_total
+    rolling['game_sadd_events'] = game_sadd_events
+    rolling['pct_diff_total'] = cumulative_pct_diff[entry_positions + 1] - cumulative_pct_diff[window_start]
+    rolling['sadd_events'] = cumulative_events[entry_positions + 1] - cumulative_events[window_start]
+    rolling['sadd'] = np.divide(rolling['pct_diff_total'], rolling['sadd_events'], out=np.zeros(len(entry_keys)), where=rolling['sadd_events'] > 0)
+    return rolling
+
+
+def get_rolling_sadd_rows(rolling, key):
+    """
+    This function returns the slice of the rolling_sadd() arrays that belongs to one player ID (or triCode, for team results).
+    """
+    if 'players' in rolling:
+        groups = rolling['players']
+    else:
+        groups = rolling['teams']
+    return slice(int(np.searchsorted(groups, key, side='left')), int(np.searchsorted(groups, key, side='right')))
+
+
+def get_sadd_totals_dict(sadd_totals):
+    """
+    This function converts the arrays from aggregate_sadd_ledger() into a dictionary keyed by player ID or triCode, like build_sadd() returns.
+    Results split by season are keyed by player or team, then by season: {player: {season: {'pct_diff_total', 'sadd_events', 'sadd'}}}.
+    """
+    if 'players' in sadd_totals:
+        group_keys = sadd_totals['players'].tolist()
+    else:
+        group_keys = sadd_totals['teams'].tolist()
+    if 'seasons' in sadd_totals:
+        seasons = sadd_totals['seasons'].tolist()
+    else:
+        seasons = [None] * len(group_keys)
+    sadd = {}
+    for group_key, season, pct_diff_total, sadd_events, group_sadd in zip(group_keys, seasons, sadd_totals['pct_diff_total'].tolist(), sadd_totals['sadd_events'].tolist(), sadd_totals['sadd'].tolist()):
+        values = {'pct_diff_total': pct_diff_total, 'sadd_events': sadd_events, 'sadd': group_sadd}
+        if season is None:
+            sadd[group_key] = values
+        else:
+            sadd.setdefault(group_key, {})[season] = values
+    return sadd
+
+
+@instrumented
+def build_game_index(shot_table=None, game_info=None, shift_intervals=None):
+    """
+    This function builds the game index: one entry per game, sorted by game ID, recording where each game's rows are in the shot table and shift intervals.
+    It is what select_games() and slice_artifacts() use to restrict any computation to a set of seasons or a date window without re-reading the game files.
+    It returns a dictionary of arrays:
+        game_id (int64), season (int16), game_type ('R', 'P', 'PR', ...), date (datetime64[D], NaT if unknown)
+        shot_start, shot_end (int64): the game's shots are shot_table rows shot_start:shot_end
+        shift_start, shift_end (int64): the game's shifts are shift_intervals rows shift_start:shift_end (zero if shift_intervals is not given)
+    game_info is the dictionary from build_base_dicts(); games missing from it get their season and game type from the game ID and no date.
+    """
+    print("build_game_index()")
+    if shot_table is None:
+        print("Please build shot_table with the build_shot_table() function.")
+        return None
+    if game_info is None:
+        game_info = {}
+    game_ids = np.union1d(shot_table['game_ids'], np.array(sorted(game_info), dtype=np.int64)).astype(np.int64)
+    game_index = {'game_id': game_ids}
+    game_index['season'] = get_game_year(game_ids).astype(np.int16)
+    game_index['game_type'] = np.array([game_info.get(gameID, {}).get('game_type', '') or get_game_type(gameID) for gameID in game_ids.tolist()], dtype='U2')
+    game_index['date'] = np.array([game_info.get(gameID, {}).get('date', '') or 'NaT' for gameID in game_ids.tolist()], dtype='datetime64[D]')
+    # The shot table is sorted by game, so each game's rows are one contiguous range
+    game_index['shot_start'] = np.searchsorted(shot_table['game_id'], game_ids, side='left').astype(np.int64)
+    game_index['shot_end'] = np.searchsorted(shot_table['game_id'], game_ids, side='right').astype(np.int64)
+    # The shift intervals are sorted by key_start, which starts with the game ID
+    if shift_intervals is not None:
+        game_index['shift_start'] = np.searchsorted(shift_intervals['key_start'], shift_key(game_ids, 0, 0), side='left').astype(np.int64)
+        game_index['shift_end'] = np.searchsorted(shift_intervals['key_start'], shift_key(game_ids + 1, 0, 0), side='left').astype(np.int64)
+    else:
+        game_index['shift_start'] = np.zeros(len(game_ids), dtype=np.int64)
+        game_index['shift_end'] = np.zeros(len(game_ids), dtype=np.int64)
+    return game_index
+
+
+def select_games(game_index, seasons=None, game_types=None, start_date=None, end_date=None, last_days=None):
+    """
+    This function returns the sorted array of game IDs in the game index that match every given filter:
+        seasons: a season or list of seasons, as returned by get_game_year()
+        game_types: a game type or list of game types, such as 'R' or ['R', 'P']
+        start_date, end_date: 'YYYY-MM-DD' strings, both inclusive
+        last_days: only the games in the last last_days days up to the latest game that passes the other filters (or up to end_date, if given)
+    Games with no date never match a date filter.
+
+    Example usage:
+    playoff_games = select_games(game_index, seasons=[2021, 2022], game_types='P')
+    """
+    keep = np.ones(len(game_index['game_id']), dtype=bool)
+    if seasons is not None:
+        keep &= np.isin(game_index['season'], np.atleast_1d(seasons))
+    if game_types is not None:
+        keep &= np.isin(game_index['game_type'], np.atleast_1d(game_types))
+    dates = game_index['date']
+    if start_date is not None:
+        keep &= dates >= np.datetime64(start_date, 'D')
+    if end_date is not None:
+        keep &= dates <= np.datetime64(end_date, 'D')
+    if last_days is not None:
+        if end_date is not None:
+            last_date = np.datetime64(end_date, 'D')
+        else:
+            dated = keep & ~np.isnat(dates)
+            last_date = dates[dated].max() if np.any(dated) else np.datetime64('NaT', 'D')
+        keep &= dates > last_date - np.timedelta64(last_days, 'D')
+    return game_index['game_id'][keep]
+
+
+def get_game_index_rows(game_index, gameIDs, kind='shot'):
+    """
+    This function returns the rows of the shot table (kind='shot') or shift intervals (kind='shift') that belong to the given games, in ascending order.
+    """
+    # Find each game in the index, skipping games it does not have
+    gameIDs = np.unique(np.asarray(gameIDs, dtype=np.int64))
+    positions = np.searchsorted(game_index['game_id'], gameIDs)
+    found = positions < len(game_index['game_id'])
+    positions = positions[found]
+    positions = positions[game_index['game_id'][positions] == gameIDs[found]]
+    starts = game_index[kind + '_start'][positions]
+    ends = game_index[kind + '_end'][positions]
+    # Expand each [start, end) range into its rows
+    lengths = ends - starts
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1], dtype=np.int64)
+
+
+def slice_shot_table(shot_table, rows):
+    """
+    This function returns a shot table holding only the given rows of shot_table, which must be in ascending order, such as the rows from get_game_index_rows().
+    team_codes and cell_keys are kept whole, so the team and cell columns keep their meaning and player_cell_counts built from the slice line up with the full ones.
+    """
+    sliced_shot_table = {}
+    for name in ('game_id', 'shot_num', 'period', 'period_seconds', 'x', 'y', 'shooter', 'team', 'is_goal', 'cell_x', 'cell_y', 'cell'):
+        sliced_shot_table[name] = np.asarray(shot_table[name])[rows]
+    sliced_shot_table['team_codes'] = shot_table['team_codes']
+    sliced_shot_table['cell_keys'] = shot_table['cell_keys']
+    game_ids, game_starts = np.unique(sliced_shot_table['game_id'], return_index=True)
+    sliced_shot_table['game_ids'] = game_ids
+    sliced_shot_table['game_offsets'] = np.append(game_starts, len(sliced_shot_table['game_id'])).astype(np.int64)
+    return sliced_shot_table
+
+
+def slice_shift_intervals(shift_intervals, rows):
+    """
+    This function returns shift intervals holding only the given rows of shift_intervals, which must be in ascending order, such as the rows from get_game_index_rows(..., kind='shift').
+    """
+    sliced_shift_intervals = {}
+    for name in ('key_start', 'key_end', 'game_id', 'period', 'start', 'end', 'player', 'side'):
+        sliced_shift_intervals[name] = np.asarray(shift_intervals[name])[rows]
+    index_long_shifts(sliced_shift_intervals)
+    return sliced_shift_intervals
+
+
+def slice_on_ice_rows(columns, rows, row_names, csr_names):
+    """
+    This function returns the given rows of a dictionary of per-shot columns, such as shots_on_ice or the SADD ledger.
+    row_names are the plain per-shot columns and csr_names the compressed rows mappings (name_offsets, name_players) to slice. Anything else is copied as is.
+    """
+    sliced_columns = {}
+    for name, column in columns.items():
+        if name in row_names:
+            sliced_columns[name] = np.asarray(column)[rows]
+        elif name.endswith('_offsets') and name[:-len('_offsets')] in csr_names:
+            continue
+        elif name.endswith('_players') and name[:-len('_players')] in csr_names:
+            continue
+        else:
+            sliced_columns[name] = column
+    for name in csr_names:
+        sliced_columns[name + '_offsets'], sliced_columns[name + '_players'] = reorder_csr(columns[name + '_offsets'], columns[name + '_players'], rows)
+    return sliced_columns
+
+
+def slice_artifacts(game_index, gameIDs, shot_table=None, shift_intervals=None, shots_on_ice=None, sadd_ledger=None):
+    """
+    This function restricts the shot table, shift intervals, on-ice join and SADD ledger to a set of games, usually from select_games().
+    Each artifact passed is sliced by its row ranges in the game index, and any that is None stays None.
+    The slices are the same dictionaries of arrays as the full artifacts, so the pct grids, SADD and on-ice queries can be computed on them directly.
+    The ledger's row column still refers to rows of the full shot table.
+
+    Example usage:
+    game_index = build_game_index(shot_table, base_dicts['game_info'], shift_intervals)
+    scoped = slice_artifacts(game_index, select_games(game_index, seasons=2022), shot_table, shift_intervals, shots_on_ice)
+    player_cell_pcts = build_player_cell_pcts(build_player_cell_counts(scoped['shot_table']))
+    sadd_arrays = build_sadd_arrays(scoped['shot_table'], scoped['shots_on_ice'], player_cell_pcts)
+    """
+    scoped = {'shot_table': None, 'shift_intervals': None, 'shots_on_ice': None, 'sadd_ledger': None}
+    shot_rows = get_game_index_rows(game_index, gameIDs, kind='shot')
+    if shot_table is not None:
+        scoped['shot_table'] = slice_shot_table(shot_table, shot_rows)
+    if shift_intervals is not None:
+        scoped['shift_intervals'] = slice_shift_intervals(shift_intervals, get_game_index_rows(game_index, gameIDs, kind='shift'))
+    if shots_on_ice is not None:
+        scoped['shots_on_ice'] = slice_on_ice_rows(shots_on_ice, shot_rows, (), ('shooting', 'defending'))
+    if sadd_ledger is not None:
+        row_names = ('row', 'game_id', 'shot_num', 'season', 'shooter', 'is_goal', 'shooting_team', 'defending_team', 'shot_pct', 'shooter_pct', 'pct_diff')
+        scoped['sadd_ledger'] = slice_on_ice_rows(sadd_ledger, shot_rows, row_names, ('defending', 'attacking'))
+    return scoped
+
+
+# The read-only arrays each bootstrap worker process resamples, set once per process by init_bootstrap_worker()
+bootstrap_arrays = None
+
+
+def get_bootstrap_arrays(shot_table, shots_on_ice):
+    """
+    This function precomputes the integer arrays that every SADD bootstrap replicate reuses:
+    each shot's shooter and cell, each game's shot count, and the (shot row, defender) pairs of shots_on_ice, all as indexes into dense player and cell numbering.
+    """
+    shooters, shot_players = np.unique(shot_table['shooter'], return_inverse=True)
+    pair_rows, pair_players = get_defending_pairs(shots_on_ice)
+    players = np.union1d(shooters, pair_players)
+    arrays = {}
+    arrays['players'] = players
+    arrays['n_shooters'] = len(shooters)
+    arrays['n_cells'] = len(shot_table['cell_keys'])
+    arrays['flat_index'] = shot_players.reshape(-1).astype(np.int64) * arrays['n_cells'] + shot_table['cell']
+    arrays['shot_players'] = shot_players.reshape(-1).astype(np.int64)
+    arrays['cell'] = np.asarray(shot_table['cell']).astype(np.int64)
+    arrays['is_goal'] = np.asarray(shot_table['is_goal']).astype(np.float64)
+    arrays['game_sizes'] = np.diff(shot_table['game_offsets'])
+    arrays['pair_rows'] = pair_rows
+    arrays['pair_index'] = np.searchsorted(players, pair_players)
+    return arrays
+
+
+def get_bootstrap_sadd(arrays, shot_weights, player_weight=849):
+    """
+    This function computes every player's SADD with each shot counted shot_weights times, as one bootstrap replicate.
+    With shot_weights all ones it gives the same values as build_sadd_arrays(). Players who defended no shots with positive weight get NaN.
+    """
+    n_shooters = arrays['n_shooters']
+    n_cells = arrays['n_cells']
+    # Refit the count matrices and pct grids to the resampled shots
+    shots = np.bincount(arrays['flat_index'], weights=shot_weights, minlength=n_shooters * n_cells).reshape(n_shooters, n_cells)
+    goals = np.bincount(arrays['flat_index'], weights=shot_weights * arrays['is_goal'], minlength=n_shooters * n_cells).reshape(n_shooters, n_cells)
+    pct, avg = get_weighted_pcts(shots, goals, shots.sum(axis=0), goals.sum(axis=0), player_weight)
+    pct_diff = avg[arrays['shot_players']] - pct[arrays['shot_players'], arrays['cell']]
+    # Scatter-add the weighted differentials and events onto the defenders
+    pair_weights = shot_weights[arrays['pair_rows']]
+    pct_diff_total = np.bincount(arrays['pair_index'], weights=pct_diff[arrays['pair_rows']] * pair_weights, minlength=len(arrays['players']))
+    sadd_events = np.bincount(arrays['pair_index'], weights=pair_weights, minlength=len(arrays['players']))
+    return np.divide(pct_diff_total, sadd_events, out=np.full(len(arrays['players']), np.nan), where=sadd_events > 0)
+
+
+def init_bootstrap_worker(arrays):
+    """
+    This function stores the bootstrap arrays in a worker process once, so the replicates sent to it only carry their seeds.
+    """
+    global bootstrap_arrays
+    bootstrap_arrays = arrays
+
+
+def run_bootstrap_batch(seed_sequence, n_replicates, resample='games', player_weight=849):
+    """
+    This function runs n_replicates bootstrap replicates on the arrays set by init_bootstrap_worker(), drawing from its own seed_sequence,
+    and returns their SADD values as an (n_replicates, n_players) float32 array.
+    resample='games' redraws whole games with replacement, which keeps the shots of a game together; resample='shots' redraws individual shots.
+    """
+    arrays = bootstrap_arrays
+    rng = np.random.default_rng(seed_sequence)
+    game_sizes = arrays['game_sizes']
+    n_shots = len(arrays['cell'])
+    replicates = np.empty((n_replicates, len(arrays['players'])), dtype=np.float32)
+    for i in range(n_replicates):
+        if resample == 'games':
+            game_counts = np.bincount(rng.integers(0, len(game_sizes), size=len(game_sizes)), minlength=len(game_sizes))
+            shot_weights = np.repeat(game_counts, game_sizes).astype(np.float64)
+        else:
+            shot_weights = np.bincount(rng.integers(0, n_shots, size=n_shots), minlength=n_shots).astype(np.float64)
+        replicates[i] = get_bootstrap_sadd(arrays, shot_weights, player_weight)
+    return replicates
+
+
+@instrumented
+def bootstrap_sadd(shot_table=None, shots_on_ice=None, n_replicates=1000, resample='games', player_weight=849, percentiles=(2.5, 97.5), workers=None, seed=None, batch_size=25, return_replicates=False):
+    """
+    This function puts bootstrap percentile intervals around every player's SADD.
+    Each replicate resamples the games (or, with resample='shots', the individual shots) with replacement, refits the player pct grids to the resample and recomputes SADD.
+    Resampling is done by weighting each shot by the number of times it was drawn, so no replicate copies any shot data.
+    The replicates are run in batches of batch_size across a pool of workers processes; each process receives the shared read-only arrays once.
+    Every batch has its own seed spawned from seed, so the same seed gives the same intervals whatever the number of workers.
+    It returns a dictionary of arrays, one entry per player who defended at least one shot:
+        players, sadd, sadd_events: the point estimate, as from build_sadd_arrays()
+        lower, upper: the percentiles of the replicate SADD values (2.5 and 97.5 by default), ignoring replicates in which the player defended no shots
+        std: the standard deviation of the replicate SADD values
+        replicates: the (n_replicates, n_players) replicate values, only if return_replicates is True
+
+    Example usage:
+    sadd_intervals = bootstrap_sadd(shot_table, shots_on_ice, n_replicates=1000, workers=8, seed=0)
+    """
+    print("bootstrap_sadd()", flush=True)
+    if shot_table is None or shots_on_ice is None:
+        print("Please build shot_table and shots_on_ice first, for example with the build_cached_artifacts() function.")
+        return None
+    if resample not in ('games', 'shots'):
+        print("Please pass resample as 'games' or 'shots'.")
+        return None
+    arrays = get_bootstrap_arrays(shot_table, shots_on_ice)
+    # The point estimate is the replicate with every shot counted once
+    point_estimate = get_bootstrap_sadd(arrays, np.ones(len(arrays['cell'])), player_weight)
+    sadd_events = np.bincount(arrays['pair_index'], minlength=len(arrays['players']))
+    batch_sizes = [batch_size] * (n_replicates // batch_size)
+    if n_replicates % batch_size > 0:
+        batch_sizes.append(n_replicates % batch_size)
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    batches = []
+    progress = 0
+    if workers is None or workers <= 1:
+        init_bootstrap_worker(arrays)
+        results = map(run_bootstrap_batch, seed_sequences, batch_sizes, [resample] * len(batch_sizes), [player_weight] * len(batch_sizes))
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_bootstrap_worker, initargs=(arrays,))
+        results = executor.map(run_bootstrap_batch, seed_sequences, batch_sizes, [resample] * len(batch_sizes), [player_weight] * len(batch_sizes))
+    try:
+        for batch in results:
+            batches.append(batch)
+            progress += len(batch)
+            report_progress("Replicates:", progress, n_replicates, progress)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print()
+    replicates = np.concatenate(batches) if len(batches) > 0 else np.empty((0, len(arrays['players'])), dtype=np.float32)
+    # Keep the players who defended at least one shot, as get_sadd_dict() users expect
+    defended = sadd_events > 0
+    sadd_intervals = {}
+    sadd_intervals['players'] = arrays['players'][defended]
+    sadd_intervals['sadd'] = point_estimate[defended]
+    sadd_intervals['sadd_events'] = sadd_events[defended]
+    replicates = replicates[:, defended]
+    with warnings.catch_warnings():
+        # Players missing from every replicate get NaN intervals
+        warnings.simplefilter('ignore', RuntimeWarning)
+        sadd_intervals['lower'] = np.nanpercentile(replicates, percentiles[0], axis=0)
+        sadd_intervals['upper'] = np.nanpercentile(replicates, percentiles[1], axis=0)
+        sadd_intervals['std'] = np.nanstd(replicates, axis=0)
+    if return_replicates:
+        sadd_intervals['replicates'] = replicates
+    return sadd_intervals
+
+
 # The below function is deprecated by player_shifts, I think. If not, rewrite this to expect game_shifts. Function is to get defending players on ice during shot,
 # this is better done by checking whether shot was home or away and grabbing player IDs on the other team from game_shifts.
 # Note: Possible other dictionary intersecting games_trimmed and game_shifts? Players on ice at time of shot?
@@ -1539,6 +3331,306 @@ def get_opposing_players(player, playerList, year, player_teams=None, games_trim
     return defenseSet
 
 # TODO: Build game_shifts_trimmed which is a list of shots and players on ice for each team at time of shot, plus coordinates, whether it was a goal, expected shooting percent, and shooter overall shooting percent.
+# The players on ice for each team at the time of each shot are now built by build_shots_on_ice(); the shot table holds the coordinates and goal flags.
+
+
+def fingerprint_files(directory, use_hash=False):
+    """
+    This function returns a fingerprint string for the game or shift files in a directory, in any of the forms list_feed_files() accepts.
+    By default the fingerprint covers each file's name, size and modification time, which is cheap and changes whenever a file is rewritten.
+    With use_hash=True it covers the file contents instead, so touching a file without changing it does not invalidate the cache.
+    """
+    digest = hashlib.sha256()
+    for file_name in list_feed_files(directory):
+        file_path = os.path.join(directory, file_name)
+        digest.update(file_name.encode('utf-8'))
+        if use_hash:
+            with open(file_path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        else:
+            file_stat = os.stat(file_path)
+            digest.update(str((file_stat.st_size, file_stat.st_mtime_ns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def get_cache_key(name, input_keys=(), params=None, version=None):
+    """
+    This function returns the cache key of an artifact: a hash of its name, the fingerprints or cache keys of everything it was built from, and its build parameters.
+    version, if given, is the version of the code that builds it, so a change to the builder gives new keys to the artifact and everything built from it.
+    """
+    digest = hashlib.sha256()
+    digest.update(name.encode('utf-8'))
+    if version is not None:
+        digest.update(("version " + str(version)).encode('utf-8'))
+    for input_key in input_keys:
+        digest.update(str(input_key).encode('utf-8'))
+    if params is not None:
+        digest.update(repr(sorted(params.items())).encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+
+def cached_build(name, build_func, input_keys=(), params=None, cache_dir='./data', version=None, **kwargs):
+    """
+    This function returns the artifact called name from cache_dir if one was built from the same inputs and parameters, and otherwise builds it with build_func(**kwargs) and saves it there.
+    input_keys are the fingerprints (from fingerprint_files()) or cache keys of whatever the artifact is built from, and params are the build parameters that change its contents.
+    version is the version of build_func's code (see get_cache_key()); bump it when a change to build_func, or to anything it calls, changes what it builds.
+    It returns a tuple of (artifact, cache_key). Pass cache_key on as an input key of anything built from this artifact, so that it is rebuilt when this artifact changes.
+    The artifacts are pickled to cache_dir/<name>-<cache_key>.pkl, and the older keys of the same name are removed once the new one is written.
+
+    Example usage:
+    games_key = fingerprint_files('../Capstone/api/games')
+    shot_table, shot_table_key = cached_build('shot_table', build_shot_table, [games_key], games_trimmed=games_trimmed)
+    """
+    cache_key = get_cache_key(name, input_keys, params, version)
+    cache_path = os.path.join(cache_dir, name + "-" + cache_key + ".pkl")
+    if os.path.exists(cache_path):
+        print("cached_build(): Loading", name, "from", cache_path, flush=True)
+        count_event('cache_hits')
+        with open(cache_path, 'rb') as f:
+            return (pickle.load(f), cache_key)
+    count_event('cache_misses')
+    artifact = build_func(**kwargs)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so an interrupted build never leaves a truncated pickle behind
+    with open(cache_path + ".tmp", 'wb') as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(cache_path + ".tmp", cache_path)
+    remove_stale_cache_files(cache_dir, name, cache_key)
+    return (artifact, cache_key)
+
+
+def remove_stale_cache_files(cache_dir, name, cache_key):
+    """
+    This function deletes the cached pickles of the artifact called name in cache_dir that were written under another cache key, so the cache holds one copy per artifact.
+    """
+    stale_pattern = re.compile(re.escape(name) + r"-[0-9a-f]{20}\.pkl")
+    for file_name in os.listdir(cache_dir):
+        if stale_pattern.fullmatch(file_name) and file_name != name + "-" + cache_key + ".pkl":
+            os.remove(os.path.join(cache_dir, file_name))
+
+
+# The SADD pipeline as a graph of stages. Each stage names its build function, where each keyword argument comes from
+# ('games_directory', 'shifts_directory', another stage, or 'stage:key' for one entry of a stage's dictionary),
+# the run parameters that change its output (params), the ones that only change how it is built (options),
+# the arguments it is always built with (fixed, which are part of its cache key),
+# and the version of its build code (also part of its cache key). Bump a stage's version when a change to its build function,
+# or to a helper it calls, changes its output, so the cached artifacts of that stage and the stages built from it are rebuilt.
+# base_dicts does not keep games_trimmed: no later stage reads the raw play dictionaries, and they would be most of its pickle.
+PIPELINE_STAGES = {
+    'base_dicts': {'build': build_base_dicts, 'inputs': {'games_directory': 'games_directory'}, 'params': [], 'options': ['workers'], 'fixed': {'keep_games_trimmed': False}, 'version': 1},
+    'game_shifts': {'build': build_game_shifts, 'inputs': {'directory': 'shifts_directory', 'home_away_teams': 'base_dicts:home_away_teams'}, 'params': [], 'options': ['workers'], 'version': 1},
+    # Version 2 drops the shifts that end before they start
+    'shift_intervals': {'build': build_shift_intervals, 'inputs': {'game_shifts': 'game_shifts'}, 'params': [], 'options': [], 'version': 2},
+    'game_index': {'build': build_game_index, 'inputs': {'shot_table': 'base_dicts:shot_table', 'game_info': 'base_dicts:game_info', 'shift_intervals': 'shift_intervals'}, 'params': [], 'options': [], 'version': 1},
+    'shots_on_ice': {'build': build_shots_on_ice, 'inputs': {'shot_table': 'base_dicts:shot_table', 'shift_intervals': 'shift_intervals', 'home_away_teams': 'base_dicts:home_away_teams'}, 'params': [], 'options': [], 'version': 1},
+    'lookup_dicts': {'build': build_lookup_dicts, 'inputs': {'shot_table': 'base_dicts:shot_table'}, 'params': [], 'options': [], 'version': 1},
+    'player_cell_counts': {'build': build_player_cell_counts, 'inputs': {'shot_table': 'base_dicts:shot_table'}, 'params': [], 'options': [], 'version': 1},
+    'player_cell_pcts': {'build': build_player_cell_pcts, 'inputs': {'player_cell_counts': 'player_cell_counts'}, 'params': ['player_weight'], 'options': [], 'version': 1},
+    'sadd_arrays': {'build': build_sadd_arrays, 'inputs': {'shot_table': 'base_dicts:shot_table', 'shots_on_ice': 'shots_on_ice', 'player_cell_pcts': 'player_cell_pcts'}, 'params': [], 'options': [], 'version': 1},
+    'sadd_ledger': {'build': build_sadd_ledger, 'inputs': {'shot_table': 'base_dicts:shot_table', 'shots_on_ice': 'shots_on_ice', 'player_cell_pcts': 'player_cell_pcts', 'home_away_teams': 'base_dicts:home_away_teams', 'sadd_arrays': 'sadd_arrays'}, 'params': [], 'options': [], 'version': 1},
+}
+
+
+def get_pipeline_order(targets=None, stages=PIPELINE_STAGES):
+    """
+    This function returns the stages needed to build targets (every stage if targets is None), each listed once and after everything it depends on.
+    """
+    if targets is None:
+        targets = list(stages)
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name not in stages:
+            raise ValueError("Unknown pipeline stage: " + name)
+        if name in visiting:
+            raise ValueError("Pipeline stages depend on each other in a cycle at: " + name)
+        visiting.add(name)
+        for source in stages[name]['inputs'].values():
+            source_stage = source.split(':')[0]
+            if source_stage not in ('games_directory', 'shifts_directory'):
+                visit(source_stage)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in targets:
+        visit(name)
+    return order
+
+
+@instrumented
+def run_pipeline(games_directory='.', shifts_directory='.', targets=None, cache_dir='./data', workers=None, player_weight=849, use_hash=False, use_cache=True, stages=PIPELINE_STAGES):
+    """
+    This function builds the SADD artifacts by walking the stage graph in PIPELINE_STAGES, from the game and shift files to the SADD ledger.
+    Only the stages needed for targets are run (all of them if targets is None), each exactly once, with every input passed explicitly,
+    so no builder ever falls back to rebuilding an upstream dictionary by itself.
+    With use_cache, each stage goes through cached_build(): it is keyed by the fingerprints or cache keys of its inputs, its params and its version,
+    and loaded from cache_dir instead of rebuilt when those are unchanged.
+    Every stage is timed, and a summary is printed at the end. Each stage is also recorded as an instrument_span(), so get_instrumentation_report() breaks it down further.
+    It returns a dictionary with one entry per stage run, the entries of base_dicts flattened into it (except games_trimmed, which the base_dicts stage does not keep), and timings: {stage: seconds}.
+
+    Example usage:
+    artifacts = run_pipeline('../Capstone/api/games', '../Capstone/api/shifts', workers=8)
+    artifacts = run_pipeline('../Capstone/api/games', '../Capstone/api/shifts', targets=['player_cell_pcts'])
+    """
+    print("run_pipeline()", flush=True)
+    order = get_pipeline_order(targets, stages)
+    values = {'games_directory': games_directory, 'shifts_directory': shifts_directory}
+    keys = {}
+    # Only fingerprint the directories that some stage actually reads
+    sources = set(source.split(':')[0] for name in order for source in stages[name]['inputs'].values())
+    for directory_name in ('games_directory', 'shifts_directory'):
+        if directory_name in sources:
+            keys[directory_name] = fingerprint_files(values[directory_name], use_hash=use_hash)
+    run_params = {'player_weight': player_weight}
+    run_options = {'workers': workers}
+    timings = {}
+    for name in order:
+        stage = stages[name]
+        kwargs = {}
+        input_keys = []
+        for argument, source in stage['inputs'].items():
+            source_stage, _, entry = source.partition(':')
+            if entry == '':
+                kwargs[argument] = values[source_stage]
+            else:
+                kwargs[argument] = values[source_stage].get(entry)
+            if keys[source_stage] not in input_keys:
+                input_keys.append(keys[source_stage])
+        params = {param: run_params[param] for param in stage['params']}
+        params.update(stage.get('fixed', {}))
+        kwargs.update(params)
+        kwargs.update({option: run_options[option] for option in stage['options']})
+        start_time = time.perf_counter()
+        with instrument_span(name):
+            if use_cache:
+                values[name], keys[name] = cached_build(name, stage['build'], input_keys, params or None, cache_dir=cache_dir, version=stage.get('version'), **kwargs)
+            else:
+                values[name] = stage['build'](**kwargs)
+                keys[name] = get_cache_key(name, input_keys, params or None, stage.get('version'))
+        timings[name] = time.perf_counter() - start_time
+    print("run_pipeline(): Stage timings")
+    for name in order:
+        print("    %-20s %10.3f s" % (name, timings[name]))
+    print("    %-20s %10.3f s" % ("total", sum(timings.values())), flush=True)
+    artifacts = {}
+    if 'base_dicts' in values:
+        artifacts.update({key: value for key, value in values['base_dicts'].items() if key != 'games_trimmed'})
+    for name in order:
+        artifacts[name] = values[name]
+    artifacts['timings'] = timings
+    return artifacts
+
+
+@instrumented
+def build_cached_artifacts(games_directory='.', shifts_directory='.', cache_dir='./data', workers=None, player_weight=849, use_hash=False):
+    """
+    This function builds every artifact needed for SADD, reusing whatever is already in cache_dir.
+    Each artifact is cached separately and keyed by the files and artifacts it is built from, so a change to the shift files
+    only rebuilds the shift artifacts and what depends on them, and a notebook restart loads everything from disk.
+    It returns a dictionary of the artifacts, with the keys of build_base_dicts() (except games_trimmed) plus one per stage of PIPELINE_STAGES, as run_pipeline() does.
+
+    Example usage:
+    artifacts = build_cached_artifacts('../Capstone/api/games', '../Capstone/api/shifts', workers=8)
+    sadd = get_sadd_dict(artifacts['sadd_arrays'])
+    """
+    print("build_cached_artifacts()", flush=True)
+    return run_pipeline(games_directory, shifts_directory, cache_dir=cache_dir, workers=workers, player_weight=player_weight, use_hash=use_hash)
+
+
+def write_column_store(directory, columns):
+    """
+    This function writes a dictionary of columns, such as shot_table, shift_intervals or shots_on_ice, to a directory that open_column_store() can memory-map.
+    Every NumPy array is written as a raw fixed-dtype file <name>.bin, and a small meta.json header records each array's dtype and shape.
+    Plain values (such as shift_intervals['max_length']) are stored in the header itself.
+    The whole store is written to a temporary directory next to directory and renamed into place when it is complete,
+    so an interrupted write leaves the old store untouched, and a store being replaced is never a mix of old and new columns.
+    The old files are unlinked rather than rewritten, so processes that have the old store memory-mapped keep reading it unchanged.
+    """
+    directory = os.path.abspath(directory)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    temp_directory = tempfile.mkdtemp(prefix=os.path.basename(directory) + ".tmp-", dir=os.path.dirname(directory))
+    old_directory = None
+    try:
+        meta = {'format_version': 1, 'columns': {}, 'values': {}}
+        for name, column in columns.items():
+            if isinstance(column, np.ndarray):
+                column = np.ascontiguousarray(column)
+                column.tofile(os.path.join(temp_directory, name + ".bin"))
+                meta['columns'][name] = {'dtype': column.dtype.str, 'shape': list(column.shape)}
+            else:
+                meta['values'][name] = column
+        with open(os.path.join(temp_directory, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=4)
+        # A directory cannot be renamed over a non-empty one, so move the old store aside first and delete it once the new one is in place
+        if os.path.exists(directory):
+            old_directory = temp_directory + ".old"
+            os.rename(directory, old_directory)
+        os.rename(temp_directory, directory)
+    except BaseException:
+        # Put the old store back if it was already moved aside
+        if old_directory is not None and not os.path.exists(directory):
+            os.rename(old_directory, directory)
+            old_directory = None
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        raise
+    if old_directory is not None:
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+
+def open_column_store(directory):
+    """
+    This function opens a directory written by write_column_store() and returns the same dictionary of columns, with every array opened read-only with np.memmap.
+    Opening is nearly instant and uses almost no memory: pages are only read from disk as they are touched,
+    and several processes opening the same store share one copy in the operating system's page cache.
+    """
+    with open(os.path.join(directory, "meta.json"), encoding='utf-8') as f:
+        meta = json.load(f)
+    columns = dict(meta['values'])
+    for name, column_meta in meta['columns'].items():
+        dtype = np.dtype(column_meta['dtype'])
+        shape = tuple(column_meta['shape'])
+        # np.memmap cannot map an empty file
+        if int(np.prod(shape)) == 0:
+            columns[name] = np.empty(shape, dtype=dtype)
+        else:
+            columns[name] = np.memmap(os.path.join(directory, name + ".bin"), dtype=dtype, mode='r', shape=shape)
+    return columns
+
+
+def save_shot_store(directory, shot_table=None, shift_intervals=None, shots_on_ice=None, sadd_ledger=None):
+    """
+    This function writes the shot table, shift intervals, on-ice join and SADD ledger to directory, one column store per artifact, so open_shot_store() can open them instantly.
+    Any artifact passed as None is skipped.
+
+    Example usage:
+    save_shot_store('./data/store', shot_table=shot_table, shift_intervals=shift_intervals, shots_on_ice=shots_on_ice)
+    """
+    print("save_shot_store()")
+    for name, columns in (('shot_table', shot_table), ('shift_intervals', shift_intervals), ('shots_on_ice', shots_on_ice), ('sadd_ledger', sadd_ledger)):
+        if columns is not None:
+            write_column_store(os.path.join(directory, name), columns)
+
+
+def open_shot_store(directory):
+    """
+    This function opens the artifacts written by save_shot_store() and returns a dictionary with the keys shot_table, shift_intervals, shots_on_ice and sadd_ledger.
+    Each is the usual dictionary of arrays, memory-mapped from disk, so it can be passed straight to the shot accessors, get_players_on_ice_batch() or build_sadd().
+    Artifacts that were not saved are None.
+
+    Example usage:
+    store = open_shot_store('./data/store')
+    offsets, players, sides = get_players_on_ice_batch([2012020711], [1], [600], store['shift_intervals'])
+    """
+    store = {}
+    for name in ('shot_table', 'shift_intervals', 'shots_on_ice', 'sadd_ledger'):
+        if os.path.exists(os.path.join(directory, name, "meta.json")):
+            store[name] = open_column_store(os.path.join(directory, name))
+        else:
+            store[name] = None
+    return store
 
 
 # You can use these to build dictionaries!
@@ -1553,3 +3645,83 @@ def get_opposing_players(player, playerList, year, player_teams=None, games_trim
 #player_id_games = build_player_id_games()
 #game_shifts = build_game_shifts('../Capstone/api/shifts')
 #player_pcts_and_groups = build_player_pcts_and_groups()
+
+# Or build everything with caching, so unchanged artifacts are loaded from ./data instead of rebuilt:
+
+#artifacts = build_cached_artifacts('../Capstone/api/games', '../Capstone/api/shifts', cache_dir='./data', workers=8)
+
+# The same stages can be run, timed, from the command line, or only up to the stages you need:
+
+#./sadd.py build --games ../Capstone/api/games --shifts ../Capstone/api/shifts --workers 8
+#artifacts = run_pipeline('../Capstone/api/games', '../Capstone/api/shifts', targets=['player_cell_pcts'])
+
+# Save the arrays once, then open them instantly in any later session:
+
+#save_shot_store('./data/store', shot_table=artifacts['shot_table'], shift_intervals=artifacts['shift_intervals'], shots_on_ice=artifacts['shots_on_ice'], sadd_ledger=artifacts['sadd_ledger'])
+#store = open_shot_store('./data/store')
+
+# Or build the base dictionaries in one pass, reading each game and shift file only once:
+
+#base_dicts = build_base_dicts('../Capstone/api/games', '../Capstone/api/shifts', workers=8)
+#games_trimmed = base_dicts['games_trimmed']
+#home_away_teams = base_dicts['home_away_teams']
+#game_shifts = base_dicts['game_shifts']
+#shot_table = base_dicts['shot_table']
+#shift_intervals = base_dicts['shift_intervals']
+#shots_on_ice = build_shots_on_ice(shot_table, shift_intervals, base_dicts['home_away_teams'])
+#lookup_dicts = build_lookup_dicts(shot_table=shot_table)
+#player_id_set, player_teams = lookup_dicts['player_id_set'], lookup_dicts['player_teams']
+#team_set, team_games = lookup_dicts['team_set'], lookup_dicts['team_games']
+#player_id_games = lookup_dicts['player_id_games']
+#player_cell_pcts = build_player_cell_pcts(build_player_cell_counts(shot_table))
+#player_pcts_and_groups = build_player_pcts_and_groups(player_cell_pcts=player_cell_pcts)
+#sadd, sadd_arrays = build_sadd(shot_table=shot_table, shots_on_ice=shots_on_ice, player_cell_pcts=player_cell_pcts, return_arrays=True)
+
+# To fold in a night of new games without rebuilding, keep a SADD state and update it with just the new files:
+
+#sadd_state = build_sadd_state(shot_table, shift_intervals, shots_on_ice, home_away_teams)
+#sadd_state = update_sadd_state(sadd_state, ['../Capstone/api/games/game_2022020500.json'], ['../Capstone/api/shifts/game_2022020500.json'])
+#sadd = get_sadd_dict(sadd_state['sadd_arrays'])
+
+# The SADD ledger keeps every shot's SADD values, so the other SADD metrics are quick group-bys:
+
+#sadd_ledger = build_sadd_ledger(shot_table, shots_on_ice, player_cell_pcts, home_away_teams, sadd_arrays=sadd_arrays)
+#defensive_sadd = get_sadd_totals_dict(aggregate_sadd_ledger(sadd_ledger, 'defensive'))
+#offensive_sadd = get_sadd_totals_dict(aggregate_sadd_ledger(sadd_ledger, 'offensive'))
+#overall_sadd = get_sadd_totals_dict(aggregate_sadd_ledger(sadd_ledger, 'overall'))
+#team_sadd = get_sadd_totals_dict(aggregate_sadd_ledger(sadd_ledger, 'defensive', group_by='team'))
+#season_sadd = get_sadd_totals_dict(aggregate_sadd_ledger(sadd_ledger, 'defensive', by_season=True))
+
+# The game index restricts any of the above to a season, game type or date window by slicing the full arrays:
+
+#game_index = build_game_index(shot_table, base_dicts['game_info'], shift_intervals)
+#scoped = slice_artifacts(game_index, select_games(game_index, seasons=2022, game_types='R', last_days=30), shot_table, shift_intervals, shots_on_ice)
+#scoped_pcts = build_player_cell_pcts(build_player_cell_counts(scoped['shot_table']))
+#scoped_sadd = get_sadd_dict(build_sadd_arrays(scoped['shot_table'], scoped['shots_on_ice'], scoped_pcts))
+
+# Bootstrap intervals around every player's SADD, resampling whole games:
+
+#sadd_intervals = bootstrap_sadd(shot_table, shots_on_ice, n_replicates=1000, workers=8, seed=0)
+
+# Rolling SADD over each defender's last 10 games, or last 30 days:
+
+#form = rolling_sadd(sadd_ledger, game_index, window_games=10)
+#form_30_days = rolling_sadd(sadd_ledger, game_index, window_days=30)
+#player_form = form['sadd'][get_rolling_sadd_rows(form, 8471698)]
+
+# See where the time and memory of a build go, and save the breakdown as JSON:
+
+#start_instrumentation(trace_memory=True)
+#artifacts = run_pipeline('../Capstone/api/games', '../Capstone/api/shifts', use_cache=False)
+#print_instrumentation_report()
+#report = write_instrumentation_report('./data/report.json')
+
+# The game and shift directories can hold compressed or slim files (see feed_io.py); every reader above takes them as they are:
+
+#python feed_io.py convert ../Capstone/api/games --kind game --compression zstd --slim
+#python feed_io.py convert ../Capstone/api/shifts --kind shift --compression zstd --slim
+
+# The game files are streamed play by play, so a very large feed does not need its whole document in memory:
+
+#game_data, plays = iter_feed_plays('../Capstone/api/games/game_2012020711.json')
+#game_id, game_dict = trim_game_data(game_data, plays)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+This script is the command-line entry point for the SADD pipeline in init_script_defines.py.
+
+Usage:
+./sadd.py build --games ../Capstone/api/games --shifts ../Capstone/api/shifts --workers 8
+./sadd.py build --games ../Capstone/api/games --shifts ../Capstone/api/shifts --target player_cell_pcts
+./sadd.py build --games ../Capstone/api/games --shifts ../Capstone/api/shifts --csv sadd.csv --store ./data/store
+./sadd.py build --games ../Capstone/api/games --shifts ../Capstone/api/shifts --no-cache --trace-memory --report report.json
+./sadd.py stages
+
+build runs every stage needed for the targets once, in dependency order, loading each from the cache directory when its inputs are unchanged,
+and prints how long each stage took. With --report it also writes the spans, counters and memory peaks of the run as JSON.
+stages prints the stage graph.
+"""
+
+
+import argparse
+import sys
+
+import pandas as pd
+
+from init_script_defines import (PIPELINE_STAGES, aggregate_sadd_ledger, get_pipeline_order, print_instrumentation_report, run_pipeline, save_shot_store,
+                                 start_instrumentation, write_instrumentation_report)
+
+
+def write_sadd_csv(file_path, sadd_ledger):
+    """
+    This function writes one row per player with their defensive, offensive and overall SADD and event counts.
+    """
+    sadd_table = None
+    for side in ('defensive', 'offensive', 'overall'):
+        sadd_totals = aggregate_sadd_ledger(sadd_ledger, side=side)
+        side_table = pd.DataFrame({'player': sadd_totals['players'], side + '_sadd': sadd_totals['sadd'], side + '_events': sadd_totals['sadd_events']})
+        if sadd_table is None:
+            sadd_table = side_table
+        else:
+            sadd_table = sadd_table.merge(side_table, on='player', how='outer')
+    sadd_table.sort_values('player').to_csv(file_path, index=False)
+
+
+def build_command(args):
+    targets = args.target or None
+    start_instrumentation(trace_memory=args.trace_memory)
+    artifacts = run_pipeline(args.games, args.shifts, targets=targets, cache_dir=args.cache_dir, workers=args.workers,
+                             player_weight=args.player_weight, use_hash=args.hash, use_cache=not args.no_cache)
+    if args.store is not None:
+        save_shot_store(args.store, shot_table=artifacts.get('shot_table'), shift_intervals=artifacts.get('shift_intervals'),
+                        shots_on_ice=artifacts.get('shots_on_ice'), sadd_ledger=artifacts.get('sadd_ledger'))
+    if args.csv is not None:
+        if artifacts.get('sadd_ledger') is None:
+            print("sadd: --csv needs the sadd_ledger stage; leave out --target or include sadd_ledger.")
+            return 1
+        write_sadd_csv(args.csv, artifacts['sadd_ledger'])
+        print("sadd: Wrote", args.csv)
+    if args.report is not None:
+        report = write_instrumentation_report(args.report)
+        print_instrumentation_report(report)
+        print("sadd: Wrote", args.report)
+    return 0
+
+
+def stages_command(args):
+    for name in get_pipeline_order():
+        sources = sorted(set(source.split(':')[0] for source in PIPELINE_STAGES[name]['inputs'].values()))
+        print("%-20s <- %s" % (name, ", ".join(sources)))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sadd', description="Build and inspect the SADD pipeline.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="build the SADD artifacts from game and shift files")
+    build_parser.add_argument('--games', required=True, help="directory of game .json files")
+    build_parser.add_argument('--shifts', required=True, help="directory of shift .json files")
+    build_parser.add_argument('--cache-dir', default='./data', help="directory the stage artifacts are cached in (default ./data)")
+    build_parser.add_argument('--workers', type=int, default=None, help="worker processes for parsing the files")
+    build_parser.add_argument('--player-weight', type=int, default=849, help="weight of a player's own shots against the league prior (default 849)")
+    build_parser.add_argument('--target', action='append', choices=list(PIPELINE_STAGES), help="only build this stage and what it needs; can be repeated")
+    build_parser.add_argument('--hash', action='store_true', help="fingerprint the input files by content instead of size and modification time")
+    build_parser.add_argument('--no-cache', action='store_true', help="build every stage without reading or writing the cache")
+    build_parser.add_argument('--store', default=None, help="also write the memory-mapped column store to this directory")
+    build_parser.add_argument('--csv', default=None, help="also write per-player defensive, offensive and overall SADD to this CSV file")
+    build_parser.add_argument('--report', default=None, help="write the run's span timings, counters and memory peaks to this .json file")
+    build_parser.add_argument('--trace-memory', action='store_true', help="record the peak Python memory of every span with tracemalloc (slower)")
+    build_parser.set_defaults(func=build_command)
+
+    stages_parser = subparsers.add_parser('stages', help="list the pipeline stages in build order with their inputs")
+    stages_parser.set_defaults(func=stages_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+"""
+This script runs a small local HTTP service that answers SADD queries from artifacts loaded once at startup,
+so dashboards and notebooks do not have to rebuild or unpickle the dictionaries for every lookup.
+
+Usage:
+python sadd_server.py --games ../Capstone/api/games --shifts ../Capstone/api/shifts --port 8050
+
+Endpoints (all GET, all returning JSON):
+    /sadd/<player_id>?side=defensive&season=2022          a player's SADD; side is defensive, offensive or overall
+    /pct_grid/<player_id>                                 a player's shooting percentage per grouped coordinate, as in player_pcts_and_groups
+    /on_ice?game=2022020500&period=2&time=12:34           the players on the ice for each team; time is MM:SS or seconds into the period
+    /leaderboard?side=defensive&season=2022&min_events=200&limit=25&order=desc&group_by=player
+    /health                                               the number of games, shots and players loaded
+Bad parameters (including a negative min_events or limit) are answered with a 400 and any other failure with a 500, both with an {'error': ...} JSON body.
+The expensive responses are kept in LRU caches, so repeated dashboard queries are served from memory.
+"""
+
+
+import argparse
+import functools
+import json
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from init_script_defines import aggregate_sadd_ledger, build_cached_artifacts, get_players_on_ice_batch, period_time_to_seconds
+
+
+# The artifacts and lookup arrays the request handlers answer from, set once by load_service()
+service = None
+
+
+def load_service(artifacts):
+    """
+    This function prepares the loaded artifacts for serving: it keeps the ones the endpoints use, collects the player names from game_shifts,
+    and clears the response caches so a reload never serves stale answers.
+    """
+    global service
+    player_names = {}
+    for game in (artifacts.get('game_shifts') or {}).values():
+        for side in ('home', 'away'):
+            if side not in game:
+                continue
+            for player_id, player in game[side]['players'].items():
+                player_names[int(player_id)] = player['playerName']
+    service = {}
+    service['sadd_ledger'] = artifacts['sadd_ledger']
+    service['player_cell_pcts'] = artifacts['player_cell_pcts']
+    service['shift_intervals'] = artifacts['shift_intervals']
+    service['home_away_teams'] = artifacts['home_away_teams']
+    service['player_names'] = player_names
+    get_sadd_totals.cache_clear()
+    get_sadd_response.cache_clear()
+    get_pct_grid_response.cache_clear()
+    get_leaderboard_response.cache_clear()
+    return service
+
+
+def get_json_bytes(response):
+    """
+    This function serializes a response dictionary to the UTF-8 bytes sent to the client.
+    """
+    return json.dumps(response, separators=(',', ':')).encode('utf-8')
+
+
+@functools.lru_cache(maxsize=64)
+def get_sadd_totals(side, season, group_by='player'):
+    """
+    This function returns the aggregate_sadd_ledger() arrays for one side and season (None for all seasons), cached since every SADD and leaderboard response reads them.
+    """
+    sadd_ledger = service['sadd_ledger']
+    rows = None
+    if season is not None:
+        rows = np.flatnonzero(np.asarray(sadd_ledger['season']) == season)
+    return aggregate_sadd_ledger(sadd_ledger, side=side, group_by=group_by, rows=rows)
+
+
+@functools.lru_cache(maxsize=4096)
+def get_sadd_response(player_id, side, season):
+    """
+    This function returns the JSON bytes of one player's SADD, or None if the player has no SADD events for that side and season.
+    """
+    sadd_totals = get_sadd_totals(side, season)
+    index = np.searchsorted(sadd_totals['players'], player_id)
+    if index >= len(sadd_totals['players']) or sadd_totals['players'][index] != player_id:
+        return None
+    response = {'player': player_id, 'name': service['player_names'].get(player_id, ''), 'side': side, 'season': season}
+    response['pct_diff_total'] = float(sadd_totals['pct_diff_total'][index])
+    response['sadd_events'] = int(sadd_totals['sadd_events'][index])
+    response['sadd'] = float(sadd_totals['sadd'][index])
+    return get_json_bytes(response)
+
+
+@functools.lru_cache(maxsize=1024)
+def get_pct_grid_response(player_id):
+    """
+    This function returns the JSON bytes of one player's pct grid, or None if the player took no shots.
+    Each cell is [x_group, y_group, pct], matching the (x_group, y_group): pct entries of player_pcts_and_groups.
+    """
+    player_cell_pcts = service['player_cell_pcts']
+    index = np.searchsorted(player_cell_pcts['players'], player_id)
+    if index >= len(player_cell_pcts['players']) or player_cell_pcts['players'][index] != player_id:
+        return None
+    cells = [[x_group, y_group, pct] for (x_group, y_group), pct in zip(player_cell_pcts['cell_keys'].tolist(), player_cell_pcts['pct'][index].tolist())]
+    response = {'player': player_id, 'name': service['player_names'].get(player_id, ''), 'avg': float(player_cell_pcts['avg'][index]), 'cells': cells}
+    return get_json_bytes(response)
+
+
+@functools.lru_cache(maxsize=256)
+def get_leaderboard_response(side, season, min_events, limit, order, group_by):
+    """
+    This function returns the JSON bytes of the SADD leaderboard: the players (or teams) with at least min_events events, best first unless order is 'asc'.
+    """
+    sadd_totals = get_sadd_totals(side, season, group_by)
+    qualified = np.flatnonzero(sadd_totals['sadd_events'] >= min_events)
+    ranking = qualified[np.argsort(sadd_totals['sadd'][qualified], kind='stable')]
+    if order != 'asc':
+        ranking = ranking[::-1]
+    leaders = []
+    for index in ranking[:limit].tolist():
+        leader = {'sadd': float(sadd_totals['sadd'][index]), 'sadd_events': int(sadd_totals['sadd_events'][index])}
+        if group_by == 'player':
+            leader['player'] = int(sadd_totals['players'][index])
+            leader['name'] = service['player_names'].get(leader['player'], '')
+        else:
+            leader['team'] = str(sadd_totals['teams'][index])
+        leaders.append(leader)
+    response = {'side': side, 'season': season, 'min_events': min_events, 'group_by': group_by, 'leaders': leaders}
+    return get_json_bytes(response)
+
+
+def get_on_ice_response(gameID, period, seconds):
+    """
+    This function returns the JSON bytes of the players on the ice at one game time, split into the home and away teams.
+    It is a single binary search over the shift intervals, so it is not cached.
+    """
+    offsets, players, sides = get_players_on_ice_batch(np.array([gameID]), np.array([period]), np.array([seconds]), service['shift_intervals'])
+    home_team, away_team = service['home_away_teams'].get(gameID, ('', ''))
+    response = {'game': gameID, 'period': period, 'seconds': seconds}
+    response['home'] = {'team': home_team, 'players': sorted(set(players[sides == 0].tolist()))}
+    response['away'] = {'team': away_team, 'players': sorted(set(players[sides == 1].tolist()))}
+    return get_json_bytes(response)
+
+
+def get_query_int(query, name, default=None):
+    """
+    This function reads an integer query parameter, returning default if it is missing and raising ValueError if it is not an integer.
+    """
+    if name not in query:
+        return default
+    return int(query[name][0])
+
+
+def route_request(path, query):
+    """
+    This function answers one GET request and returns (status, body bytes).
+    """
+    parts = [part for part in path.split('/') if part != '']
+    if len(parts) == 0 or parts[0] == 'health':
+        response = {'games': len(service['home_away_teams']), 'shots': len(service['sadd_ledger']['row']), 'players': len(service['player_cell_pcts']['players'])}
+        return (200, get_json_bytes(response))
+    side = query.get('side', ['defensive'])[0]
+    if side not in ('defensive', 'offensive', 'overall'):
+        return (400, get_json_bytes({'error': "side must be defensive, offensive or overall"}))
+    season = get_query_int(query, 'season')
+    if parts[0] == 'sadd' and len(parts) == 2:
+        body = get_sadd_response(int(parts[1]), side, season)
+        if body is None:
+            return (404, get_json_bytes({'error': "no SADD events for player " + parts[1]}))
+        return (200, body)
+    if parts[0] == 'pct_grid' and len(parts) == 2:
+        body = get_pct_grid_response(int(parts[1]))
+        if body is None:
+            return (404, get_json_bytes({'error': "no shots for player " + parts[1]}))
+        return (200, body)
+    if parts[0] == 'on_ice':
+        time_value = query.get('time', [''])[0]
+        if ':' in time_value:
+            seconds = period_time_to_seconds(time_value)
+        else:
+            seconds = int(time_value)
+        return (200, get_on_ice_response(get_query_int(query, 'game'), get_query_int(query, 'period'), seconds))
+    if parts[0] == 'leaderboard':
+        group_by = query.get('group_by', ['player'])[0]
+        if group_by not in ('player', 'team'):
+            return (400, get_json_bytes({'error': "group_by must be player or team"}))
+        order = query.get('order', ['desc'])[0]
+        min_events = get_query_int(query, 'min_events', 0)
+        limit = get_query_int(query, 'limit', 25)
+        # A negative limit would slice off the last leaders instead of keeping the first ones
+        if min_events < 0 or limit < 0:
+            return (400, get_json_bytes({'error': "min_events and limit must not be negative"}))
+        return (200, get_leaderboard_response(side, season, min_events, limit, order, group_by))
+    return (404, get_json_bytes({'error': "unknown endpoint " + path}))
+
+
+class SaddRequestHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests, which matters far more than the handlers for small local queries
+    protocol_version = 'HTTP/1.1'
+    # Buffer the headers and body into one write, so kept-alive responses are not held back by delayed acknowledgements
+    wbufsize = 65536
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            status, body = route_request(url.path, parse_qs(url.query))
+        except (ValueError, TypeError, KeyError) as error:
+            status, body = (400, get_json_bytes({'error': "bad request: " + str(error)}))
+        except Exception as error:
+            # Any other failure still gets a response, so the kept-alive connection is not dropped without one
+            traceback.print_exc()
+            status, body = (500, get_json_bytes({'error': "internal error: " + repr(error)}))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Logging every request to stderr would cost more than answering it
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve SADD queries over HTTP from artifacts loaded once at startup.")
+    parser.add_argument('--games', required=True, help="directory of game .json files")
+    parser.add_argument('--shifts', required=True, help="directory of shift .json files")
+    parser.add_argument('--cache-dir', default='./data', help="artifact cache directory used by build_cached_artifacts()")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes for parsing files that are not cached yet")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args()
+
+    artifacts = build_cached_artifacts(args.games, args.shifts, cache_dir=args.cache_dir, workers=args.workers)
+    load_service(artifacts)
+    server = ThreadingHTTPServer((args.host, args.port), SaddRequestHandler)
+    server.verbose = args.verbose
+    print("sadd_server: Serving on http://%s:%d" % (args.host, args.port), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 import psycopg2
 import os
-import json
 from psycopg2.extras import Json
+from feed_io import iter_feed_plays, read_feed
 
 
 # Define function to insert game data
@@ -165,26 +165,78 @@ def insert_shifts(shift_data, conn):
     # Close the cursor
     cur.close()
     
-def insert_plays(game_data, conn):
-    game_id = game_data['gamePk']
-    plays_data = game_data['liveData']['plays']['allPlays']
+# The get_*_row functions pick out of a single play what the plays, shots and goals tables need, so one pass over a streamed feed can collect all three
+def get_play_row(play):
+    event_index = play['about']['eventIdx']
+    result = play['result']['description']
 
-    cur = conn.cursor()
+    x_coordinate = play['coordinates'].get('x', None)
+    y_coordinate = play['coordinates'].get('y', None)
+
+    team_id = None
+    if 'team' in play:
+        team_id = play['team']['id']
+
+    players_data = play.get('players', [])
+    player_ids = [player_data['player']['id'] for player_data in players_data]
+
+    return (event_index, result, x_coordinate, y_coordinate, team_id, player_ids)
+
+
+def get_shot_row(play):
+    if play['result']['eventTypeId'] not in ['SHOT', 'GOAL']:
+        return None
+    event_index = play['about']['eventIdx']
+
+    team_id = play['team']['id']
+    x_coordinate = play['coordinates']['x']
+    y_coordinate = play['coordinates']['y']
+
+    players_data = play.get('players', [])
+    shooter_id = None
+    goalie_id = None
+
+    for player_data in players_data:
+        if player_data['playerType'] == 'Shooter' or player_data['playerType'] == 'Scorer':
+            shooter_id = player_data['player']['id']
+        elif player_data['playerType'] == 'Goalie':
+            goalie_id = player_data['player']['id']
+
+    return (event_index, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate)
+
+
+def get_goal_row(play):
+    if play['result']['eventTypeId'] != 'GOAL':
+        return None
+    event_index = play['about']['eventIdx']
+
+    team_id = play['team']['id']
+    x_coordinate = play['coordinates']['x']
+    y_coordinate = play['coordinates']['y']
+
+    players_data = play.get('players', [])
+    shooter_id = None
+    goalie_id = None
+
+    for player_data in players_data:
+        if player_data['playerType'] == 'Scorer':
+            shooter_id = player_data['player']['id']
+        elif player_data['playerType'] == 'Goalie':
+            goalie_id = player_data['player']['id']
+
+    return (event_index, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate)
 
-    for play in plays_data:
-        event_index = play['about']['eventIdx']
-        result = play['result']['description']
 
-        x_coordinate = play['coordinates'].get('x', None)
-        y_coordinate = play['coordinates'].get('y', None)
+def insert_plays(game_data, conn, plays_data=None):
+    if plays_data is None:
+        plays_data = game_data['liveData']['plays']['allPlays']
+    insert_play_rows(game_data['gamePk'], [get_play_row(play) for play in plays_data], conn)
 
-        team_id = None
-        if 'team' in play:
-            team_id = play['team']['id']
 
-        players_data = play.get('players', [])
-        player_ids = [player_data['player']['id'] for player_data in players_data]
+def insert_play_rows(game_id, play_rows, conn):
+    cur = conn.cursor()
 
+    for event_index, result, x_coordinate, y_coordinate, team_id, player_ids in play_rows:
         check_query = "SELECT 1 FROM plays WHERE game_id = %s AND event_index = %s;"
         cur.execute(check_query, (game_id, event_index))
 
@@ -199,76 +251,50 @@ def insert_plays(game_data, conn):
 
 
     
-def insert_shots(game_data, conn):
-    game_id = game_data['gamePk']
-    plays_data = game_data['liveData']['plays']['allPlays']
-
-    cur = conn.cursor()
-
-    for play in plays_data:
-        if play['result']['eventTypeId'] in ['SHOT', 'GOAL']:
-            event_index = play['about']['eventIdx']
+def insert_shots(game_data, conn, plays_data=None):
+    if plays_data is None:
+        plays_data = game_data['liveData']['plays']['allPlays']
+    shot_rows = [get_shot_row(play) for play in plays_data]
+    insert_shot_rows(game_data['gamePk'], [shot_row for shot_row in shot_rows if shot_row is not None], conn)
 
-            team_id = play['team']['id']
-            x_coordinate = play['coordinates']['x']
-            y_coordinate = play['coordinates']['y']
 
-            players_data = play.get('players', [])
-            shooter_id = None
-            goalie_id = None
-
-            for player_data in players_data:
-                if player_data['playerType'] == 'Shooter' or player_data['playerType'] == 'Scorer':
-                    shooter_id = player_data['player']['id']
-                elif player_data['playerType'] == 'Goalie':
-                    goalie_id = player_data['player']['id']
+def insert_shot_rows(game_id, shot_rows, conn):
+    cur = conn.cursor()
 
-            check_query = "SELECT play_id FROM plays WHERE game_id = %s AND event_index = %s;"
-            cur.execute(check_query, (game_id, event_index))
-            play_id = cur.fetchone()[0]
+    for event_index, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate in shot_rows:
+        check_query = "SELECT play_id FROM plays WHERE game_id = %s AND event_index = %s;"
+        cur.execute(check_query, (game_id, event_index))
+        play_id = cur.fetchone()[0]
 
-            insert_query = """INSERT INTO shots
-                              (play_id, game_id, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate, game_play_idx)
-                              VALUES (%s, %s, %s, %s, %s, %s, %s, %s);"""
-            cur.execute(insert_query, (play_id, game_id, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate, event_index))
-            conn.commit()
+        insert_query = """INSERT INTO shots
+                          (play_id, game_id, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate, game_play_idx)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s, %s);"""
+        cur.execute(insert_query, (play_id, game_id, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate, event_index))
+        conn.commit()
 
     cur.close()
 
-def insert_goals(game_data, conn):
-    game_id = game_data['gamePk']
-    plays_data = game_data['liveData']['plays']['allPlays']
+def insert_goals(game_data, conn, plays_data=None):
+    if plays_data is None:
+        plays_data = game_data['liveData']['plays']['allPlays']
+    goal_rows = [get_goal_row(play) for play in plays_data]
+    insert_goal_rows(game_data['gamePk'], [goal_row for goal_row in goal_rows if goal_row is not None], conn)
+
 
+def insert_goal_rows(game_id, goal_rows, conn):
     cur = conn.cursor()
 
-    for play in plays_data:
-        if play['result']['eventTypeId'] == 'GOAL':
-            event_index = play['about']['eventIdx']
-
-            team_id = play['team']['id']
-            x_coordinate = play['coordinates']['x']
-            y_coordinate = play['coordinates']['y']
-
-            players_data = play.get('players', [])
-            shooter_id = None
-            goalie_id = None
-
-            for player_data in players_data:
-                if player_data['playerType'] == 'Scorer':
-                    shooter_id = player_data['player']['id']
-                elif player_data['playerType'] == 'Goalie':
-                    goalie_id = player_data['player']['id']
-
-            check_query = "SELECT play_id, shot_id FROM shots WHERE game_id = %s AND event_index = %s;"
-            cur.execute(check_query, (game_id, event_index))
-            play_id = cur.fetchone()[0]
-            shot_id = cur.fetchone()[1]
-
-            insert_query = """INSERT INTO shots
-                              (play_id, game_id, shot_id, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate, game_play_idx)
-                              VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);"""
-            cur.execute(insert_query, (play_id, game_id, shot_id, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate, event_index))
-            conn.commit()
+    for event_index, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate in goal_rows:
+        check_query = "SELECT play_id, shot_id FROM shots WHERE game_id = %s AND event_index = %s;"
+        cur.execute(check_query, (game_id, event_index))
+        play_id = cur.fetchone()[0]
+        shot_id = cur.fetchone()[1]
+
+        insert_query = """INSERT INTO shots
+                          (play_id, game_id, shot_id, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate, game_play_idx)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);"""
+        cur.execute(insert_query, (play_id, game_id, shot_id, team_id, shooter_id, goalie_id, x_coordinate, y_coordinate, event_index))
+        conn.commit()
 
     cur.close()
 
@@ -303,13 +329,23 @@ conn = psycopg2.connect(
     port="your_port"
 )
 
-# Open the JSON file and parse the data
-with open('path/to/game_data.json', 'r') as f:
-    game_data = json.load(f)
+# Open the JSON file (plain, .json.gz, .json.zst or slim, see feed_io.py) and read it in a single pass, keeping only the rows the plays, shots and goals tables need.
+# The boxscore comes after the plays in the file, so game_data is complete once the plays have been read
+game_data, plays = iter_feed_plays('path/to/game_data.json')
+play_rows = []
+shot_rows = []
+goal_rows = []
+for play in plays:
+    play_rows.append(get_play_row(play))
+    shot_row = get_shot_row(play)
+    if shot_row is not None:
+        shot_rows.append(shot_row)
+    goal_row = get_goal_row(play)
+    if goal_row is not None:
+        goal_rows.append(goal_row)
 
 # Open the JSON file for the shifts and parse the data
-with open('path/to/shift_data.json', 'r') as g:
-	shift_data = json.load(g)
+shift_data = read_feed('path/to/shift_data.json')
 
 # Call the functions to insert the data into the respective tables
 insert_game_data(conn, game_data)
@@ -318,7 +354,7 @@ insert_players(game_data, conn)
 insert_officials(game_data, conn)
 insert_games_extra_data(game_data, conn)
 insert_venues(game_data, conn)
-insert_plays(game_data, conn)
-insert_shots(game_data, conn)
-insert_goals(game_data, conn)
+insert_play_rows(game_data['gamePk'], play_rows, conn)
+insert_shot_rows(game_data['gamePk'], shot_rows, conn)
+insert_goal_rows(game_data['gamePk'], goal_rows, conn)
 insert_shifts(shift_data, conn)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""
+This script generates a synthetic corpus of game feed and shift chart .json files for testing and benchmarking the SADD pipeline.
+Every game is built from live-data-example.json, so the files have the same schema, size and mix of events as a real feed:
+the teams, players, dates and game IDs are replaced, and every shot gets new coordinates and a new goal/no-goal result.
+Each team has a roster for each season with some turnover between seasons, and the shift charts rotate four forward lines,
+three defence pairs and a goalie through every period, so every shot has a full set of players on the ice.
+The same seed always gives the same corpus.
+
+Usage:
+python synthetic_corpus.py --out ./synthetic --games 100
+python synthetic_corpus.py --out ./synthetic --seasons 20 --workers 8
+
+The game files are written to <out>/games/game_<gameID>.json and the shift files to <out>/shifts/game_<gameID>.json,
+the layout build_base_dicts() and build_game_shifts() read. With --compression or --slim they are stored in that form instead (see feed_io.py).
+"""
+
+
+import argparse
+import datetime
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from feed_io import check_compression, write_feed
+
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'live-data-example.json')
+
+# The regular season has 1,312 games for 32 teams
+GAMES_PER_SEASON = 1312
+TEAM_CODES = ['ANA', 'ARI', 'BOS', 'BUF', 'CAR', 'CBJ', 'CGY', 'CHI', 'COL', 'DAL', 'DET', 'EDM', 'FLA', 'LAK', 'MIN', 'MTL',
+              'NJD', 'NSH', 'NYI', 'NYR', 'OTT', 'PHI', 'PIT', 'SEA', 'SJS', 'STL', 'TBL', 'TOR', 'VAN', 'VGK', 'WPG', 'WSH']
+
+# The parsed template, loaded once per process by get_template()
+template = None
+
+
+def get_template():
+    """
+    This function loads live-data-example.json once per process and works out which of its players dress for each side and in which position.
+    """
+    global template
+    if template is None:
+        with open(TEMPLATE_PATH, encoding='utf-8') as f:
+            game_data = json.load(f)
+        template = {'game_data': game_data, 'sides': {}}
+        for side in ('home', 'away'):
+            players = game_data['liveData']['boxscore']['teams'][side]['players']
+            template['sides'][side] = {'player_ids': [], 'positions': []}
+            for player_data in players.values():
+                template['sides'][side]['player_ids'].append(player_data['person']['id'])
+                template['sides'][side]['positions'].append(player_data['position']['type'])
+    return template
+
+
+def get_season_schedule(season, n_games, seed):
+    """
+    This function returns the (gameID, home team index, away team index, date) of the first n_games games of a synthetic season.
+    The games are spread evenly from early October to early April.
+    """
+    rng = np.random.default_rng([seed, season, 0])
+    home_teams = rng.integers(0, len(TEAM_CODES), size=n_games)
+    away_teams = (home_teams + rng.integers(1, len(TEAM_CODES), size=n_games)) % len(TEAM_CODES)
+    season_start = datetime.date(season, 10, 10)
+    schedule = []
+    for game_num in range(n_games):
+        gameID = season * 1000000 + 20000 + game_num + 1
+        game_date = season_start + datetime.timedelta(days=(game_num * 180) // GAMES_PER_SEASON)
+        schedule.append((gameID, int(home_teams[game_num]), int(away_teams[game_num]), game_date))
+    return schedule
+
+
+def get_roster(team_index, season, n_players):
+    """
+    This function returns a team's synthetic player IDs for a season. Each roster slot changes hands every four seasons, staggered across the slots,
+    so players carry over between seasons the way real rosters do.
+    """
+    return [8400000 + (team_index * 40 + slot) * 100 + (season - 2000 + slot) // 4 for slot in range(n_players)]
+
+
+def remap_players(value, player_map):
+    """
+    This function returns a copy of a parsed .json value with every player ID in player_map replaced, both as values and in 'ID<playerID>' keys.
+    """
+    if isinstance(value, dict):
+        remapped = {}
+        for key, item in value.items():
+            if key.startswith('ID') and key[2:].isdigit() and int(key[2:]) in player_map:
+                key = 'ID' + str(player_map[int(key[2:])])
+            remapped[key] = remap_players(item, player_map)
+        return remapped
+    if isinstance(value, list):
+        return [remap_players(item, player_map) for item in value]
+    if isinstance(value, int) and not isinstance(value, bool) and value in player_map:
+        return player_map[value]
+    return value
+
+
+def get_shift_records(gameID, side_players, side_positions, team_code, team_id, rng):
+    """
+    This function generates one team's shifts for periods 1 to 3: four forward lines and three defence pairs rotate with random shift lengths,
+    and the first goalie plays every period. It returns a list of shift chart records.
+    """
+    forwards = [player for player, position in zip(side_players, side_positions) if position == 'Forward'][:12]
+    defence = [player for player, position in zip(side_players, side_positions) if position == 'Defenseman'][:6]
+    goalies = [player for player, position in zip(side_players, side_positions) if position == 'Goalie'][:1]
+    units = [(forwards[i:i + 3], 35, 60) for i in range(0, len(forwards), 3)]
+    pairs = [(defence[i:i + 2], 40, 70) for i in range(0, len(defence), 2)]
+    shifts = []
+    for period in range(1, 4):
+        for rotation in (units, pairs):
+            if len(rotation) == 0:
+                continue
+            start = 0
+            unit = 0
+            while start < 1200:
+                players, shortest, longest = rotation[unit % len(rotation)]
+                end = min(1200, start + int(rng.integers(shortest, longest)))
+                for player in players:
+                    shifts.append((player, period, start, end))
+                start = end
+                unit += 1
+        for player in goalies:
+            shifts.append((player, period, 0, 1200))
+    records = []
+    for shift_num, (player, period, start, end) in enumerate(shifts):
+        records.append({'id': gameID * 10000 + shift_num, 'gameId': gameID, 'playerId': player, 'teamAbbrev': team_code, 'teamId': team_id,
+                        'period': period, 'startTime': "%02d:%02d" % (start // 60, start % 60), 'endTime': "%02d:%02d" % (end // 60, end % 60),
+                        'firstName': "Player", 'lastName': str(player)})
+    return records
+
+
+def generate_game(gameID, home_index, away_index, game_date, seed):
+    """
+    This function builds one synthetic game feed and its shift chart, returning (game_data, shift_data).
+    """
+    game_template = get_template()
+    rng = np.random.default_rng([seed, gameID])
+    season = gameID // 1000000
+    teams = {'home': home_index, 'away': away_index}
+    # Give the template's players the synthetic rosters of the two teams
+    player_map = {}
+    side_players = {}
+    for side, team_index in teams.items():
+        template_ids = game_template['sides'][side]['player_ids']
+        roster = get_roster(team_index, season, len(template_ids))
+        player_map.update(zip(template_ids, roster))
+        side_players[side] = roster
+    game_data = remap_players(game_template['game_data'], player_map)
+    game_data['gamePk'] = gameID
+    game_data['link'] = "/api/v1/game/" + str(gameID) + "/feed/live"
+    game_data['gameData']['game'] = {'pk': gameID, 'season': str(season) + str(season + 1), 'type': 'R'}
+    game_data['gameData']['datetime']['dateTime'] = game_date.isoformat() + "T23:00:00Z"
+    template_codes = {}
+    for side, team_index in teams.items():
+        team_data = game_data['gameData']['teams'][side]
+        template_codes[team_data['triCode']] = side
+        team_data['id'] = team_index + 1
+        team_data['triCode'] = TEAM_CODES[team_index]
+        team_data['abbreviation'] = TEAM_CODES[team_index]
+        team_data['name'] = TEAM_CODES[team_index]
+    # Move every shot and re-draw whether it went in
+    for play in game_data['liveData']['plays']['allPlays']:
+        if 'team' in play and play['team'].get('triCode') in template_codes:
+            side = template_codes[play['team']['triCode']]
+            play['team'] = {'id': teams[side] + 1, 'name': TEAM_CODES[teams[side]], 'link': "/api/v1/teams/" + str(teams[side] + 1), 'triCode': TEAM_CODES[teams[side]]}
+        if play['result']['event'] not in ('Shot', 'Goal') or 'x' not in play['coordinates']:
+            continue
+        direction = 1.0 if play['coordinates']['x'] >= 0 else -1.0
+        distance = float(np.clip(rng.gamma(3.0, 10.0), 2.0, 95.0))
+        play['coordinates']['x'] = float(round(direction * (89.0 - min(distance, 88.0))))
+        play['coordinates']['y'] = float(round(np.clip(rng.normal(0.0, 12.0), -42.0, 42.0)))
+        is_goal = rng.random() < 0.35 / (1.0 + distance / 6.0)
+        play['result']['event'] = 'Goal' if is_goal else 'Shot'
+        play['result']['eventTypeId'] = 'GOAL' if is_goal else 'SHOT'
+        play['players'][0]['playerType'] = 'Scorer' if is_goal else 'Shooter'
+        if is_goal:
+            play['result']['emptyNet'] = False
+    shift_records = []
+    for side, team_index in teams.items():
+        shift_records.extend(get_shift_records(gameID, side_players[side], game_template['sides'][side]['positions'], TEAM_CODES[team_index], team_index + 1, rng))
+    shift_data = {'data': shift_records, 'total': len(shift_records)}
+    return (game_data, shift_data)
+
+
+def write_game(out_directory, gameID, home_index, away_index, game_date, seed, compression=None, slim=False):
+    """
+    This function generates one game and writes its feed and shift chart under out_directory, in the form chosen by compression and slim (see feed_io.py).
+    It is kept at module level for the process pool.
+    """
+    game_data, shift_data = generate_game(gameID, home_index, away_index, game_date, seed)
+    if compression is None and not slim:
+        # Plain files are written compactly, as before, rather than in the notebook's indented format
+        file_name = "game_" + str(gameID) + ".json"
+        with open(os.path.join(out_directory, 'games', file_name), 'w', encoding='utf-8') as f:
+            json.dump(game_data, f)
+        with open(os.path.join(out_directory, 'shifts', file_name), 'w', encoding='utf-8') as f:
+            json.dump(shift_data, f)
+        return gameID
+    write_feed(os.path.join(out_directory, 'games'), gameID, game_data, kind='game', compression=compression, slim=slim)
+    write_feed(os.path.join(out_directory, 'shifts'), gameID, shift_data, kind='shift', compression=compression, slim=slim)
+    return gameID
+
+
+def generate_corpus(out_directory, n_games=None, n_seasons=None, first_season=2005, seed=0, workers=None, compression=None, slim=False):
+    """
+    This function writes a synthetic corpus of n_games games, or of n_seasons full seasons, to out_directory/games and out_directory/shifts.
+    The games fill whole seasons in order starting from first_season, and the last season is cut short if n_games is not a whole number of seasons.
+    compression (None, 'gzip' or 'zstd') and slim choose the stored form of the files, as in feed_io.write_feed().
+    It returns the list of gameIDs written.
+
+    Example usage:
+    game_ids = generate_corpus('./synthetic', n_games=500)
+    """
+    check_compression(compression)
+    if n_games is None:
+        n_games = (n_seasons or 1) * GAMES_PER_SEASON
+    os.makedirs(os.path.join(out_directory, 'games'), exist_ok=True)
+    os.makedirs(os.path.join(out_directory, 'shifts'), exist_ok=True)
+    schedule = []
+    season = first_season
+    while len(schedule) < n_games:
+        schedule.extend(get_season_schedule(season, min(GAMES_PER_SEASON, n_games - len(schedule)), seed))
+        season += 1
+    arguments = [[out_directory] * len(schedule)] + [list(column) for column in zip(*schedule)] + [[seed] * len(schedule), [compression] * len(schedule), [slim] * len(schedule)]
+    if workers is None or workers <= 1:
+        game_ids = list(map(write_game, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            game_ids = list(executor.map(write_game, *arguments, chunksize=max(1, len(schedule) // (workers * 4))))
+    return game_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic game feed and shift chart files from live-data-example.json.")
+    parser.add_argument('--out', required=True, help="directory to write the games and shifts subdirectories to")
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument('--games', type=int, help="number of games to generate")
+    size.add_argument('--seasons', type=int, help="number of full seasons to generate")
+    parser.add_argument('--first-season', type=int, default=2005)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--compression', choices=['none', 'gzip', 'zstd'], default='none', help="store the files compressed (default none)")
+    parser.add_argument('--slim', action='store_true', help="store only the fields the readers use, see feed_io.py")
+    args = parser.parse_args()
+    compression = None if args.compression == 'none' else args.compression
+    game_ids = generate_corpus(args.out, n_games=args.games, n_seasons=args.seasons, first_season=args.first_season, seed=args.seed, workers=args.workers,
+                               compression=compression, slim=args.slim)
+    print("synthetic_corpus: Wrote", len(game_ids), "games to", args.out)
+
+
+if __name__ == '__main__':
+    main()